@@ -0,0 +1,143 @@
+""" Benchmark of the scheduled jobs page parser
+
+Parses a scheduled jobs page (viewscheduledjobs.action) with the former BeautifulSoup/html.parser implementation and
+with parse_jobs_page. Without --page, a page with --jobs jobs is generated in the markup of Confluence Server; a page
+recorded from an instance can be passed with --page instead.
+
+    poetry run python benchmarks/bench_jobs_page.py [--jobs N] [--page FILE] [--number N]
+"""
+
+import argparse
+import pathlib
+import sys
+import timeit
+import typing
+
+from bs4 import BeautifulSoup
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from pluploader.confluence.jobs.jobs import Job, parse_jobs_page  # noqa: E402
+
+ROW = """
+        <tr data-job-name="{name}" data-job-group="{group}" data-job-id="{id}" data-is-cron="{is_cron}"
+            data-cron-expression="{cron}" data-repeat-interval="{interval}">
+          <td class="job-name"><span class="job-name-text">{name}</span></td>
+          <td class="job-status"><span class="aui-lozenge {lozenge}">{status}</span></td>
+          <td class="job-last-execution">{last}</td>
+          <td class="job-next-execution">{next}</td>
+          <td class="job-avg-duration">{duration}</td>
+          <td class="job-actions">
+            <ul class="job-operations">
+              <li><a class="show-history" href="#">History</a></li>
+              {run}
+              <li><a class="edit-schedule" href="#">Edit</a></li>
+              {toggle}
+            </ul>
+          </td>
+        </tr>"""
+
+
+def generate_jobs_page(count: int) -> bytes:
+    rows = []
+    for i in range(count):
+        enabled = i % 7 != 0
+        is_cron = i % 3 != 0
+        rows.append(
+            ROW.format(
+                name=f"Scheduled job {i}",
+                group=f"com.example.plugin{i % 25}",
+                id=f"com.example.plugin{i % 25}:job{i}",
+                is_cron=str(is_cron).lower(),
+                cron="0 0/5 * * * ?" if is_cron else "",
+                interval="" if is_cron else str(60000 * (i % 11 + 1)),
+                lozenge="aui-lozenge-success" if enabled else "aui-lozenge-subtle",
+                status="Scheduled" if enabled else "Disabled",
+                last=f"Oct {i % 28 + 1}, 2024 {i % 24:02d}:{i % 60:02d}" if i % 5 else "",
+                next=f"Oct {i % 28 + 2}, 2024 {i % 24:02d}:{i % 60:02d}" if enabled else "",
+                duration=f"{i * 37 % 5000} ms" if i % 5 else "",
+                run='<li><a class="run-job" href="#">Run</a></li>' if enabled else "",
+                toggle=(
+                    '<li><a class="disable-job" href="#">Disable</a></li>'
+                    if enabled
+                    else '<li><a class="enable-job" href="#">Enable</a></li>'
+                ),
+            )
+        )
+    return f"""<!DOCTYPE html>
+<html>
+  <head>
+    <title>Scheduled Jobs - Confluence</title>
+    <meta id="atlassian-token" name="atlassian-token" content="0123456789abcdef">
+  </head>
+  <body class="admin">
+    <table id="schedule-admin" class="aui">
+      <thead>
+        <tr>
+          <th>Job</th><th>Status</th><th>Last Execution</th><th>Next Execution</th><th>Avg. Duration</th><th>Actions</th>
+        </tr>
+      </thead>
+      <tbody>{"".join(rows)}
+      </tbody>
+    </table>
+  </body>
+</html>
+""".encode()
+
+
+def html_parser_jobs_page(content: bytes) -> typing.Tuple[typing.List[Job], str]:
+    """the former BeautifulSoup/html.parser implementation"""
+    soup = BeautifulSoup(content, "html.parser")
+    token = soup.select_one("meta#atlassian-token")["content"]
+    table = soup.select_one("table#schedule-admin")
+    headers = [x.text for x in table.select("thead th")]
+    entries = []
+    for row in table.select("tbody tr"):
+        action_enable_disable = None
+        if row.select_one(".disable-job") is not None:
+            action_enable_disable = "disable"
+        elif row.select_one(".enable-job") is not None:
+            action_enable_disable = "enable"
+        entries.append(
+            Job(
+                name=row["data-job-name"],
+                group=row["data-job-group"],
+                id=row["data-job-id"],
+                status=row.select("td")[headers.index("Status")].get_text(),
+                last_execution=row.select("td")[headers.index("Last Execution")].get_text(),
+                next_execution=row.select("td")[headers.index("Next Execution")].get_text(),
+                avg_duration=row.select("td")[headers.index("Avg. Duration")].get_text(),
+                has_history=row.select_one(".show-history") is not None,
+                is_runnable=row.select_one(".run-job") is not None,
+                is_editable=row.select_one(".edit-schedule") is not None,
+                action_enable_disable=action_enable_disable,
+                is_cron=row["data-is-cron"],
+                cron_expression=row["data-cron-expression"],
+                repeat_interval=row["data-repeat-interval"],
+            )
+        )
+    return entries, token
+
+
+def report(name: str, number: int, seconds: float):
+    print(f"{name:<30} {seconds / number * 1000:>9.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--jobs", type=int, default=800, help="jobs of the generated page")
+    parser.add_argument("--page", type=pathlib.Path, help="recorded viewscheduledjobs.action page")
+    parser.add_argument("--number", type=int, default=5, help="runs of every benchmark")
+    args = parser.parse_args()
+
+    content = args.page.read_bytes() if args.page is not None else generate_jobs_page(args.jobs)
+    jobs, token = parse_jobs_page(content)
+    assert (jobs, token) == html_parser_jobs_page(content)
+
+    print(f"{len(jobs)} jobs, {len(content)} bytes, {args.number} runs each")
+    report("html.parser", args.number, timeit.timeit(lambda: html_parser_jobs_page(content), number=args.number))
+    report("parse_jobs_page (lxml)", args.number, timeit.timeit(lambda: parse_jobs_page(content), number=args.number))
+
+
+if __name__ == "__main__":
+    main()
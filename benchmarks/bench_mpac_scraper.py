@@ -0,0 +1,115 @@
+""" Benchmark of the marketplace version history scraper
+
+Parses the saved version history page in fixtures/ with the former BeautifulSoup/html5lib scraper and with the
+current lxml scraper, and times the resolution of the app key from the page. The app key is checked against a local
+stand-in of the marketplace REST api, so no internet access is required.
+
+    poetry run python benchmarks/bench_mpac_scraper.py [--number N]
+"""
+
+import argparse
+import json
+import pathlib
+import sys
+import threading
+import timeit
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from bs4 import BeautifulSoup
+from furl import furl
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from pluploader.mpac import rest, scraper  # noqa: E402
+
+FIXTURE = pathlib.Path(__file__).parent / "fixtures" / "version-history.html"
+MARKETPLACE_ID = "1211542"
+APP_KEY = "com.example.macropack"
+# marketplace ids of the apps whose keys are embedded into the fixture
+MARKETPLACE_IDS = {
+    APP_KEY: MARKETPLACE_ID,
+    "com.example.recommended.calendar": "1211001",
+    "com.example.recommended.diagrams": "1211002",
+    "com.example.recommended.forms": "1211003",
+}
+
+
+class MarketplaceHandler(BaseHTTPRequestHandler):
+    """serves /rest/2/addons/<key> with the link to the marketplace page of the app"""
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        segments = furl(self.path).path.segments
+        if len(segments) != 4 or segments[:3] != ["rest", "2", "addons"] or segments[3] not in MARKETPLACE_IDS:
+            self.send_error(404)
+            return
+        key = segments[3]
+        body = json.dumps({"key": key, "_links": {"alternate": {"href": f"/apps/{MARKETPLACE_IDS[key]}/{key}"}}})
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body.encode())
+
+
+def html5lib_download_link(page: bytes, version: str) -> str:
+    """the former html5lib scraper, with the fixed lookup of the latest version"""
+    soup = BeautifulSoup(page, "html5lib")
+    plugins_dom = soup.select_one(".plugin-versions").select(".version-row")
+    for version_row in plugins_dom:
+        if (version == "latest" and version_row.select_one("span.version").text != "Cloud") or (
+            version_row.select_one("span.version").text == version
+        ):
+            return version_row.select_one(".download-link")["href"]
+    raise LookupError(version)
+
+
+def report(name: str, number: int, seconds: float):
+    print(f"{name:<40} {seconds / number * 1000:>9.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=20, help="runs of every benchmark")
+    args = parser.parse_args()
+
+    page = FIXTURE.read_bytes()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MarketplaceHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    rest.BASE_URL = furl(f"http://127.0.0.1:{server.server_port}/rest/2")
+
+    # the first key in the page belongs to a recommended app, which has to be skipped
+    assert scraper.find_app_key_candidates(page)[0] != APP_KEY
+    assert scraper.get_app_key_by_marketplace_id(MARKETPLACE_ID, page=page) == APP_KEY
+    for version in ["latest", "1.0.0"]:
+        assert html5lib_download_link(page, version) == str(scraper.download_link_by_marketplace_id("", version, page))
+
+    print(f"{FIXTURE.name}: {len(page)} bytes, {args.number} runs each")
+    for version in ["latest", "1.0.0"]:
+        report(
+            f"html5lib download link ({version})",
+            args.number,
+            timeit.timeit(lambda: html5lib_download_link(page, version), number=args.number),
+        )
+        report(
+            f"lxml download link ({version})",
+            args.number,
+            timeit.timeit(lambda: scraper.download_link_by_marketplace_id("", version, page), number=args.number),
+        )
+    report(
+        "app key candidates (regex)",
+        args.number,
+        timeit.timeit(lambda: scraper.find_app_key_candidates(page), number=args.number),
+    )
+    report(
+        "app key validated (local REST)",
+        args.number,
+        timeit.timeit(lambda: scraper.get_app_key_by_marketplace_id(MARKETPLACE_ID, page=page), number=args.number),
+    )
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+""" Checks the offline marketplace mirror and install manifests against a local stand-in
+
+The mirror is filled from the stand-in of the marketplace, which is stopped before the mirror is read, so resolving
+apps from the mirror directory and from the mirror served over HTTP is checked without any marketplace.
+
+    poetry run python checks/check_mpac_mirror.py
+"""
+
+import functools
+import hashlib
+import pathlib
+import sys
+import tempfile
+import threading
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+from marketplace import MarketplaceStandIn
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from pluploader.mpac import exceptions, manifest, mirror, rest  # noqa: E402
+
+
+def check(description: str, condition: bool):
+    if not condition:
+        sys.exit(f"FAILED: {description}")
+    print(f"ok: {description}")
+
+
+def check_raises(description: str, exception: type, function, *args):
+    try:
+        function(*args)
+    except exception:
+        check(description, True)
+    else:
+        check(description, False)
+
+
+def check_mirror(directory: pathlib.Path):
+    requirements = [mirror.parse_requirement("com.example.app>=1.1,<2"), mirror.parse_requirement("com.example.other")]
+    with MarketplaceStandIn() as marketplace:
+        rest.BASE_URL = marketplace.url / "rest/2"
+        index, failed = mirror.mirror_apps(directory, requirements, workers=4)
+        check("all versions are mirrored", len(failed) == 0)
+        check("versions in the range are mirrored", sorted(index.apps["com.example.app"]) == ["1.1.0", "1.2.0"])
+        check("only the latest version is mirrored without range", list(index.apps["com.example.other"]) == ["3.1.0"])
+        app = index.apps["com.example.app"]["1.2.0"]
+        content = (directory / app.path).read_bytes()
+        check("binaries are stored as key/version/file", app.path == "com.example.app/1.2.0/com.example.app-1.2.0.jar")
+        check("binary matches the marketplace", content == marketplace.jar("com.example.app", "1.2.0"))
+        check("index contains the sha256 of the binary", app.sha256 == hashlib.sha256(content).hexdigest())
+
+        marketplace.reset()
+        _, failed = mirror.mirror_apps(directory, requirements, workers=4)
+        downloads = [x for x in marketplace.requests if x.startswith("/files/") or x.startswith("/rest/2/assets/")]
+        check("mirrored versions are not downloaded again", len(failed) == 0 and len(downloads) == 0)
+
+        missing = [mirror.parse_requirement("com.example.missing")]
+        not_found = exceptions.MpacAppNotFoundError
+        check_raises("unknown app can not be mirrored", not_found, mirror.mirror_apps, directory, missing)
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def check_mirror_url(directory: pathlib.Path):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(QuietHandler, directory=str(directory)))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/"
+    try:
+        index = mirror.load_mirror_index(url)
+        check("index of a mirror url matches the directory", index == mirror.load_mirror_index(str(directory)))
+        path = mirror.download_app_from_mirror(url, "com.example.app", index=index)
+        expected = directory / index.apps["com.example.app"]["1.2.0"].path
+        check("latest version is downloaded from a mirror url", pathlib.Path(path).read_bytes() == expected.read_bytes())
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def check_mirror_directory(directory: pathlib.Path):
+    path = mirror.download_app_from_mirror(str(directory), "com.example.app", "1.1.0")
+    check("version is resolved from a mirror directory", path == directory / "com.example.app/1.1.0/com.example.app-1.1.0.jar")
+    check_raises(
+        "unknown app raises MpacAppNotFoundError",
+        exceptions.MpacAppNotFoundError,
+        mirror.download_app_from_mirror,
+        str(directory),
+        "com.example.missing",
+    )
+    check_raises(
+        "unmirrored version raises MpacAppVersionNotFoundError",
+        exceptions.MpacAppVersionNotFoundError,
+        mirror.download_app_from_mirror,
+        str(directory),
+        "com.example.app",
+        "1.0.0",
+    )
+
+
+def check_manifest(directory: pathlib.Path):
+    listed = directory / "list.yaml"
+    listed.write_text("- com.example.app==1.1.0\n- com.example.other\n")
+    expected = [("com.example.app", "1.1.0"), ("com.example.other", "latest")]
+    check("manifest as list is read", manifest.read_manifest(listed) == expected)
+    nested = directory / "apps.yaml"
+    nested.write_text("apps:\n  - com.example.app==1.1.0\n  - com.example.other  # latest version\n")
+    check("manifest with apps is read", manifest.read_manifest(nested) == expected)
+    invalid = directory / "invalid.yaml"
+    invalid.write_text("apps: com.example.app\n")
+    check_raises("manifest without list raises ManifestError", manifest.ManifestError, manifest.read_manifest, invalid)
+    check_raises("invalid version range raises ValueError", ValueError, mirror.parse_requirement, "com.example.app>=x")
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        directory = pathlib.Path(tmp_dir) / "mirror"
+        check_mirror(directory)
+        check_mirror_directory(directory)
+        check_mirror_url(directory)
+        check_manifest(pathlib.Path(tmp_dir))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+""" Checks the marketplace REST client, the metadata cache and the binary cache against a local stand-in
+
+    poetry run python checks/check_mpac_rest.py
+"""
+
+import pathlib
+import sys
+import tempfile
+
+from marketplace import MarketplaceStandIn
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from pluploader.mpac import download, exceptions, rest  # noqa: E402
+from pluploader.mpac.cache import MetadataCache, MpacCache  # noqa: E402
+
+
+def check(description: str, condition: bool):
+    if not condition:
+        sys.exit(f"FAILED: {description}")
+    print(f"ok: {description}")
+
+
+def main():
+    with MarketplaceStandIn() as marketplace, tempfile.TemporaryDirectory() as cache_dir:
+        rest.BASE_URL = marketplace.url / "rest/2"
+        cache = MpacCache(pathlib.Path(cache_dir) / "binaries")
+        metadata_cache = MetadataCache(ttl=300, directory=pathlib.Path(cache_dir) / "metadata")
+
+        path = download.download_app_by_app_key("com.example.app", cache=cache, metadata_cache=metadata_cache, connections=1)
+        check("latest version is downloaded", pathlib.Path(path).read_bytes() == marketplace.jar("com.example.app", "2.0.0"))
+        check("version, asset and binary are requested once", sum(marketplace.requests.values()) == 3)
+        check("requests share one pooled connection", marketplace.connections == 1)
+
+        marketplace.reset()
+        path = download.download_app_by_app_key("com.example.app", cache=cache, metadata_cache=metadata_cache, connections=1)
+        check("latest is resolved from the cache within the ttl", sum(marketplace.requests.values()) == 0)
+        check("binary is taken from the cache", pathlib.Path(path).read_bytes() == marketplace.jar("com.example.app", "2.0.0"))
+
+        marketplace.reset()
+        expired = MetadataCache(ttl=0, directory=pathlib.Path(cache_dir) / "metadata")
+        download.download_app_by_app_key("com.example.app", cache=cache, metadata_cache=expired, connections=1)
+        latest_requests = marketplace.requests["/rest/2/addons/com.example.app/versions/latest"]
+        check("latest is resolved again after the ttl", latest_requests == 1)
+        check("binary of the resolved version is reused", "/files/com.example.app-2.0.0.jar" not in marketplace.requests)
+
+        path = download.download_app_by_app_key("com.example.app", "1.1.0", cache=cache, connections=1)
+        check("version by name is downloaded", pathlib.Path(path).read_bytes() == marketplace.jar("com.example.app", "1.1.0"))
+
+        names = rest.get_app_version_names("com.example.app")
+        check("versions are listed over all pages", names == ["2.0.0", "1.2.0", "1.1.0", "1.0.0"])
+        check("marketplace id is read from the app", rest.get_app_marketplace_id("com.example.other") == "1000002")
+        check("marketplace id of an unknown app is None", rest.get_app_marketplace_id("com.example.missing") is None)
+        try:
+            rest.get_app_version("com.example.app", "9.9.9")
+            check("unknown version raises MpacAppVersionNotFoundError", False)
+        except exceptions.MpacAppVersionNotFoundError:
+            check("unknown version raises MpacAppVersionNotFoundError", True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+""" Local stand-in of the marketplace REST api for the checks
+
+Serves the endpoints used by pluploader.mpac for the apps of APPS: the version of an app (latest or by name), the
+paginated list of versions, the asset of a version and its binary. The binaries are small generated plugin jars. The
+stand-in counts the requests per path and the opened connections.
+"""
+
+import collections
+import io
+import json
+import threading
+import typing
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from furl import furl
+
+# app key -> marketplace id and version names, newest first
+APPS = {
+    "com.example.app": ("1000001", ["2.0.0", "1.2.0", "1.1.0", "1.0.0"]),
+    "com.example.other": ("1000002", ["3.1.0", "3.0.0"]),
+}
+# versions per page of the versions list
+PAGE_SIZE = 2
+
+
+def plugin_jar(key: str, version: str) -> bytes:
+    jar = io.BytesIO()
+    with zipfile.ZipFile(jar, "w") as jar_file:
+        jar_file.writestr(
+            "atlassian-plugin.xml",
+            f'<atlassian-plugin key="{key}" name="{key}"><plugin-info><version>{version}</version></plugin-info>'
+            "</atlassian-plugin>",
+        )
+    return jar.getvalue()
+
+
+class MarketplaceStandIn:
+    """Use as context manager: serves the marketplace on a free local port in a background thread"""
+
+    def __init__(self):
+        self.requests: typing.Counter[str] = collections.Counter()
+        self.connections = 0
+        self._lock = threading.Lock()
+        self._jars = {(key, version): plugin_jar(key, version) for key, (_, versions) in APPS.items() for version in versions}
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+
+    @property
+    def url(self) -> furl:
+        return furl(f"http://127.0.0.1:{self._server.server_port}")
+
+    def jar(self, key: str, version: str) -> bytes:
+        return self._jars[(key, version)]
+
+    def reset(self):
+        with self._lock:
+            self.requests.clear()
+            self.connections = 0
+
+    def __enter__(self) -> "MarketplaceStandIn":
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _version(self, key: str, version: str) -> typing.Dict[str, typing.Any]:
+        return {
+            "buildNumber": len(APPS[key][1]) - APPS[key][1].index(version),
+            "name": version,
+            "status": "public",
+            "paymentModel": "free",
+            "_links": {
+                "artifact": {"href": f"/rest/2/assets/{key}/{version}", "type": "application/json"},
+                "alternate": {"href": f"/apps/{APPS[key][0]}/{key}/version-history", "type": "text/html"},
+            },
+        }
+
+    def _route(self, url: furl) -> typing.Tuple[int, typing.Any]:
+        segments = url.path.segments
+        if segments[:3] == ["rest", "2", "addons"] and len(segments) >= 4 and segments[3] in APPS:
+            key = segments[3]
+            marketplace_id, versions = APPS[key]
+            if len(segments) == 4:
+                return 200, {"key": key, "_links": {"alternate": {"href": f"/apps/{marketplace_id}/{key}"}}}
+            if segments[4:] == ["versions"]:
+                offset = int(url.args.get("offset", 0))
+                end = offset + PAGE_SIZE
+                page = {"_embedded": {"versions": [self._version(key, x) for x in versions[offset:end]]}, "_links": {}}
+                if end < len(versions):
+                    page["_links"]["next"] = {"href": f"/rest/2/addons/{key}/versions?offset={end}"}
+                return 200, page
+            if segments[4:] == ["versions", "latest"]:
+                return 200, self._version(key, versions[0])
+            if segments[4:6] == ["versions", "name"] and len(segments) == 7 and segments[6] in versions:
+                return 200, self._version(key, segments[6])
+        if segments[:3] == ["rest", "2", "assets"] and len(segments) == 5 and (segments[3], segments[4]) in self._jars:
+            key, version = segments[3], segments[4]
+            return 200, {
+                "_links": {"binary": {"href": str(self.url.copy().set(path=f"/files/{key}-{version}.jar"))}},
+                "fileInfo": {"logicalFileName": f"{key}-{version}.jar", "size": str(len(self.jar(key, version)))},
+            }
+        return 404, {"message": "not found"}
+
+    def _handler(self) -> typing.Type[BaseHTTPRequestHandler]:
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def setup(self):
+                super().setup()
+                with stand_in._lock:
+                    stand_in.connections += 1
+
+            def _send(self, status: int, body: bytes, content_type: str):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                url = furl(self.path)
+                with stand_in._lock:
+                    stand_in.requests[str(url.path)] += 1
+                segments = url.path.segments
+                if len(segments) == 2 and segments[0] == "files":
+                    for (key, version), jar in stand_in._jars.items():
+                        if segments[1] == f"{key}-{version}.jar":
+                            return self._send(200, jar, "application/java-archive")
+                status, obj = stand_in._route(url)
+                self._send(status, json.dumps(obj).encode(), "application/json")
+
+        return Handler
@@ -0,0 +1,73 @@
+import datetime
+import logging
+import sys
+import typing
+
+import typer
+from rich.console import Console
+from rich.table import Table
+
+from .mpac.cache import MpacCache
+
+app_cache = typer.Typer()
+
+
+def _format_size(size: int) -> str:
+    return f"{size / (1024 * 1024):.1f} MB"
+
+
+@app_cache.callback()
+def cache(ctx: typer.Context):
+    """Manage the local cache of apps downloaded from the marketplace"""
+
+
+@app_cache.command("ls")
+def cache_ls(ctx: typer.Context):
+    """lists the cached apps, most recently used first"""
+    mpac_cache = MpacCache()
+    table = Table()
+    table.add_column("App Key", no_wrap=True)
+    table.add_column("Version")
+    table.add_column("Hosting")
+    table.add_column("Size", justify="right")
+    table.add_column("Last used")
+    table.add_column("Path")
+    for entry in mpac_cache.entries():
+        table.add_row(
+            entry.key,
+            entry.version,
+            entry.hosting,
+            _format_size(entry.size),
+            datetime.datetime.fromtimestamp(entry.last_access).strftime("%Y-%m-%d %H:%M"),
+            str(mpac_cache.path_of(entry)),
+        )
+    console = Console()
+    console.print(table)
+    logging.info(f"The cache in {mpac_cache.directory} uses {_format_size(mpac_cache.size())}")
+
+
+@app_cache.command("prune")
+def cache_prune(
+    ctx: typer.Context,
+    max_size: typing.Optional[int] = typer.Option(
+        None, "--max-size", min=0, help="remove the least recently used apps until the cache fits into this size in MB"
+    ),
+    older_than: typing.Optional[int] = typer.Option(
+        None, "--older-than", min=0, help="remove apps, which were not used for this number of days"
+    ),
+    all: bool = typer.Option(False, "--all", help="remove all cached apps"),
+):
+    """removes apps from the cache"""
+    if not all and max_size is None and older_than is None:
+        logging.error("Specify --max-size, --older-than or --all")
+        sys.exit(1)
+    if all:
+        max_size = 0
+    mpac_cache = MpacCache()
+    removed = mpac_cache.prune(
+        max_size=max_size * 1024 * 1024 if max_size is not None else None,
+        older_than=older_than * 24 * 60 * 60 if older_than is not None else None,
+    )
+    for entry in removed:
+        logging.debug("Removed %s (%s) from the cache", entry.key, entry.version)
+    logging.info(f"Removed {len(removed)} apps from the cache, {_format_size(mpac_cache.size())} are left")
@@ -1,13 +1,23 @@
 """ Module implementing the "Scheduled Jobs" functionality of Confluence Server
 """
 
+import concurrent.futures
 import dataclasses
+import json
+import os
+import pathlib
+import re
+import threading
+import time
 import typing
 
+import lxml.html
 import requests
-from bs4 import BeautifulSoup
 from furl import furl
 
+from ...util import sessionstore
+from ...util.cachedir import get_cache_dir, host_cache_name
+
 
 @dataclasses.dataclass()
 class Job:
@@ -27,34 +37,275 @@ class Job:
     repeat_interval: typing.Optional[str]
 
 
+@dataclasses.dataclass()
+class JobRun:
+    job: Job
+    started: bool
+    finished: bool = False
+    # the job was not started, as the timeout passed while it was waiting for a free slot
+    skipped: bool = False
+    # wall-clock duration, measured with the precision of the poll interval
+    duration: typing.Optional[float] = None
+    last_execution: typing.Optional[str] = None
+
+
+_DURATION_UNITS = {
+    "ms": 0.001,
+    "s": 1,
+    "sec": 1,
+    "secs": 1,
+    "second": 1,
+    "seconds": 1,
+    "min": 60,
+    "mins": 60,
+    "minute": 60,
+    "minutes": 60,
+    "h": 3600,
+    "hour": 3600,
+    "hours": 3600,
+}
+_DURATION = re.compile(r"(\d+(?:[.,]\d+)?)\s*([a-z]+)")
+
+
+def parse_duration(duration: typing.Optional[str]) -> typing.Optional[float]:
+    """parses a duration of the jobs table (e.g. "150 ms" or "2 min 3 s") into seconds"""
+    if duration is None:
+        return None
+    matches = [(value, _DURATION_UNITS.get(unit)) for value, unit in _DURATION.findall(duration.lower())]
+    if len(matches) == 0 or any(factor is None for _, factor in matches):
+        return None
+    return sum(float(value.replace(",", ".")) * factor for value, factor in matches)
+
+
+def is_job_enabled(job: Job) -> bool:
+    """a job is enabled, if it can be disabled"""
+    return job.action_enable_disable == "disable"
+
+
+def save_job_states(path: pathlib.Path, jobs: typing.List[Job]):
+    """writes whether the jobs are enabled into a file, which can be restored by load_job_states"""
+    with open(path, "w") as state_file:
+        json.dump(
+            {"jobs": [{"group": x.group, "id": x.id, "name": x.name, "enabled": is_job_enabled(x)} for x in jobs]},
+            state_file,
+            indent=2,
+        )
+
+
+def load_job_states(path: pathlib.Path) -> typing.Dict[typing.Tuple[str, str], bool]:
+    """Returns:
+    whether the job was enabled by (group, id)
+    """
+    with open(path) as state_file:
+        return {(x["group"], x["id"]): x["enabled"] for x in json.load(state_file).get("jobs", [])}
+
+
+@dataclasses.dataclass()
+class JobChange:
+    # added, removed, status, last_execution, next_execution or avg_duration
+    kind: str
+    job: Job
+    old: typing.Optional[str] = None
+    new: typing.Optional[str] = None
+
+
+def diff_jobs(previous: typing.List[Job], current: typing.List[Job], spike_factor: float = 2) -> typing.List[JobChange]:
+    """Returns the changes between two job lists. A change of the average duration is only reported, if it grew by
+    spike_factor; the next execution is only reported, if the job was not executed in between."""
+    previous_jobs = {(x.group, x.id): x for x in previous}
+    changes = []
+    for job in current:
+        old_job = previous_jobs.pop((job.group, job.id), None)
+        if old_job is None:
+            changes.append(JobChange("added", job))
+            continue
+        if job.status != old_job.status:
+            changes.append(JobChange("status", job, old_job.status, job.status))
+        if job.last_execution != old_job.last_execution:
+            changes.append(JobChange("last_execution", job, old_job.last_execution, job.last_execution))
+        elif job.next_execution != old_job.next_execution:
+            changes.append(JobChange("next_execution", job, old_job.next_execution, job.next_execution))
+        old_duration, duration = parse_duration(old_job.avg_duration), parse_duration(job.avg_duration)
+        if old_duration and duration and duration >= old_duration * spike_factor:
+            changes.append(JobChange("avg_duration", job, old_job.avg_duration, job.avg_duration))
+    changes += [JobChange("removed", x) for x in previous_jobs.values()]
+    return changes
+
+
+# classes of the action links of a job row
+_ACTION_CLASSES = {"show-history", "run-job", "edit-schedule", "disable-job", "enable-job"}
+
+
+def _job_from_row(row: lxml.html.HtmlElement, columns: typing.Dict[str, int]) -> Job:
+    cells = row.findall("td")
+    actions = set()
+    for element in row.iter():
+        classes = element.get("class")
+        if classes is not None:
+            actions.update(_ACTION_CLASSES.intersection(classes.split()))
+
+    action_enable_disable = None
+    if "disable-job" in actions:
+        action_enable_disable = "disable"
+    elif "enable-job" in actions:
+        action_enable_disable = "enable"
+    return Job(
+        name=row.get("data-job-name"),
+        group=row.get("data-job-group"),
+        id=row.get("data-job-id"),
+        status=cells[columns["Status"]].text_content(),
+        last_execution=cells[columns["Last Execution"]].text_content(),
+        next_execution=cells[columns["Next Execution"]].text_content(),
+        avg_duration=cells[columns["Avg. Duration"]].text_content(),
+        has_history="show-history" in actions,
+        is_runnable="run-job" in actions,
+        is_editable="edit-schedule" in actions,
+        action_enable_disable=action_enable_disable,
+        is_cron=row.get("data-is-cron"),
+        cron_expression=row.get("data-cron-expression"),
+        repeat_interval=row.get("data-repeat-interval"),
+    )
+
+
+def parse_jobs_page(content: bytes) -> typing.Tuple[typing.List[Job], str]:
+    """Parses the jobs table of the scheduled jobs page. The columns are looked up once by their header, every row is
+    then read in a single pass.
+    Returns:
+        - list of jobs (typing.List[Job])
+        - token(str)
+    """
+    document = lxml.html.fromstring(content)
+
+    token = document.xpath("//meta[@id='atlassian-token']/@content")[0]
+    table = document.xpath("//table[@id='schedule-admin']")[0]
+    headers = [x.text_content().strip() for x in table.xpath("./thead//th")]
+    columns = {header: idx for idx, header in reversed(list(enumerate(headers)))}
+
+    return [_job_from_row(row, columns) for row in table.xpath("./tbody/tr")], token
+
+
+class JobListCache:
+    """caches the parsed jobs of the jobs page per host and user for ttl seconds. The token of the page is not cached,
+    as it belongs to the session the page was fetched with."""
+
+    def __init__(self, base_url: furl, ttl: float):
+        self.path = get_cache_dir("jobs") / f"{host_cache_name(base_url, 'jobs')}.json"
+        self.ttl = ttl
+
+    def get(self) -> typing.Optional[typing.List[Job]]:
+        try:
+            with open(self.path) as cache_file:
+                cached = json.load(cache_file)
+        except (FileNotFoundError, ValueError):
+            return None
+        if time.time() - cached.get("fetched", 0) > self.ttl:
+            return None
+        return [Job(**x) for x in cached.get("jobs", [])]
+
+    def put(self, jobs: typing.List[Job]):
+        fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as cache_file:
+            json.dump({"fetched": time.time(), "jobs": [dataclasses.asdict(x) for x in jobs]}, cache_file)
+
+    def invalidate(self):
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+@dataclasses.dataclass()
+class JobIndex:
+    """jobs by their id and by their group"""
+
+    jobs: typing.List[Job]
+    by_id: typing.Dict[str, typing.List[Job]] = dataclasses.field(default_factory=dict)
+    by_group: typing.Dict[str, typing.List[Job]] = dataclasses.field(default_factory=dict)
+
+    def __post_init__(self):
+        for job in self.jobs:
+            self.by_id.setdefault(job.id, []).append(job)
+            self.by_group.setdefault(job.group, []).append(job)
+
+    def find(self, id: typing.Optional[str] = None, group: typing.Optional[str] = None) -> typing.List[Job]:
+        """returns the jobs with the id in the group. Ids and groups are matched exactly; if there is no exact match,
+        jobs whose id or group contains the given one are returned."""
+        if id is not None:
+            jobs = self.by_id.get(id) or [x for x in self.jobs if id in x.id]
+            if group is not None:
+                jobs = [x for x in jobs if x.group == group] or [x for x in jobs if group in x.group]
+            return jobs
+        if group is not None:
+            return self.by_group.get(group) or [x for x in self.jobs if group in x.group]
+        return list(self.jobs)
+
+
 class JobsScraper:
     LIST_JOBS_ACTION_URL = "/admin/scheduledjobs/viewscheduledjobs.action"
     RUN_JOB_ACTION_URL = "/admin/scheduledjobs/runJob.action"
     DISABLE_JOB_ACTION_URL = "/admin/scheduledjobs/disableJob.action"
     ENABLE_JOB_ACTION_URL = "/admin/scheduledjobs/enableJob.action"
 
-    def __init__(self, base_url: furl):
+    def __init__(self, base_url: furl, persist_session: bool = True, cache_ttl: float = 0):
         self.base_url: furl = base_url
         self.session = requests.Session()
+        # the token of the current session, taken from the last jobs page or stored with the persisted session
+        self._token: typing.Optional[str] = None
+        self.session_path: typing.Optional[pathlib.Path] = None
+        if persist_session:
+            self.session_path = sessionstore.session_path(base_url, "jobs")
+            if sessionstore.load_cookies(self.session, self.session_path):
+                self._token = sessionstore.load_token(self.session_path)
+        self.cache: typing.Optional[JobListCache] = None
+        if cache_ttl > 0:
+            self.cache = JobListCache(base_url, cache_ttl)
+        # the jobs page fetched by login, so list_jobs does not need to fetch it again
+        self._jobs_page: typing.Optional[bytes] = None
+        # incremented by every login, so actions failing with the same session log in only once
+        self._session_generation = 0
+        self._login_lock = threading.Lock()
 
     def __enter__(self) -> "JobsScraper":
-        self.login()
+        # the login is done lazily by list_jobs or the actions, so commands using the cached job list and a persisted
+        # session do not need to load the jobs page at all
         return self
 
     def __exit__(self, exception_type, exception_value, traceback):
-        pass
+        if self.session_path is not None and exception_type is None:
+            sessionstore.save_cookies(self.session, self.session_path, self._token)
+
+    @staticmethod
+    def _is_login_page(document: lxml.html.HtmlElement) -> bool:
+        return len(document.xpath("//*[@id='login-container']")) > 0
+
+    def _is_rejected(self, response: requests.Response, token: str) -> bool:
+        """whether the server rejected an action, as the session is not authenticated (anymore) or the token does not
+        belong to the session. Every page contains the token of the session."""
+        if response.status_code == 403:
+            return True
+        if response.status_code != 200 or len(response.content.strip()) == 0:
+            return False
+        document = lxml.html.fromstring(response.content)
+        page_tokens = document.xpath("//meta[@id='atlassian-token']/@content")
+        return self._is_login_page(document) or any(x != token for x in page_tokens)
+
+    def _use_jobs_page(self, content: bytes, document: lxml.html.HtmlElement):
+        self._jobs_page = content
+        self._token = document.xpath("//meta[@id='atlassian-token']/@content")[0]
+        self._session_generation += 1
 
     def login(self):
         # Let's try out the list_jobs_action_url -> If its successful, return, otherwise authenticate
+        # (a persisted session is still authenticated, until websudo expires)
         request_url: furl = self.base_url.copy()
         request_url.add(path=self.LIST_JOBS_ACTION_URL)
         response = self.session.get(request_url)
 
-        soup = BeautifulSoup(response.content, "html5lib")
-        login_container = soup.select_one("#login-container")
-        if login_container is None:
+        document = lxml.html.fromstring(response.content)
+        if not self._is_login_page(document):
             # No login - let's check, if we are on the correct page
-            if soup.select_one("table#schedule-admin") is not None:
+            if document.xpath("//table[@id='schedule-admin']"):
+                self._use_jobs_page(response.content, document)
                 return
             else:
                 # TODO: Specific exception
@@ -62,7 +313,7 @@ class JobsScraper:
         else:
             login_url = self.base_url.copy()
             login_url.add(path="/doauthenticate.action")
-            token = soup.select_one("meta#atlassian-token")["content"]
+            token = document.xpath("//meta[@id='atlassian-token']/@content")[0]
             password = self.base_url.password
             destination = self.LIST_JOBS_ACTION_URL
             response = self.session.post(
@@ -70,105 +321,143 @@ class JobsScraper:
                 data={"atl_token": token, "password": password, "destination": destination, "authenticate": "Confirm"},
             )
 
-            soup = BeautifulSoup(response.content, "html5lib")
-            if soup.select_one("table#schedule-admin") is not None:
+            document = lxml.html.fromstring(response.content)
+            if document.xpath("//table[@id='schedule-admin']"):
+                self._use_jobs_page(response.content, document)
+                if self.session_path is not None:
+                    sessionstore.save_cookies(self.session, self.session_path, self._token)
                 return
             else:
                 raise Exception("Login failed")
 
     def get_token(self) -> str:
-        request_url = self.base_url.copy()
-        request_url.add(path=self.LIST_JOBS_ACTION_URL)
-        response = self.session.get(request_url)
-        soup = BeautifulSoup(response.content, "html.parser")
-        token = soup.select_one("meta#atlassian-token")["content"]
-        return (token, response.cookies)
+        """returns the token of the current session; the jobs page is only fetched (and the session authenticated), if
+        the token is not known yet"""
+        if self._token is None:
+            self.login()
+        return self._token
 
-    def list_jobs(self) -> typing.Tuple[typing.List[Job], str]:
+    def list_jobs(self, use_cache: bool = True) -> typing.Tuple[typing.List[Job], typing.Optional[str]]:
         """
         Returns:
             - list of jobs (typing.List[Job])
-            - token(str)
+            - token(str) of the current session; if the jobs were taken from the cache, the token stored with the
+              persisted session, or None, if there is none. The actions fetch the token themselves then.
         """
-        request_url: furl = self.base_url.copy()
-        request_url.add(path=self.LIST_JOBS_ACTION_URL)
-        response = self.session.get(request_url)
+        if use_cache and self.cache is not None:
+            cached = self.cache.get()
+            if cached is not None:
+                return cached, self._token
+        if self._jobs_page is None:
+            self.login()
+        content, self._jobs_page = self._jobs_page, None
+        job_list, token = parse_jobs_page(content)
+        self._token = token
+        if self.cache is not None:
+            self.cache.put(job_list)
+        return job_list, token
 
-        soup = BeautifulSoup(response.content, "html.parser")
-
-        token = soup.select_one("meta#atlassian-token")["content"]
-        table = soup.select_one("table#schedule-admin")
-        headers = [x.text for x in table.select("thead th")]
-        table_rows = table.select("tbody tr")
-
-        entries: typing.List[Job] = []
-        for row in table_rows:
-            job_name = row["data-job-name"]
-            job_group = row["data-job-group"]
-            job_id = row["data-job-id"]
-            is_cron = row["data-is-cron"]
-            cron_expression = row["data-cron-expression"]
-            repeat_interval = row["data-repeat-interval"]
-            has_history = True if row.select_one(".show-history") is not None else False
-            is_runnable = True if row.select_one(".run-job") is not None else False
-            is_editable = True if row.select_one(".edit-schedule") is not None else False
-            has_disable = True if row.select_one(".disable-job") is not None else False
-            has_enable = True if row.select_one(".enable-job") is not None else False
-
-            status = row.select("td")[headers.index("Status")].get_text()
-            last_execution = row.select("td")[headers.index("Last Execution")].get_text()
-            next_execution = row.select("td")[headers.index("Next Execution")].get_text()
-            avg_duration = row.select("td")[headers.index("Avg. Duration")].get_text()
-
-            action_enable_disable = None
-            if has_disable:
-                action_enable_disable = "disable"
-            elif has_enable:
-                action_enable_disable = "enable"
-            entries.append(
-                Job(
-                    name=job_name,
-                    group=job_group,
-                    id=job_id,
-                    status=status,
-                    last_execution=last_execution,
-                    next_execution=next_execution,
-                    avg_duration=avg_duration,
-                    has_history=has_history,
-                    is_runnable=is_runnable,
-                    is_editable=is_editable,
-                    action_enable_disable=action_enable_disable,
-                    is_cron=is_cron,
-                    cron_expression=cron_expression,
-                    repeat_interval=repeat_interval,
-                )
-            )
-
-        return (entries, token)
-
-    def run_job(self, job: Job, token: typing.Optional[str] = None) -> bool:
-        if token is None:
-            token = self.get_token()
+    def _job_action(self, action_url: str, job: Job, token: typing.Optional[str] = None) -> bool:
+        """runs an action on a job; if the server rejects the session or the token, it fetches the jobs page (logging
+        in, if required) and retries the action with the token of the current session. Of actions running in parallel
+        with the same rejected session, only the first one fetches the page."""
+        # the given token may belong to a session, which was renewed in the meantime
+        token = self._token or token or self.get_token()
+        generation = self._session_generation
         request_url = self.base_url.copy()
-        request_url.add(path=self.RUN_JOB_ACTION_URL)
+        request_url.add(path=action_url)
         request_url.add(args={"group": job.group, "id": job.id, "atl_token": token})
         response = self.session.get(request_url)
+        if self._is_rejected(response, token):
+            with self._login_lock:
+                if self._session_generation == generation:
+                    self.login()
+                token = self._token
+            request_url.args["atl_token"] = token
+            response = self.session.get(request_url)
         return response.status_code == 200
 
+    def run_job(self, job: Job, token: typing.Optional[str] = None) -> bool:
+        # running a job does not change the job list, until the job finished
+        return self._job_action(self.RUN_JOB_ACTION_URL, job, token)
+
     def disable_job(self, job: Job, token: typing.Optional[str] = None,) -> bool:
-        if token is None:
-            token = self.get_token()
-        request_url = self.base_url.copy()
-        request_url.add(path=self.DISABLE_JOB_ACTION_URL)
-        request_url.add(args={"group": job.group, "id": job.id, "atl_token": token})
-        response = self.session.get(request_url)
-        return response.status_code == 200
+        if self.cache is not None:
+            self.cache.invalidate()
+        return self._job_action(self.DISABLE_JOB_ACTION_URL, job, token)
 
     def enable_job(self, job: Job, token: typing.Optional[str] = None,) -> bool:
-        if token is None:
+        if self.cache is not None:
+            self.cache.invalidate()
+        return self._job_action(self.ENABLE_JOB_ACTION_URL, job, token)
+
+    def set_jobs_enabled(
+        self, jobs: typing.List[Job], enabled: bool, token: typing.Optional[str] = None, workers: int = 4
+    ) -> typing.Tuple[typing.List[typing.Tuple[Job, bool]], typing.List[Job]]:
+        """Enables or disables the jobs in parallel over the session of the scraper. Jobs which are already in the
+        target state are skipped.
+        Returns:
+            - the toggled jobs and whether toggling them succeeded
+            - the skipped jobs
+        """
+        to_toggle = [x for x in jobs if is_job_enabled(x) != enabled]
+        skipped = [x for x in jobs if is_job_enabled(x) == enabled]
+        if token is None and len(to_toggle) > 0:
             token = self.get_token()
-        request_url = self.base_url.copy()
-        request_url.add(path=self.ENABLE_JOB_ACTION_URL)
-        request_url.add(args={"group": job.group, "id": job.id, "atl_token": token})
-        response = requests.get(request_url)
-        return response.status_code == 200
+        toggle = self.enable_job if enabled else self.disable_job
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(lambda x: toggle(x, token), to_toggle))
+        return list(zip(to_toggle, results)), skipped
+
+    def run_jobs(
+        self,
+        jobs: typing.List[Job],
+        max_running: int = 4,
+        poll_interval: float = 2,
+        timeout: typing.Optional[float] = None,
+        on_finished: typing.Optional[typing.Callable[[JobRun], None]] = None,
+    ) -> typing.List[JobRun]:
+        """Runs the jobs and waits until they finished; at most max_running jobs are running at the same time. A job is
+        finished, once the Last Execution cell of the job on the jobs page changed. The cell is displayed with minute
+        precision: if the previous execution of a job is shown with the same minute as the one it finishes in, the
+        cell does not change and the job looks like it never finished. Jobs which are still running after timeout
+        seconds are not waited for anymore, and jobs which were not started yet are skipped.
+        Returns:
+            the runs in the order of jobs
+        """
+        job_list, token = self.list_jobs(use_cache=False)
+        last_executions = {(x.group, x.id): x.last_execution for x in job_list}
+        runs = [JobRun(job=x, started=False) for x in jobs]
+        pending = list(runs)
+        running: typing.Dict[typing.Tuple[str, str], typing.Tuple[JobRun, float]] = {}
+        deadline = time.monotonic() + timeout if timeout is not None else None
+
+        while len(pending) > 0 or len(running) > 0:
+            while len(pending) > 0 and len(running) < max_running:
+                run = pending.pop(0)
+                started_at = time.monotonic()
+                run.started = self.run_job(run.job, token)
+                if run.started:
+                    running[(run.job.group, run.job.id)] = (run, started_at)
+                elif on_finished is not None:
+                    on_finished(run)
+            if len(running) == 0:
+                continue
+            if deadline is not None and time.monotonic() > deadline:
+                break
+
+            time.sleep(poll_interval)
+            job_list, token = self.list_jobs(use_cache=False)
+            for job in job_list:
+                key = (job.group, job.id)
+                if key not in running or job.last_execution == last_executions.get(key):
+                    continue
+                run, started_at = running.pop(key)
+                run.finished = True
+                run.duration = time.monotonic() - started_at
+                run.last_execution = job.last_execution
+                if on_finished is not None:
+                    on_finished(run)
+        for run in pending:
+            run.skipped = True
+        return runs
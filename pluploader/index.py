@@ -0,0 +1,66 @@
+import logging
+import pathlib
+import sys
+import typing
+
+import typer
+from rich.console import Console
+from rich.table import Table
+
+from .util import artifact_index
+from .util import atlassian_jar as jar
+
+app_index = typer.Typer()
+
+
+@app_index.callback()
+def index(ctx: typer.Context):
+    """Index directories of plugin artifacts to install them by their plugin key"""
+
+
+@app_index.command("build")
+def index_build(
+    ctx: typer.Context,
+    directory: pathlib.Path = typer.Argument(..., help="the directory containing the jars and obrs", file_okay=False),
+    workers: typing.Optional[int] = typer.Option(None, help="number of processes used to read the artifacts"),
+):
+    """builds or updates the index of a directory; only new or modified artifacts are read"""
+    if not directory.is_dir():
+        logging.error("%s is not a directory", directory)
+        sys.exit(1)
+    try:
+        index, scanned = artifact_index.build_index(directory, workers)
+    except OSError as e:
+        logging.error("Could not build the index of %s: %s", directory, e)
+        sys.exit(1)
+    artifacts = len(list(index.artifacts())) - len(index.duplicates)
+    logging.info(
+        f"Indexed {artifacts} versions of {len(index.plugins)} plugins in {directory} ({scanned} artifacts read, "
+        f"{len(index.skipped)} files are no plugins)"
+    )
+
+
+@app_index.command("list")
+def index_list(
+    ctx: typer.Context,
+    directory: pathlib.Path = typer.Argument(..., help="the indexed directory or the index file"),
+    key: typing.Optional[str] = typer.Option(None, help="only list the versions of this plugin key"),
+):
+    """lists the plugins contained in the index of a directory"""
+    try:
+        index = artifact_index.load_index(directory)
+    except FileNotFoundError:
+        logging.error("%s has not been indexed yet - run pluploader index build first", directory)
+        sys.exit(1)
+    table = Table()
+    table.add_column("Plugin Key", no_wrap=True)
+    table.add_column("Version")
+    table.add_column("Path")
+    for plugin_key in sorted(index.plugins.keys()):
+        if key is not None and plugin_key != key:
+            continue
+        versions = index.plugins[plugin_key]
+        for version in sorted(versions.keys(), key=jar.parse_plugin_version, reverse=True):
+            table.add_row(plugin_key, version, versions[version].path)
+    console = Console()
+    console.print(table)
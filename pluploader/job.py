@@ -1,24 +1,46 @@
+import datetime
+import json
 import logging
+import pathlib
+import re
 import shutil
 import sys
+import time
 import typing
+from enum import Enum
 
 import requests
 import typer
 from colorama import Fore
+from rich.console import Console
+from rich.table import Table
 
 from .confluence.jobs import jobs
 from .confluence.jobs.jobs import JobsScraper
-from .util import browser
+from .util import browser, sessionstore
 
 app_job = typer.Typer()
 
 
 @app_job.callback()
-def job_root(ctx: typer.Context):
+def job_root(
+    ctx: typer.Context,
+    cache_ttl: int = typer.Option(
+        60,
+        "--cache-ttl",
+        envvar="PLUP_JOBS_CACHE_TTL",
+        min=0,
+        help="number of seconds the job list is reused by run, info, enable and disable to select jobs; 0 disables it",
+    ),
+):
     """Manage and Run Jobs (Confluence only - Beta feature)
     In order to use this feature, it is required that you users locale is set to english
     """
+    ctx.obj["jobs_cache_ttl"] = cache_ttl
+
+
+def _jobs_scraper(ctx: typer.Context) -> JobsScraper:
+    return JobsScraper(ctx.obj.get("base_url"), cache_ttl=ctx.obj.get("jobs_cache_ttl", 0))
 
 
 @app_job.command("list")
@@ -30,10 +52,10 @@ def job_list(
 ):
     """Confluence only, list all jobs available"""
     try:
-        with JobsScraper(ctx.obj.get("base_url")) as jobs_scraper:
+        with _jobs_scraper(ctx) as jobs_scraper:
 
             logging.info("Getting jobs... This can take some time - please wait!")
-            _job_list, token = jobs_scraper.list_jobs()
+            _job_list, token = jobs_scraper.list_jobs(use_cache=False)
 
             columns, _ = shutil.get_terminal_size(fallback=(80, 24))
 
@@ -86,15 +108,15 @@ def _select_job(
     selected_job = None
 
     if id is not None:
-        possible_jobs = [x for x in _job_list if id in x.id]
-        if len(possible_jobs) > 1 and group is not None:
-            possible_jobs = [x for x in possible_jobs if group in x.group]
+        possible_jobs = jobs.JobIndex(_job_list).find(id, group)
 
         if len(possible_jobs) == 1:
             selected_job = possible_jobs[0]
         elif len(possible_jobs) > 0:
-            # TODO: ADD SELECTION HERE
-            pass
+            logging.error(f"{id} matches {len(possible_jobs)} jobs - specify the exact id and group:")
+            for job in possible_jobs:
+                logging.error(f"   - {job.id} ({job.group})")
+            sys.exit(1)
     elif idx is not None:
         selected_job = _job_list[idx] if idx < len(_job_list) else None
     else:
@@ -121,7 +143,7 @@ def _select_job(
 
     if selected_job is None:
         logging.error("job could not be found")
-        typer.Exit(1)
+        sys.exit(1)
 
     return selected_job
 
@@ -130,25 +152,63 @@ def _select_job(
 def job_run(
     ctx: typer.Context,
     idx: typing.Optional[int] = typer.Option(None),
-    id: typing.Optional[str] = typer.Option(None),
-    group: typing.Optional[str] = typer.Option(None),
+    id: typing.List[str] = typer.Option([], help="id of the job to run; can be passed multiple times"),
+    group: typing.Optional[str] = typer.Option(
+        None, help="group of the jobs; without --id, all runnable jobs of the group are run"
+    ),
+    wait: typing.Optional[bool] = typer.Option(
+        None,
+        "--wait/--no-wait",
+        help="wait until the jobs finished and report their durations; the default when running multiple jobs",
+    ),
+    workers: int = typer.Option(4, min=1, help="maximum number of jobs running at the same time when waiting"),
+    poll_interval: float = typer.Option(2, min=0.1, help="seconds between checks whether the jobs finished"),
+    timeout: typing.Optional[float] = typer.Option(None, help="maximum number of seconds to wait for the jobs"),
     web: bool = typer.Option(False, help='open "Scheduled Jobs" in web browser after running job'),
 ):
-    """Confluence only, runs a specified job"""
+    """Confluence only, runs the specified jobs"""
     try:
         logging.info("Getting jobs... This can take some time - please wait!")
-        with JobsScraper(ctx.obj.get("base_url")) as jobs_scraper:
+        with _jobs_scraper(ctx) as jobs_scraper:
             _job_list, token = jobs_scraper.list_jobs()
 
-            selected_job = _select_job(_job_list, idx, id, group)
-
-            logging.info(f"Job {selected_job.name} ({selected_job.id}) selected - Trying to run the job now")
-
-            success = jobs_scraper.run_job(selected_job, token)
-            if success:
-                logging.info("Started job successfully!")
+            if len(id) > 0:
+                selected_jobs = [_select_job(_job_list, id=x, group=group) for x in id]
+            elif group is not None:
+                selected_jobs = jobs.JobIndex(_job_list).find(group=group)
+                for job in [x for x in selected_jobs if not x.is_runnable]:
+                    logging.warning(f"Job {job.name} ({job.id}) is not runnable and will be skipped")
+                selected_jobs = [x for x in selected_jobs if x.is_runnable]
+                if len(selected_jobs) == 0:
+                    logging.error(f"There are no runnable jobs in the group {group}")
+                    sys.exit(1)
             else:
-                logging.error("Couldn't start job!")
+                selected_jobs = [_select_job(_job_list, idx)]
+            if wait is None:
+                wait = len(selected_jobs) > 1
+
+            if not wait:
+                for selected_job in selected_jobs:
+                    logging.info(f"Job {selected_job.name} ({selected_job.id}) selected - Trying to run the job now")
+                    if jobs_scraper.run_job(selected_job, token):
+                        logging.info("Started job successfully!")
+                    else:
+                        logging.error("Couldn't start job!")
+            else:
+                logging.info(f"Running {len(selected_jobs)} jobs, at most {workers} at the same time...")
+
+                def on_finished(run: jobs.JobRun):
+                    if not run.started:
+                        logging.error(f"Couldn't start job {run.job.name} ({run.job.id})!")
+                    else:
+                        logging.info(f"Job {run.job.name} ({run.job.id}) finished after {run.duration:.1f}s")
+
+                runs = jobs_scraper.run_jobs(selected_jobs, workers, poll_interval, timeout, on_finished)
+                for run in [x for x in runs if x.skipped]:
+                    logging.warning(f"Job {run.job.name} ({run.job.id}) was not started, as the timeout passed")
+                _print_job_runs(runs)
+                if any(not x.finished for x in runs):
+                    sys.exit(1)
             if web:
                 browser.open_web_jobs(ctx.obj.get("base_url"))
     except requests.exceptions.ConnectionError:
@@ -160,6 +220,33 @@ def job_run(
         sys.exit(1)
 
 
+def _print_job_runs(runs: typing.List[jobs.JobRun]):
+    table = Table()
+    table.add_column("Job", no_wrap=True)
+    table.add_column("Group")
+    table.add_column("Result")
+    table.add_column("Duration", justify="right")
+    table.add_column("Avg. Duration", justify="right")
+    for run in runs:
+        if run.skipped:
+            result = "[yellow]skipped (timeout)[/yellow]"
+        elif not run.started:
+            result = "[red]not started[/red]"
+        elif not run.finished:
+            result = "[yellow]timed out[/yellow]"
+        else:
+            result = "[green]finished[/green]"
+        duration = f"{run.duration:.1f}s" if run.duration is not None else ""
+        avg_duration = jobs.parse_duration(run.job.avg_duration)
+        avg = run.job.avg_duration.strip() if run.job.avg_duration else ""
+        if run.duration is not None and avg_duration:
+            ratio = run.duration / avg_duration
+            color = "red" if ratio > 2 else "green"
+            avg = f"{avg} ([{color}]{ratio:.1f}x[/{color}])"
+        table.add_row(run.job.name, run.job.group, result, duration, avg)
+    Console().print(table)
+
+
 @app_job.command("info")
 def job_info(
     ctx: typer.Context,
@@ -169,7 +256,7 @@ def job_info(
     web: bool = typer.Option(False, help='open "Scheduled Jobs" in web browser after showing info'),
 ):
     try:
-        with JobsScraper(ctx.obj.get("base_url")) as jobs_scraper:
+        with _jobs_scraper(ctx) as jobs_scraper:
             logging.info("Getting jobs... This can take some time - please wait!")
             _job_list, token = jobs_scraper.list_jobs()
 
@@ -187,31 +274,84 @@ def job_info(
         sys.exit(1)
 
 
-@app_job.command("disable")
-def job_disable(
+def _select_jobs(
+    _job_list: typing.List[jobs.Job],
+    idx: typing.Optional[int] = None,
+    ids: typing.List[str] = (),
+    group: typing.Optional[str] = None,
+    match: typing.Optional[str] = None,
+) -> typing.List[jobs.Job]:
+    """selects the jobs matching the regular expression match (by id or name), the given ids or all jobs of the group;
+    without any of them, a single job is selected by idx or interactively"""
+    if match is not None:
+        try:
+            pattern = re.compile(match)
+        except re.error as e:
+            logging.error(f"{match} is not a valid regular expression: {e}")
+            sys.exit(1)
+        candidates = jobs.JobIndex(_job_list).find(group=group) if group is not None else _job_list
+        selected_jobs = [x for x in candidates if pattern.search(x.id) or pattern.search(x.name)]
+        if len(selected_jobs) == 0:
+            logging.error(f"No job matches {match}")
+            sys.exit(1)
+        return selected_jobs
+    if len(ids) > 0:
+        return [_select_job(_job_list, id=x, group=group) for x in ids]
+    if group is not None:
+        selected_jobs = jobs.JobIndex(_job_list).find(group=group)
+        if len(selected_jobs) == 0:
+            logging.error(f"There are no jobs in the group {group}")
+            sys.exit(1)
+        return selected_jobs
+    return [_select_job(_job_list, idx)]
+
+
+def _set_jobs_enabled(
+    jobs_scraper: JobsScraper,
+    enabled: bool,
+    selected_jobs: typing.List[jobs.Job],
+    token: typing.Optional[str],
+    workers: int,
+) -> bool:
+    """enables or disables the jobs and logs the results; returns whether all jobs could be enabled or disabled"""
+    action = "enable" if enabled else "disable"
+    if len(selected_jobs) == 1:
+        logging.info(f"Job {selected_jobs[0].name} ({selected_jobs[0].id}) selected - Trying to {action} the job now")
+    else:
+        logging.info(f"{len(selected_jobs)} jobs selected - Trying to {action} the jobs now")
+
+    results, skipped = jobs_scraper.set_jobs_enabled(selected_jobs, enabled, token, workers)
+    for job in skipped:
+        logging.info(f"Job {job.name} ({job.id}) is already {action}d")
+    failed = [job for job, success in results if not success]
+    for job in failed:
+        logging.error(f"Couldn't {action} job {job.name} ({job.id})!")
+    if len(results) > len(failed):
+        logging.info(f"{action.capitalize()}d {len(results) - len(failed)} jobs successfully!")
+    return len(failed) == 0
+
+
+def _toggle_jobs(
     ctx: typer.Context,
-    idx: typing.Optional[int] = typer.Option(None),
-    id: typing.Optional[str] = typer.Option(None),
-    group: typing.Optional[str] = typer.Option(None),
-    web: bool = typer.Option(False, help='open "Scheduled Jobs" in web browser after disabling job'),
+    enabled: bool,
+    idx: typing.Optional[int],
+    id: typing.List[str],
+    group: typing.Optional[str],
+    match: typing.Optional[str],
+    workers: int,
+    web: bool,
 ):
-    """Confluence only, disable a specified job"""
     try:
-        with JobsScraper(ctx.obj.get("base_url")) as jobs_scraper:
+        with _jobs_scraper(ctx) as jobs_scraper:
             logging.info("Getting jobs... This can take some time - please wait!")
             _job_list, token = jobs_scraper.list_jobs()
 
-            selected_job = _select_job(_job_list, idx, id, group)
-
-            logging.info(f"Job {selected_job.name} ({selected_job.id}) selected - Trying to disable the job now")
-
-            success = jobs.disable_job(selected_job, token)
-        if success:
-            logging.info("Disabled job successfully!")
-        else:
-            logging.error("Couldn't disable job!")
+            selected_jobs = _select_jobs(_job_list, idx, id, group, match)
+            success = _set_jobs_enabled(jobs_scraper, enabled, selected_jobs, token, workers)
         if web:
             browser.open_web_jobs(ctx.obj.get("base_url"))
+        if not success:
+            sys.exit(1)
     except requests.exceptions.ConnectionError:
         logging.error("Could not connect to host - check your base-url")
         sys.exit(1)
@@ -221,31 +361,156 @@ def job_disable(
         sys.exit(1)
 
 
+@app_job.command("disable")
+def job_disable(
+    ctx: typer.Context,
+    idx: typing.Optional[int] = typer.Option(None),
+    id: typing.List[str] = typer.Option([], help="id of the job to disable; can be passed multiple times"),
+    group: typing.Optional[str] = typer.Option(None, help="group of the jobs; without --id, all jobs of the group"),
+    match: typing.Optional[str] = typer.Option(None, help="disable all jobs whose id or name matches this regex"),
+    workers: int = typer.Option(4, min=1, help="number of jobs disabled in parallel"),
+    web: bool = typer.Option(False, help='open "Scheduled Jobs" in web browser after disabling job'),
+):
+    """Confluence only, disable the specified jobs"""
+    _toggle_jobs(ctx, False, idx, id, group, match, workers, web)
+
+
 @app_job.command("enable")
 def job_enable(
     ctx: typer.Context,
     idx: typing.Optional[int] = typer.Option(None),
-    id: typing.Optional[str] = typer.Option(None),
-    group: typing.Optional[str] = typer.Option(None),
+    id: typing.List[str] = typer.Option([], help="id of the job to enable; can be passed multiple times"),
+    group: typing.Optional[str] = typer.Option(None, help="group of the jobs; without --id, all jobs of the group"),
+    match: typing.Optional[str] = typer.Option(None, help="enable all jobs whose id or name matches this regex"),
+    workers: int = typer.Option(4, min=1, help="number of jobs enabled in parallel"),
     web: bool = typer.Option(False, help='open "Scheduled Jobs" in web browser after enabling job'),
 ):
-    """Confluence only, enable a specified job"""
+    """Confluence only, enable the specified jobs"""
+    _toggle_jobs(ctx, True, idx, id, group, match, workers, web)
+
+
+@app_job.command("save")
+def job_save(
+    ctx: typer.Context,
+    state_file: pathlib.Path = typer.Argument(..., help="file the states of the jobs are written to", dir_okay=False),
+):
+    """Confluence only, saves whether the jobs are enabled, e.g. before a maintenance window"""
     try:
-        with JobsScraper(ctx.obj.get("base_url")) as jobs_scraper:
+        with _jobs_scraper(ctx) as jobs_scraper:
             logging.info("Getting jobs... This can take some time - please wait!")
-            _job_list, token = jobs_scraper.list_jobs()
+            _job_list, _ = jobs_scraper.list_jobs(use_cache=False)
+        jobs.save_job_states(state_file, _job_list)
+        logging.info(f"Saved the states of {len(_job_list)} jobs to {state_file}")
+    except requests.exceptions.ConnectionError:
+        logging.error("Could not connect to host - check your base-url")
+        sys.exit(1)
+    except OSError as exc:
+        logging.error("Could not write the states of the jobs: %s", exc)
+        sys.exit(1)
+    except Exception as exc:
+        logging.error("An error occured - check your credentials")
+        logging.error("%s", exc)
+        sys.exit(1)
 
-            selected_job = _select_job(_job_list, idx, id, group)
 
-            logging.info(f"Job {selected_job.name} ({selected_job.id}) selected - Trying to enable the job now")
+@app_job.command("restore")
+def job_restore(
+    ctx: typer.Context,
+    state_file: pathlib.Path = typer.Argument(..., help="file written by job save", exists=True, dir_okay=False),
+    workers: int = typer.Option(4, min=1, help="number of jobs enabled or disabled in parallel"),
+):
+    """Confluence only, enables and disables the jobs as saved by job save"""
+    try:
+        states = jobs.load_job_states(state_file)
+    except (OSError, ValueError, KeyError) as exc:
+        logging.error("Could not read the states of the jobs: %s", exc)
+        sys.exit(1)
+    try:
+        with _jobs_scraper(ctx) as jobs_scraper:
+            logging.info("Getting jobs... This can take some time - please wait!")
+            _job_list, token = jobs_scraper.list_jobs(use_cache=False)
+            index = jobs.JobIndex(_job_list)
+            for group, id in states:
+                if not any(x.group == group for x in index.by_id.get(id, [])):
+                    logging.warning(f"Job {id} ({group}) does not exist anymore")
+            success = True
+            for enabled in (True, False):
+                selected_jobs = [x for x in _job_list if states.get((x.group, x.id)) == enabled]
+                if len(selected_jobs) > 0:
+                    success = _set_jobs_enabled(jobs_scraper, enabled, selected_jobs, token, workers) and success
+        if not success:
+            sys.exit(1)
+    except requests.exceptions.ConnectionError:
+        logging.error("Could not connect to host - check your base-url")
+        sys.exit(1)
+    except Exception as exc:
+        logging.error("An error occured - check your credentials")
+        logging.error("%s", exc)
+        sys.exit(1)
+
 
-            success = jobs_scraper.enable_job(selected_job, token)
-            if success:
-                logging.info("Enabled job successfully!")
-            else:
-                logging.error("Couldn't enable job!")
-            if web:
-                browser.open_web_jobs(ctx.obj.get("base_url"))
+class WatchFormat(str, Enum):
+    table = "table"
+    ndjson = "ndjson"
+
+
+@app_job.command("watch")
+def job_watch(
+    ctx: typer.Context,
+    interval: float = typer.Option(10, min=1, help="seconds between two checks of the jobs"),
+    output: WatchFormat = typer.Option(WatchFormat.table, "--output", help="print the changes as tables or as NDJSON"),
+    spike_factor: float = typer.Option(
+        2, min=1, help="report an average duration, if it grew by this factor since the last check"
+    ),
+    hide_default: bool = typer.Option(False, help="ignore the jobs of the DEFAULT group"),
+    count: typing.Optional[int] = typer.Option(None, min=1, help="stop after this number of checks"),
+):
+    """Confluence only, watches the jobs and prints their changes (status, executions, duration spikes) until
+    interrupted"""
+
+    def print_changes(changes: typing.List[jobs.JobChange]):
+        now = datetime.datetime.now()
+        if output == WatchFormat.ndjson:
+            for change in changes:
+                event = {"time": now.isoformat(timespec="seconds"), "change": change.kind, "group": change.job.group}
+                event.update({"id": change.job.id, "name": change.job.name, "old": change.old, "new": change.new})
+                print(json.dumps(event), flush=True)
+            return
+        if len(changes) == 0:
+            return
+        table = Table(title=f"{now:%X} - {len(changes)} changes", title_justify="left")
+        table.add_column("Job", no_wrap=True)
+        table.add_column("Group")
+        table.add_column("Change")
+        table.add_column("Old")
+        table.add_column("New")
+        for change in changes:
+            table.add_row(change.job.name, change.job.group, change.kind, change.old or "", change.new or "")
+        console.print(table)
+
+    console = Console()
+    checks = 0
+    try:
+        with _jobs_scraper(ctx) as jobs_scraper:
+            previous: typing.List[jobs.Job] = []
+            # interrupts are handled within the scraper, so the session is still stored when leaving it
+            try:
+                while count is None or checks < count:
+                    if checks > 0:
+                        time.sleep(interval)
+                    _job_list, _ = jobs_scraper.list_jobs(use_cache=False)
+                    if hide_default:
+                        _job_list = [x for x in _job_list if x.group != "DEFAULT"]
+                    if checks == 0:
+                        # the first check only records the existing jobs
+                        if output == WatchFormat.table:
+                            logging.info(f"Watching {len(_job_list)} jobs - press Ctrl+C to stop")
+                    else:
+                        print_changes(jobs.diff_jobs(previous, _job_list, spike_factor))
+                    previous = _job_list
+                    checks += 1
+            except KeyboardInterrupt:
+                pass
     except requests.exceptions.ConnectionError:
         logging.error("Could not connect to host - check your base-url")
         sys.exit(1)
@@ -253,3 +518,12 @@ def job_enable(
         logging.error("An error occured - check your credentials")
         logging.error("%s", exc)
         sys.exit(1)
+
+
+@app_job.command("logout")
+def job_logout(ctx: typer.Context):
+    """Confluence only, removes the persisted admin session of the host, so the next job command authenticates again"""
+    if sessionstore.delete_session(sessionstore.session_path(ctx.obj.get("base_url"), "jobs")):
+        logging.info("Removed the persisted session")
+    else:
+        logging.info("There is no persisted session for this host and user")
@@ -1,38 +1,56 @@
 """ pluploader executable
 """
+import concurrent.futures
+import contextlib
 import json
 import logging
+import os
 import pathlib
 import sys
+import tempfile
+import threading
 import time
 import typing
 import zipfile
 from xmlrpc import client as rpcclient
 from xmlrpc.client import ProtocolError as RpcProtocolError
 
+import click
 import furl
 import requests
 import typer
 import yaml
 from click_default_group import DefaultGroup
-from packaging.version import parse as version_parse
+from packaging.version import InvalidVersion
 from rich.console import Console
 from rich.logging import RichHandler
-from rich.progress import BarColumn, Progress
+from rich.progress import (BarColumn, DownloadColumn, Progress,
+                           TransferSpeedColumn)
 from rich.table import Table
 
 from . import __version__
+from .cache import app_cache
+from .index import app_index
 from .job import app_job
 from .license import app_license
-from .mpac import download
+from .marketplace import app_mpac
+from .mpac import download, manifest, mirror
+from .mpac.cache import DEFAULT_MAX_SIZE, AppKeyCache, MetadataCache, MpacCache
 from .mpac.exceptions import MpacAppNotFoundError, MpacAppVersionNotFoundError
 from .safemode import app_safemode
+from .upm.exceptions import UploadFailedException
 from .upm.upmapi import PluginDto, UpmApi
 from .upm.upmcloudapi import UpmCloudApi
+from .util import artifact_index
 from .util import atlassian_jar as jar
-from .util import browser, pathutil
+from .util import batch as batch_util
+from .util import bench as bench_util
+from .util import (browser, httptrace, module_check, osgi, pathutil, profiling,
+                   spans)
 
 FORMAT = "%(message)s"
+# size of the chunks in which api streams responses
+API_CHUNK_SIZE = 64 * 1024
 logging.basicConfig(level="INFO", format=FORMAT, datefmt="[%X]", handlers=[RichHandler(markup=True, show_path=False)])
 
 app = typer.Typer()
@@ -40,6 +58,21 @@ app = typer.Typer()
 app.add_typer(app_safemode, name="safe-mode")
 app.add_typer(app_job, name="job")
 app.add_typer(app_license, name="license")
+app.add_typer(app_index, name="index")
+app.add_typer(app_cache, name="cache")
+app.add_typer(app_mpac, name="mpac")
+
+
+def _wrap_multiple_defaults(command: click.Command, settings: typing.Dict[str, typing.Any]):
+    """Options which can be passed multiple times (like --file) need a list as default. A single value of the
+    configuration (e.g. "file: plugin.jar") would be read as a list of characters instead, so it is wrapped in a list.
+    The settings of subcommands are nested by their name."""
+    for param in command.params:
+        if getattr(param, "multiple", False) and isinstance(settings.get(param.name), (str, int, float)):
+            settings[param.name] = [settings[param.name]]
+    for name, subcommand in getattr(command, "commands", {}).items():
+        if isinstance(settings.get(name), dict):
+            _wrap_multiple_defaults(subcommand, settings[name])
 
 
 def main():
@@ -73,6 +106,7 @@ def main():
     cmd: DefaultGroup = typer.main.get_command(app)
     cmd.default_if_no_args = True
     cmd.default_cmd_name = "install"
+    _wrap_multiple_defaults(cmd, settings)
     cmd.context_settings = {"default_map": settings}
     cmd()
 
@@ -111,6 +145,24 @@ def root(
     port: typing.Optional[int] = typer.Option(None),
     ask_for_password: typing.Optional[bool] = typer.Option(False, help="Asks user for password interactively"),
     logo: bool = typer.Option(True, help="Print logo (deprecated)"),
+    trace_http: bool = typer.Option(
+        False, "--trace-http", help="print the timing phases, bytes and status of all http requests when done"
+    ),
+    trace_http_har: typing.Optional[pathlib.Path] = typer.Option(
+        None, "--trace-http-har", help="write the traced http requests into a HAR file; implies --trace-http"
+    ),
+    profile: typing.Optional[pathlib.Path] = typer.Option(
+        None, "--profile", help="profile the command with cProfile and write the stats (pstats) into this file"
+    ),
+    profile_collapsed: typing.Optional[pathlib.Path] = typer.Option(
+        None,
+        "--profile-collapsed",
+        help="sample the stacks of all threads while the command runs and write them in the collapsed format used by "
+        "flame graph tools into this file",
+    ),
+    profile_top: int = typer.Option(
+        20, "--profile-top", min=0, help="number of functions with the highest own time printed by --profile"
+    ),
 ):
     """A simple command line plugin uploader/installer/manager for atlassian product server
     instances (Confluence/Jira) written in python(3).
@@ -119,6 +171,43 @@ def root(
         password = typer.prompt("Password: ", hide_input=True)
     burl: furl.furl = _base_url_from_args(base_url, user, password, port)
     ctx.obj = {"base_url": burl}
+    if trace_http or trace_http_har is not None:
+        _trace_http(ctx, trace_http_har)
+    if profile is not None or profile_collapsed is not None:
+        _profile(ctx, profile, profile_collapsed, profile_top)
+
+
+def _trace_http(ctx: typer.Context, har: typing.Optional[pathlib.Path]):
+    """records all http requests until the command is done"""
+    tracer = httptrace.HttpTracer().__enter__()
+
+    def report():
+        tracer.__exit__(None, None, None)
+        tracer.print_summary()
+        if har is not None:
+            tracer.write_har(har)
+            logging.info(f"Wrote {len(tracer.traces)} http requests to {har}")
+
+    ctx.call_on_close(report)
+
+
+def _profile(ctx: typer.Context, stats: typing.Optional[pathlib.Path], collapsed: typing.Optional[pathlib.Path], top: int):
+    """profiles the command until it is done"""
+    profiler = profiling.CommandProfiler(collapsed=collapsed is not None)
+
+    def report():
+        profiler.stop()
+        if stats is not None:
+            profiler.write_stats(stats)
+            if top > 0:
+                profiler.print_top(top)
+            logging.info(f"Wrote the profile to {stats}")
+        if collapsed is not None:
+            profiler.sampler.write_collapsed(collapsed)
+            logging.info(f"Wrote the collapsed stacks to {collapsed}")
+
+    ctx.call_on_close(report)
+    profiler.start()
 
 
 def _base_url_from_args(base_url: str, user: str, password: str, port: typing.Optional[int]) -> furl.furl:
@@ -298,12 +387,14 @@ def uninstall_plugin(
 def install(
     ctx: typer.Context,
     cloud: bool = typer.Option(False, "--cloud"),
-    file: typing.Optional[pathlib.Path] = typer.Option(
-        None,
+    # named file, so the "file" setting of existing configuration files is still used
+    file: typing.List[pathlib.Path] = typer.Option(
+        [],
         "--file",
         "-f",
         help="pluploader tries find an plugin in the current directory. If you want to specify the location of the plugin you "
-        "want to upload, use -f /path/to/jar",
+        "want to upload, use -f /path/to/jar. -f can be passed multiple times; the jars are then installed in the order "
+        "required by their OSGi Import-Package/Export-Package headers",
     ),
     plugin_uri: typing.Optional[str] = typer.Option(
         None,
@@ -329,20 +420,134 @@ Warning: mpac-id is considered unstable; consider using --mpac-key
 The mpac-key is the app key.\n
 To specify the version, use the == syntax: 1213057==3.10.1 will download 3.10.1""",
     ),
+    mpac_manifest: typing.Optional[pathlib.Path] = typer.Option(
+        None,
+        "--mpac-manifest",
+        help="yaml file listing multiple marketplace apps (key==version) to install; the apps are downloaded in parallel "
+        "and uploaded one after another as soon as their download is finished",
+    ),
+    mpac_download_workers: int = typer.Option(
+        4, "--mpac-download-workers", min=1, help="number of apps of --mpac-manifest downloaded in parallel"
+    ),
+    mpac_mirror: typing.Optional[str] = typer.Option(
+        None,
+        "--mpac-mirror",
+        envvar="PLUP_MPAC_MIRROR",
+        help="directory or url of a mirror created by 'pluploader mpac mirror'; --mpac-key and --mpac-manifest are "
+        "resolved against the mirror instead of the marketplace",
+    ),
+    mpac_cache: bool = typer.Option(
+        True,
+        "--mpac-cache/--no-mpac-cache",
+        help="keep apps downloaded by --mpac-key or --mpac-id in the local cache and install cached versions without "
+        "downloading them",
+    ),
+    mpac_cache_max_size: int = typer.Option(
+        DEFAULT_MAX_SIZE // (1024 * 1024),
+        "--mpac-cache-max-size",
+        envvar="PLUP_CACHE_MAX_SIZE",
+        min=0,
+        help="maximum size of the local cache in MB; the least recently used apps are removed first",
+    ),
+    mpac_ttl: int = typer.Option(
+        300,
+        "--mpac-ttl",
+        envvar="PLUP_MPAC_TTL",
+        min=0,
+        help="number of seconds the versions resolved by --mpac-key or --mpac-id (including latest) are reused without "
+        "asking the marketplace again; 0 disables it",
+    ),
+    mpac_connections: int = typer.Option(
+        download.DEFAULT_CONNECTIONS,
+        "--mpac-connections",
+        envvar="PLUP_MPAC_CONNECTIONS",
+        min=1,
+        help="number of parallel connections used to download large apps from the marketplace, if the server supports "
+        "range requests",
+    ),
+    key: typing.Optional[str] = typer.Option(
+        None, "--key", help="install the plugin with this plugin key from an artifact directory indexed by 'pluploader index'"
+    ),
+    key_version: typing.Optional[str] = typer.Option(
+        None, "--version", help="the version of the plugin specified by --key; defaults to the latest indexed version"
+    ),
+    index: typing.Optional[pathlib.Path] = typer.Option(
+        None, "--index", envvar="PLUP_INDEX", help="the artifact directory (or its index file) used to resolve --key"
+    ),
     interactive: typing.Optional[bool] = typer.Option(False, "--interactive", "-i", help="confirm the upload of the app",),
     reinstall: typing.Optional[bool] = typer.Option(
         False, "--reinstall", help="Plugin will be uninstalled before it will be installed"
     ),
+    split_obr: bool = typer.Option(
+        False,
+        "--split-obr",
+        help="Install the bundles of an .obr separately: dependency bundles missing or outdated on the instance are uploaded "
+        "in parallel before the main plugin, bundles already installed are skipped",
+    ),
+    upload_workers: int = typer.Option(
+        4,
+        "--upload-workers",
+        min=1,
+        help="number of plugins installed in parallel by --split-obr or when installing multiple jars",
+    ),
+    check_modules: bool = typer.Option(
+        True,
+        "--check-modules/--no-check-modules",
+        help="analyse the atlassian-plugin.xml and the OSGi manifest of the jar before uploading it, to find modules which "
+        "will most likely be disabled",
+    ),
+    host_exports: typing.Optional[pathlib.Path] = typer.Option(
+        None,
+        "--host-exports",
+        help="file containing the packages exported by the host (one per line or an Export-Package header); used by "
+        "--check-modules to find imports which can not be resolved",
+    ),
+    fail_on_check: bool = typer.Option(
+        False, "--fail-on-check", help="do not upload the plugin if --check-modules finds modules which will be disabled"
+    ),
     web: bool = typer.Option(False, help="open upm in web browser after installing plugin"),
+    spans_file: typing.Optional[pathlib.Path] = typer.Option(
+        None,
+        "--spans",
+        envvar="PLUP_SPANS_FILE",
+        help="append the timing of the install phases (resolve, inspect, version check, token, upload, polling) as "
+        "OpenTelemetry spans in json lines to this file",
+    ),
 ):
     """installs the plugin of the current maven project or a specified one; you can also omit install"""
     base_url: furl.furl = ctx.obj.get("base_url")
-    if cloud:
-        if plugin_uri is None:
-            raise typer.BadParameter("--plugin-uri is required when --cloud is set")
-        install_cloud(base_url, plugin_uri)
-    else:
-        install_server(base_url, file, mpac_id, mpac_key, interactive, reinstall)
+    if spans_file is not None:
+        exporter = spans.JsonLinesExporter(spans_file)
+        spans.set_exporter(exporter)
+        ctx.call_on_close(exporter.close)
+    with spans.span("install", {"server.address": base_url.host, "server.port": base_url.port, "install.cloud": cloud}):
+        if cloud:
+            if plugin_uri is None:
+                raise typer.BadParameter("--plugin-uri is required when --cloud is set")
+            install_cloud(base_url, plugin_uri)
+        else:
+            install_server(
+                base_url,
+                file,
+                mpac_id,
+                mpac_key,
+                interactive,
+                reinstall,
+                key=key,
+                key_version=key_version,
+                index=index,
+                split_obr=split_obr,
+                upload_workers=upload_workers,
+                check_modules=check_modules,
+                host_exports=host_exports,
+                fail_on_check=fail_on_check,
+                mpac_cache=MpacCache(max_size=mpac_cache_max_size * 1024 * 1024) if mpac_cache else None,
+                mpac_metadata_cache=MetadataCache(ttl=mpac_ttl) if mpac_ttl > 0 else None,
+                mpac_connections=mpac_connections,
+                mpac_manifest=mpac_manifest,
+                mpac_download_workers=mpac_download_workers,
+                mpac_mirror=mpac_mirror,
+            )
     if web:
         browser.open_web_upm(ctx.obj.get("base_url"))
 
@@ -392,37 +597,125 @@ def install_cloud(base_url: furl.furl, plugin_uri: furl.furl):
 
 def install_server(
     base_url: furl.furl,
-    file: typing.Optional[pathlib.Path],
+    files: typing.List[pathlib.Path],
     mpac_id: typing.Optional[str],
     mpac_key: typing.Optional[str],
     interactive: typing.Optional[bool],
     reinstall: typing.Optional[bool],
+    key: typing.Optional[str] = None,
+    key_version: typing.Optional[str] = None,
+    index: typing.Optional[pathlib.Path] = None,
+    split_obr: bool = False,
+    upload_workers: int = 4,
+    check_modules: bool = True,
+    host_exports: typing.Optional[pathlib.Path] = None,
+    fail_on_check: bool = False,
+    mpac_cache: typing.Optional[MpacCache] = None,
+    mpac_metadata_cache: typing.Optional[MetadataCache] = None,
+    mpac_connections: int = download.DEFAULT_CONNECTIONS,
+    mpac_manifest: typing.Optional[pathlib.Path] = None,
+    mpac_download_workers: int = 4,
+    mpac_mirror: typing.Optional[str] = None,
 ):
-    try:
-        if file is not None:
-            plugin_path = file
-        elif mpac_id is not None:
-            id, version = download.split_name_and_version(mpac_id)
-            logging.info("Downloading app %s (%s)...", id, version)
-            plugin_path = download.download_app_by_marketplace_id(id, version)
-            logging.info("Successfully downloaded app to %s", plugin_path)
-        elif mpac_key is not None:
-            key, version = download.split_name_and_version(mpac_key)
-            logging.info("Downloading app %s (%s)...", key, version)
-            plugin_path = download.download_app_by_app_key(key, version)
-            logging.info("Successfully downloaded app to %s", plugin_path)
-        else:
-            try:
-                plugin_path = pathutil.get_jar_path_from_pom()
-            except FileNotFoundError:
-                logging.error("Could not find the plugin you want to install. Are you in a maven directory?")
-                sys.exit(1)
-    except (MpacAppNotFoundError, MpacAppVersionNotFoundError) as e:
-        logging.error("Could not find the plugin or plugin version %s", e)
-        sys.exit(1)
-    except Exception as e:
-        logging.error("An error occured while downloading an app from the marketplace %s", e)
-        sys.exit(1)
+    def download_app(key: str, version: str, progress: download.ProgressCallback) -> pathlib.Path:
+        if mpac_mirror is not None:
+            return mirror.download_app_from_mirror(mpac_mirror, key, version, progress, index=mirror_index)
+        return download.download_app_by_app_key(
+            key,
+            version,
+            progress,
+            cache=mpac_cache,
+            metadata_cache=mpac_metadata_cache,
+            connections=mpac_connections,
+        )
+
+    mirror_index = None
+    if mpac_mirror is not None and (mpac_key is not None or mpac_manifest is not None):
+        try:
+            mirror_index = mirror.load_mirror_index(mpac_mirror)
+        except (FileNotFoundError, ValueError, requests.exceptions.RequestException) as e:
+            logging.error("Could not read the index of the mirror %s: %s", mpac_mirror, e)
+            sys.exit(1)
+
+    if mpac_manifest is not None:
+        try:
+            apps = manifest.read_manifest(mpac_manifest)
+        except FileNotFoundError:
+            logging.error("Could not find the manifest %s", mpac_manifest)
+            sys.exit(1)
+        except manifest.ManifestError as e:
+            logging.error("%s", e)
+            sys.exit(1)
+        _install_mpac_apps(
+            UpmApi(base_url),
+            base_url,
+            apps,
+            mpac_download_workers,
+            download_app,
+        )
+        return
+
+    plugin_paths: typing.List[pathlib.Path] = []
+    source = "file" if files else "mpac-id" if mpac_id else "mpac-key" if mpac_key else "index" if key else "maven"
+    with spans.span("resolve artifact", {"artifact.source": source}) as resolve_span:
+        try:
+            if len(files) > 1:
+                plugin_paths = files
+            elif len(files) == 1:
+                plugin_path = files[0]
+            elif mpac_id is not None:
+                id, version = download.split_name_and_version(mpac_id)
+                logging.info("Downloading app %s (%s)...", id, version)
+                with _download_progress() as progress:
+                    plugin_path = download.download_app_by_marketplace_id(
+                        id,
+                        version,
+                        progress,
+                        mpac_connections,
+                        cache=mpac_cache,
+                        metadata_cache=mpac_metadata_cache,
+                        app_key_cache=AppKeyCache(),
+                    )
+                logging.info("Successfully downloaded app to %s", plugin_path)
+            elif mpac_key is not None:
+                key, version = download.split_name_and_version(mpac_key)
+                logging.info("Downloading app %s (%s)...", key, version)
+                with _download_progress() as progress:
+                    plugin_path = download_app(key, version, progress)
+                logging.info("Successfully downloaded app to %s", plugin_path)
+            elif key is not None:
+                if index is None:
+                    logging.error("--index is required when installing a plugin by --key")
+                    sys.exit(1)
+                try:
+                    plugin_path = artifact_index.load_index(index).resolve(key, key_version)
+                except FileNotFoundError:
+                    logging.error("%s has not been indexed yet - run pluploader index build first", index)
+                    sys.exit(1)
+                logging.info("Resolved %s (%s) to %s", key, key_version or "latest", plugin_path)
+            else:
+                try:
+                    plugin_path = pathutil.get_jar_path_from_pom()
+                    if not plugin_path.exists():
+                        # the project might be a maven reactor, whose modules are the plugins to install
+                        plugin_paths = pathutil.get_jar_paths_from_reactor()
+                        if len(plugin_paths) == 1:
+                            plugin_path = plugin_paths[0]
+                except FileNotFoundError:
+                    logging.error("Could not find the plugin you want to install. Are you in a maven directory?")
+                    sys.exit(1)
+        except (MpacAppNotFoundError, MpacAppVersionNotFoundError) as e:
+            logging.error("Could not find the plugin or plugin version %s", e)
+            sys.exit(1)
+        except artifact_index.ArtifactNotFoundError as e:
+            logging.error("%s - run pluploader index build to update the index", e)
+            sys.exit(1)
+        except Exception as e:
+            logging.error("An error occured while downloading an app from the marketplace %s", e)
+            sys.exit(1)
+        if len(plugin_paths) <= 1 and pathlib.Path(plugin_path).exists():
+            resolve_span.set_attribute("artifact.path", str(plugin_path))
+            resolve_span.set_attribute("artifact.bytes", pathlib.Path(plugin_path).stat().st_size)
 
     if interactive:
         confirm = input("Do you really want to upload and install the plugin? (y/N) ")
@@ -430,14 +723,28 @@ def install_server(
             sys.exit()
 
     upm = UpmApi(base_url)
-    if plugin_path.suffix == ".obr":
-        plugin_info = jar.get_plugin_info_from_obr_path(plugin_path)
-    else:
-        plugin_info = jar.get_plugin_info_from_jar_path(plugin_path)
+    if len(plugin_paths) > 1:
+        if reinstall:
+            logging.warning("--reinstall is not supported when installing multiple jars and will be ignored")
+        _install_jars_in_waves(upm, base_url, plugin_paths, upload_workers)
+        return
+
+    with spans.span("inspect artifact", {"artifact.path": str(plugin_path)}) as inspect_span:
+        if plugin_path.suffix == ".obr":
+            plugin_info = jar.get_plugin_info_from_obr_path(plugin_path)
+        else:
+            plugin_info = jar.get_plugin_info_from_jar_path(plugin_path)
+            if check_modules:
+                _check_modules(plugin_path, host_exports, fail_on_check)
+        inspect_span.set_attribute("plugin.key", plugin_info.key)
+        inspect_span.set_attribute("plugin.version", plugin_info.version)
+    if spans.current_span() is not None:
+        spans.current_span().set_attribute("plugin.key", plugin_info.key)
     if reinstall:
         try:
             try:
-                status = upm.uninstall_plugin(plugin_info.key)
+                with spans.span("uninstall", {"plugin.key": plugin_info.key}):
+                    status = upm.uninstall_plugin(plugin_info.key)
             except requests.exceptions.ConnectionError:
                 logging.error("Could not connect to host - check your base-url")
                 sys.exit(1)
@@ -452,13 +759,11 @@ def install_server(
         except (FileNotFoundError, zipfile.BadZipFile, KeyError, pathutil.PluginKeyNotFoundError):
             logging.error("Could not get the plugin key of the supplied jar - are you sure you want to upload a plugin, mate?")
     else:
-        # WORKAROUND: replace -SNAPSHOT with .dev, to follow python versioning scheme
-        # TODO: find a new library that can parse -SNAPSHOT correctly
-        version_to_install = version_parse(plugin_info.version.replace("-SNAPSHOT", ".dev"))
+        version_to_install = jar.parse_plugin_version(plugin_info.version)
         try:
-            # WORKAROUND: replace -SNAPSHOT with .dev, to follow python versioning scheme
-            # TODO: find a new library that can parse -SNAPSHOT correctly
-            version_installed = version_parse(upm.get_plugin(plugin_info.key).version.replace("-SNAPSHOT", ".dev"))
+            with spans.span("version check", {"plugin.key": plugin_info.key}) as version_span:
+                version_installed = jar.parse_plugin_version(upm.get_plugin(plugin_info.key).version)
+                version_span.set_attribute("plugin.installed_version", str(version_installed))
             if version_installed > version_to_install:
                 logging.warning(
                     f"Looks like you are trying to install a .jar with a lower version ({version_to_install}) than already "
@@ -470,11 +775,16 @@ def install_server(
             # In this case, we can just ignore the error and perceed
             pass
 
+    if split_obr and plugin_path.suffix == ".obr":
+        _install_obr_bundles(upm, base_url, plugin_path, upload_workers)
+        return
+
     displayed_base_url = base_url.copy().remove(username=True, password=True)
     logging.info(f"{pathlib.Path(plugin_path).name} will be uploaded to {displayed_base_url}")
 
     try:
-        token = upm.get_token()
+        with spans.span("fetch token"):
+            token = upm.get_token()
     except requests.exceptions.RequestException:
         logging.error("Could not connect to host - check your base-url")
         sys.exit(1)
@@ -483,29 +793,101 @@ def install_server(
         sys.exit(1)
 
     try:
-        with open(plugin_path, "rb") as plugin_file:
-            files = {"plugin": plugin_file}
-            with Progress(
-                "[progress.description]{task.description}",
-                "[[blue]{task.percentage:>3.0f}%[reset]]",
-                BarColumn(bar_width=None, complete_style="blue", finished_style="blue"),
-            ) as pbar:
-                task = pbar.add_task("[blue]Installing...", total=100)
-                progress, previous_request = upm.upload_plugin(files, token)
-                while progress != 100:
-                    progress, previous_request = upm.get_current_progress(previous_request)
-                    pbar.update(task, completed=progress)
-                    time.sleep(0.1)
+        with Progress(
+            "[progress.description]{task.description}",
+            "[[blue]{task.percentage:>3.0f}%[reset]]",
+            BarColumn(bar_width=None, complete_style="blue", finished_style="blue"),
+        ) as pbar:
+            task = pbar.add_task("[blue]Installing...", total=100)
+            previous_request = _upload_plugin_file(upm, plugin_path, token, pbar, task)
     except requests.exceptions.RequestException:
         logging.error("An error occured while uploading plugin")
         sys.exit(1)
     except FileNotFoundError:
         logging.error("Could not find the plugin you want to install.")
         sys.exit(1)
-    finally:
-        for file in files.values():
-            file.close()
 
+    _log_install_result(upm, previous_request)
+
+
+@contextlib.contextmanager
+def _download_progress() -> typing.Iterator[download.ProgressCallback]:
+    """shows a progress bar for a marketplace download; yields the progress callback for the download"""
+    with Progress(
+        "[progress.description]{task.description}",
+        BarColumn(bar_width=None, complete_style="blue", finished_style="blue"),
+        DownloadColumn(),
+        TransferSpeedColumn(),
+    ) as pbar:
+        task = pbar.add_task("[blue]Downloading...", total=0)
+
+        def progress(completed: int, total: typing.Optional[int]):
+            pbar.update(task, completed=completed, total=total)
+
+        yield progress
+
+
+def _check_modules(plugin_path: pathlib.Path, host_exports_path: typing.Optional[pathlib.Path], fail_on_check: bool):
+    """logs the modules of the plugin, which will most likely be disabled after the installation"""
+    try:
+        host_exports = None
+        if host_exports_path is not None:
+            host_exports = module_check.read_host_exports(host_exports_path)
+        problems = module_check.predict_disabled_modules(plugin_path, host_exports)
+    except (FileNotFoundError, zipfile.BadZipFile, KeyError) as e:
+        logging.warning("Could not analyse the modules of your plugin: %s", e)
+        return
+    if len(problems) == 0:
+        return
+    logging.warning(f"Found {len(problems)} problems, which will most likely cause modules of your plugin to be disabled:")
+    for problem in problems:
+        logging.warning(f"   - {problem.module_key} ({problem.module_type}): {problem.reason}")
+    if fail_on_check:
+        logging.error("The plugin will not be uploaded, as --fail-on-check is set")
+        sys.exit(1)
+
+
+def _fetch_upm_token(upm: UpmApi) -> str:
+    """Raises:
+    UploadFailedException: If the upm did not return a token
+    """
+    with spans.span("fetch token"):
+        try:
+            return upm.get_token()
+        except KeyError:
+            raise UploadFailedException("UPM Token couldn't be retrieved; are your credentials correct?")
+
+
+def _upload_plugin_file(upm: UpmApi, plugin_path: pathlib.Path, token: str, pbar: Progress, task: int) -> dict:
+    """uploads a plugin file and polls the upm until the installation is finished; returns the last upm response"""
+    progress, previous_request = _upload_plugin(upm, plugin_path, token)
+    return _wait_for_installation(upm, plugin_path, progress, previous_request, pbar, task)
+
+
+def _upload_plugin(upm: UpmApi, plugin_path: pathlib.Path, token: str) -> typing.Tuple[int, dict]:
+    with spans.span("upload", {"artifact.path": str(plugin_path)}) as upload_span:
+        with open(plugin_path, "rb") as plugin_file:
+            upload_span.set_attribute("artifact.bytes", os.fstat(plugin_file.fileno()).st_size)
+            return upm.upload_plugin({"plugin": plugin_file}, token)
+
+
+def _wait_for_installation(
+    upm: UpmApi, plugin_path: pathlib.Path, progress: int, previous_request: dict, pbar: Progress, task: int
+) -> dict:
+    """polls the upm until the installation of an uploaded plugin is finished; returns the last upm response"""
+    with spans.span("wait for installation", {"artifact.path": str(plugin_path)}) as poll_span:
+        polls = 0
+        while progress != 100:
+            progress, previous_request = upm.get_current_progress(previous_request)
+            polls += 1
+            pbar.update(task, completed=progress)
+            time.sleep(0.1)
+        poll_span.set_attribute("upm.polls", polls)
+    pbar.update(task, completed=100)
+    return previous_request
+
+
+def _log_install_result(upm: UpmApi, previous_request: dict):
     plugin_data = PluginDto.decode(previous_request)
 
     if plugin_data.enabled:
@@ -531,40 +913,441 @@ def install_server(
         logging.error("Check the logs of your Atlassian host to find out more.")
 
 
+def _install_obr_bundles(upm: UpmApi, base_url: furl.furl, obr_path: pathlib.Path, upload_workers: int):
+    """installs the bundles of an obr separately. Dependency bundles, which are missing or outdated on the instance, are
+    uploaded in parallel; the main plugin is uploaded afterwards.
+    """
+    try:
+        bundles = jar.get_bundles_from_obr_path(obr_path)
+    except (FileNotFoundError, zipfile.BadZipFile, KeyError, pathutil.PluginKeyNotFoundError) as e:
+        logging.error("Could not read the bundles of %s: %s", obr_path, e)
+        sys.exit(1)
+    try:
+        installed = {x.key: x.version for x in upm.get_all_plugins(False)}
+    except requests.exceptions.RequestException:
+        logging.error("Could not connect to host - check your base-url")
+        sys.exit(1)
+
+    to_install: typing.List[jar.ObrBundle] = []
+    for bundle in bundles:
+        installed_version = installed.get(bundle.info.key)
+        if installed_version is not None and _is_up_to_date(installed_version, bundle.info.version):
+            logging.info(f"{bundle.info.key} is already installed (v{installed_version}) - skipping")
+            continue
+        to_install.append(bundle)
+    if len(to_install) == 0:
+        logging.info("All bundles of the obr are already installed")
+        return
+
+    displayed_base_url = base_url.copy().remove(username=True, password=True)
+    logging.info(f"{len(to_install)} of {len(bundles)} bundles of {obr_path.name} will be uploaded to {displayed_base_url}")
+
+    dependencies = [x for x in to_install if not x.is_main]
+    main_bundles = [x for x in to_install if x.is_main]
+    with tempfile.TemporaryDirectory(prefix="pluploader-") as tmp_dir:
+        paths = jar.extract_jars_from_obr(obr_path, [x.filename for x in to_install], pathlib.Path(tmp_dir))
+        results = _upload_plugin_files_in_waves(
+            upm,
+            [[(x.info.key, paths[x.filename]) for x in dependencies], [(x.info.key, paths[x.filename]) for x in main_bundles]],
+            upload_workers,
+        )
+
+    for previous_request in results:
+        _log_install_result(upm, previous_request)
+
+
+def _is_up_to_date(installed_version: str, version: str) -> bool:
+    """whether installed_version is at least version. Versions which can not be parsed (e.g. OSGi qualifiers like
+    2.3.0.v20200101) are only considered up to date if they are equal."""
+    try:
+        return jar.parse_plugin_version(installed_version) >= jar.parse_plugin_version(version)
+    except InvalidVersion:
+        return installed_version == version
+
+
+def _install_jars_in_waves(upm: UpmApi, base_url: furl.furl, plugin_paths: typing.List[pathlib.Path], upload_workers: int):
+    """installs multiple jars in the order required by their OSGi package wiring. Jars which do not depend on each
+    other are uploaded in parallel.
+    """
+    try:
+        plan = osgi.plan_install_waves([osgi.BundleManifest.from_jar_path(x) for x in plugin_paths])
+    except (FileNotFoundError, zipfile.BadZipFile, KeyError) as e:
+        logging.error("Could not read the manifest of the jars you want to install: %s", e)
+        sys.exit(1)
+    except osgi.DependencyCycleError as e:
+        logging.error("The jars you want to install import packages from each other in a cycle: %s", e)
+        sys.exit(1)
+
+    for path, clauses in plan.unresolved_imports.items():
+        logging.info(
+            f"{path.name} imports {len(clauses)} packages, which are not exported by the supplied jars and have to be "
+            "provided by the host"
+        )
+        for clause in clauses:
+            logging.debug(f"   - {clause.name}{' (optional)' if clause.optional else ''}")
+    for idx, wave in enumerate(plan.waves):
+        logging.info(f"wave {idx + 1}: {', '.join(x.path.name for x in wave)}")
+
+    displayed_base_url = base_url.copy().remove(username=True, password=True)
+    logging.info(f"{len(plugin_paths)} jars will be uploaded to {displayed_base_url}")
+
+    waves = [[(x.path.name, x.path) for x in wave] for wave in plan.waves]
+    results = _upload_plugin_files_in_waves(upm, waves, upload_workers)
+    for previous_request in results:
+        _log_install_result(upm, previous_request)
+
+
+def _install_mpac_apps(
+    upm: UpmApi,
+    base_url: furl.furl,
+    apps: typing.List[typing.Tuple[str, str]],
+    download_workers: int,
+    download_app: typing.Callable[[str, str, download.ProgressCallback], pathlib.Path],
+):
+    """downloads the marketplace apps, given as (key, version), in parallel and uploads every app as soon as its
+    download is finished. Uploads are done one after another, as the upm installs one plugin at a time anyway.
+    """
+    displayed_base_url = base_url.copy().remove(username=True, password=True)
+    logging.info(f"{len(apps)} apps will be downloaded and uploaded to {displayed_base_url}")
+
+    failed = []
+    with Progress(
+        "[progress.description]{task.description}",
+        BarColumn(bar_width=None, complete_style="blue", finished_style="blue"),
+        "[[blue]{task.percentage:>3.0f}%[reset]]",
+    ) as pbar:
+        tasks = [pbar.add_task(f"[blue]{key} ({version}) waiting", total=0) for key, version in apps]
+
+        def download_progress(task: int) -> download.ProgressCallback:
+            def progress(completed: int, total: typing.Optional[int]):
+                pbar.update(task, completed=completed, total=total)
+
+            return progress
+
+        install_span = spans.current_span()
+
+        def download_one(idx: int) -> pathlib.Path:
+            key, version = apps[idx]
+            pbar.update(tasks[idx], description=f"[blue]{key} ({version}) downloading")
+            with spans.span("resolve artifact", {"plugin.key": key, "plugin.version": version}, parent=install_span) as x:
+                plugin_path = download_app(key, version, download_progress(tasks[idx]))
+                x.set_attribute("artifact.path", str(plugin_path))
+                x.set_attribute("artifact.bytes", pathlib.Path(plugin_path).stat().st_size)
+            return plugin_path
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=download_workers) as executor:
+            futures = {executor.submit(download_one, idx): idx for idx in range(len(apps))}
+            for future in concurrent.futures.as_completed(futures):
+                idx = futures[future]
+                key, version = apps[idx]
+                try:
+                    plugin_path = future.result()
+                except (MpacAppNotFoundError, MpacAppVersionNotFoundError) as e:
+                    logging.error("Could not find the app %s (%s): %s", key, version, e)
+                    failed.append(key)
+                    pbar.update(tasks[idx], description=f"[red]{key} ({version}) failed")
+                    continue
+                except Exception as e:
+                    logging.error("An error occured while downloading the app %s (%s): %s", key, version, e)
+                    failed.append(key)
+                    pbar.update(tasks[idx], description=f"[red]{key} ({version}) failed")
+                    continue
+                pbar.update(tasks[idx], description=f"[blue]{key} ({version}) installing", completed=0, total=100)
+                try:
+                    with spans.span("install plugin", {"plugin.key": key, "plugin.version": version}):
+                        # a upm token is consumed by the upload using it, so every app needs a fresh one
+                        token = _fetch_upm_token(upm)
+                        previous_request = _upload_plugin_file(upm, plugin_path, token, pbar, tasks[idx])
+                except (UploadFailedException, requests.exceptions.RequestException, KeyError, ValueError) as e:
+                    logging.error("An error occured while uploading the app %s: %s", key, e)
+                    failed.append(key)
+                    pbar.update(tasks[idx], description=f"[red]{key} ({version}) failed")
+                    continue
+                pbar.update(tasks[idx], description=f"[blue]{key} ({version}) installed")
+                _log_install_result(upm, previous_request)
+
+    if len(failed) > 0:
+        logging.error(f"{len(failed)} of {len(apps)} apps could not be installed: {', '.join(failed)}")
+        sys.exit(1)
+
+
+def _upload_plugin_files_in_waves(
+    upm: UpmApi, waves: typing.List[typing.List[typing.Tuple[str, pathlib.Path]]], upload_workers: int
+) -> typing.List[dict]:
+    """uploads the plugin files wave by wave; the installations of the files of a wave, given as (description, path),
+    are awaited in parallel. The uploads themselves are done one after another, as a upm token is only valid for the
+    upload of a single file. Returns the last upm response of each upload.
+    """
+    results = []
+    upload_lock = threading.Lock()
+    try:
+        with Progress(
+            "[progress.description]{task.description}",
+            "[[blue]{task.percentage:>3.0f}%[reset]]",
+            BarColumn(bar_width=None, complete_style="blue", finished_style="blue"),
+        ) as pbar:
+            for wave_idx, wave in enumerate(waves):
+                tasks = [pbar.add_task(f"[blue]{description}", total=100) for description, _ in wave]
+
+                def upload(idx: int) -> dict:
+                    with spans.span("install plugin", {"artifact.path": str(wave[idx][1])}, parent=wave_span):
+                        with upload_lock:
+                            token = _fetch_upm_token(upm)
+                            progress, previous_request = _upload_plugin(upm, wave[idx][1], token)
+                        return _wait_for_installation(upm, wave[idx][1], progress, previous_request, pbar, tasks[idx])
+
+                with spans.span("install wave", {"install.wave": wave_idx + 1, "install.wave.size": len(wave)}) as wave_span:
+                    with concurrent.futures.ThreadPoolExecutor(max_workers=upload_workers) as executor:
+                        results += list(executor.map(upload, range(len(wave))))
+    except UploadFailedException as e:
+        logging.error("%s", e)
+        sys.exit(1)
+    except (requests.exceptions.RequestException, KeyError, ValueError) as e:
+        logging.error("An error occured while uploading plugin: %s", e)
+        sys.exit(1)
+    except FileNotFoundError:
+        logging.error("Could not find the plugin you want to install.")
+        sys.exit(1)
+    return results
+
+
 @app.command("api")
 def api(
     ctx: typer.Context,
-    endpoint: str = typer.Argument(..., help="path of the endpoint you want to use"),
+    endpoint: typing.Optional[str] = typer.Argument(None, help="path of the endpoint you want to use"),
     body: str = typer.Argument("", help="body of the request you want to send"),
     method: str = typer.Option("GET", "-X", help="choose http method",),
     header: typing.List[str] = typer.Option([], "-H", help="Provide additional headers",),
+    batch: typing.Optional[pathlib.Path] = typer.Option(
+        None,
+        "--batch",
+        help='JSON lines file (- for stdin) with one request per line, e.g. {"method": "POST", "path": "/rest/...", '
+        '"headers": {...}, "body": ...}; the responses are printed as JSON lines in the order of the requests',
+    ),
+    workers: int = typer.Option(4, "--workers", min=1, help="number of requests of --batch sent in parallel"),
+    bench: bool = typer.Option(False, "--bench", help="send the request repeatedly and report its latency profile"),
+    concurrency: int = typer.Option(4, "--concurrency", min=1, help="number of workers sending requests with --bench"),
+    duration: typing.Optional[float] = typer.Option(None, "--duration", min=0, help="seconds to run --bench for"),
+    bench_requests: typing.Optional[int] = typer.Option(
+        None, "--requests", min=1, help="number of requests sent by --bench (default: 100, unless --duration is set)"
+    ),
+    json_output: bool = typer.Option(False, "--json", help="print the report of --bench as json"),
+    output: typing.Optional[pathlib.Path] = typer.Option(
+        None,
+        "--output",
+        "-o",
+        help="write the response body (or the json lines of --batch and --paginate) into a file instead of stdout",
+    ),
+    paginate: bool = typer.Option(
+        False,
+        "--paginate",
+        help="follow _links.next (or start/limit, startAt/maxResults) of paged responses and print the items of all "
+        "pages as json lines",
+    ),
 ):
-    """Make an authenticated request to the atlassian product server"""
+    """Make an authenticated request to the atlassian product server. The response body is streamed, so large
+    responses are not held in memory."""
     base_url: furl.furl = ctx.obj.get("base_url")
+    if bench and output is not None:
+        raise typer.BadParameter("--output can not be used together with --bench")
+    if batch is not None:
+        with open(output, "w") if output is not None else contextlib.nullcontext(sys.stdout) as out:
+            _api_batch(base_url, batch, workers, out)
+        return
+    if endpoint is None:
+        raise typer.BadParameter("the endpoint is required, unless --batch is used")
 
     session = requests.Session()
+    req = _api_request(
+        base_url, endpoint, method, {x.split(":", 1)[0].strip(): x.split(":", 1)[1].strip() for x in header}, body
+    )
+    if bench:
+        if duration is None and bench_requests is None:
+            bench_requests = 100
+        _api_bench(session, req, concurrency, duration, bench_requests, json_output)
+        return
+    if paginate:
+        with open(output, "w") if output is not None else contextlib.nullcontext(sys.stdout) as out:
+            _api_paginate(session, base_url, req, out)
+        return
+    prepared = req.prepare()
+    response = session.send(prepared, stream=True)
+    with response, (open(output, "wb") if output is not None else contextlib.nullcontext(sys.stdout.buffer)) as out:
+        last_chunk = b""
+        for chunk in response.iter_content(chunk_size=API_CHUNK_SIZE):
+            out.write(chunk)
+            last_chunk = chunk or last_chunk
+        if output is None and not last_chunk.endswith(b"\n"):
+            out.write(b"\n")
+        out.flush()
+
+
+def _api_paginate(session: requests.Session, base_url: furl.furl, req: requests.Request, out: typing.TextIO):
+    """prints the items of every page as json lines. The next page is taken from _links.next (confluence),
+    start/limit/isLastPage (bitbucket) or startAt/maxResults/total (jira); responses which are not paged are printed
+    as they are."""
+    while True:
+        response = session.send(req.prepare())
+        if response.status_code >= 400:
+            url = furl.furl(response.url).remove(username=True, password=True)
+            logging.error(f"{req.method} {url} failed with status {response.status_code}: {response.text}")
+            sys.exit(1)
+        try:
+            page = response.json()
+        except ValueError:
+            logging.error(f"{furl.furl(response.url).remove(username=True, password=True)} did not return json")
+            sys.exit(1)
+        items = None
+        if isinstance(page, dict):
+            items = next((page[x] for x in ["results", "values", "issues"] if isinstance(page.get(x), list)), None)
+        if items is None:
+            batch_util.print_ndjson(page, out)
+            return
+        for item in items:
+            batch_util.print_ndjson(item, out)
+
+        next_link = page.get("_links", {}).get("next")
+        if next_link is not None:
+            req = _api_request(base_url, next_link, req.method, req.headers, "")
+            continue
+        if page.get("isLastPage", True) is False or (
+            "isLastPage" not in page and "limit" in page and len(items) > 0 and len(items) >= page["limit"]
+        ):
+            start = page.get("nextPageStart", page.get("start", 0) + len(items))
+            req.url = furl.furl(req.url).set(args={**furl.furl(req.url).args, "start": start}).url
+            continue
+        if "startAt" in page and "maxResults" in page and len(items) > 0 and page.get("isLast") is not True:
+            start_at = page["startAt"] + len(items)
+            if "total" not in page or start_at < page["total"]:
+                req.url = furl.furl(req.url).set(args={**furl.furl(req.url).args, "startAt": start_at}).url
+                continue
+        return
+
+
+def _api_request(
+    base_url: furl.furl, endpoint: str, method: str, headers: typing.Dict[str, str], body: typing.Any
+) -> requests.Request:
     endpoint_f = furl.furl(endpoint)
     url = base_url.copy().add(path=endpoint_f.path).set(query=str(endpoint_f.query))
     req = requests.Request(method=method, url=url)
     req.headers = {
         **req.headers,
-        **{x.split(":", 1)[0].strip(): x.split(":", 1)[1].strip() for x in header},
+        **headers,
     }
     if method.lower() == "post" or method.lower() == "put":
-        req.data = body
+        if isinstance(body, (dict, list)):
+            req.json = body
+        else:
+            req.data = body
+    return req
+
 
+def _api_bench(
+    session: requests.Session,
+    req: requests.Request,
+    concurrency: int,
+    duration: typing.Optional[float],
+    bench_requests: typing.Optional[int],
+    json_output: bool,
+):
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=concurrency)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
     prepared = req.prepare()
-    response = session.send(prepared)
-    print(response.text)
+
+    def send() -> int:
+        response = session.send(prepared.copy())
+        # read the whole body, so the connection can be reused
+        response.content
+        return response.status_code
+
+    if not json_output:
+        logging.info(f"Sending {req.method} {furl.furl(req.url).remove(username=True, password=True)} ...")
+    result = bench_util.run_bench(send, concurrency, duration=duration, requests=bench_requests)
+    if json_output:
+        print(json.dumps(result.encode(), indent=2))
+        return
+    report = result.encode()
+    table = Table()
+    table.add_column("latency")
+    table.add_column("ms", justify="right")
+    for name, latency in report["latencyMs"].items():
+        table.add_row(name, f"{latency:.2f}")
+    histogram = Table()
+    histogram.add_column("histogram")
+    histogram.add_column("requests", justify="right")
+    for bucket, count in report["histogram"].items():
+        histogram.add_row(bucket, str(count))
+    console = Console()
+    console.print(f"{report['requests']} requests in {report['duration']}s ({report['throughput']} req/s)")
+    console.print(table)
+    console.print(histogram)
+    status_codes = ", ".join(f"{code}: {count}" for code, count in sorted(report["statusCodes"].items()))
+    console.print(f"errors: {report['errors']} ({report['errorRate']:.2%}) - status codes: {status_codes}")
+
+
+def _api_batch(base_url: furl.furl, batch: pathlib.Path, workers: int, out: typing.TextIO):
+    """sends the requests of a JSON lines file over one session, whose connection pool is shared by the workers"""
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+
+    def send(line: typing.Tuple[int, typing.Any]) -> typing.Tuple[requests.Response, float]:
+        _, obj = line
+        if isinstance(obj, ValueError):
+            raise obj
+        if not isinstance(obj, dict) or not isinstance(obj.get("path"), str):
+            raise ValueError('every line has to be an object like {"method": "GET", "path": "/rest/api/space"}')
+        req = _api_request(base_url, obj["path"], obj.get("method", "GET"), obj.get("headers", {}), obj.get("body", ""))
+        start = time.perf_counter()
+        response = session.send(session.prepare_request(req))
+        return response, time.perf_counter() - start
+
+    failed = 0
+    try:
+        for (line_number, obj), future in batch_util.ordered_map(send, batch_util.read_jsonl(batch), workers):
+            output = {
+                "line": line_number,
+                "method": obj.get("method", "GET") if isinstance(obj, dict) else None,
+                "path": obj.get("path") if isinstance(obj, dict) else None,
+            }
+            try:
+                response, elapsed = future.result()
+            except Exception as e:
+                output["error"] = str(e)
+                failed += 1
+                batch_util.print_ndjson(output, out)
+                continue
+            output["status"] = response.status_code
+            output["elapsed_ms"] = round(elapsed * 1000, 1)
+            try:
+                output["body"] = response.json()
+            except ValueError:
+                output["body"] = response.text
+            batch_util.print_ndjson(output, out)
+    except FileNotFoundError:
+        logging.error("Could not find the batch file %s", batch)
+        sys.exit(1)
+    if failed > 0:
+        logging.error(f"{failed} requests failed")
+        sys.exit(1)
 
 
 @app.command("rpc",)
 def rpc(
     ctx: typer.Context,
-    method: str = typer.Argument(..., help="method you want to execute on the remote confluence"),
-    arguments: typing.List[str] = typer.Argument(
-        ..., help="all arguments you want to pass to the method with. For classes/objects, provide a json string.",
+    method: typing.Optional[str] = typer.Argument(None, help="method you want to execute on the remote confluence"),
+    arguments: typing.Optional[typing.List[str]] = typer.Argument(
+        None, help="all arguments you want to pass to the method with. For classes/objects, provide a json string.",
     ),
+    batch: typing.Optional[pathlib.Path] = typer.Option(
+        None,
+        "--batch",
+        help='JSON lines file (- for stdin) with one call per line, e.g. {"method": "addUser", "args": [...]}; the results '
+        "are printed as JSON lines in the order of the calls",
+    ),
+    workers: int = typer.Option(4, "--workers", min=1, help="number of calls of --batch executed in parallel"),
 ):
     """
     this command allows interaction with the (deprecated, but  still functional)
@@ -577,6 +1360,8 @@ def rpc(
 
         pluploader rpc addUser '{"name":"charlie", "fullname": "charlie", "email":"charlie@charlie"}' charlie
 
+        pluploader rpc --batch calls.jsonl
+
     You can find all available methods that the rpc-api offers in this documentation:
 
     https://developer.atlassian.com/server/confluence/remote-confluence-methods/
@@ -591,11 +1376,16 @@ def rpc(
         return return_val
 
     base_url: furl.furl = ctx.obj.get("base_url")
+    if batch is not None:
+        _rpc_batch(base_url, batch, workers)
+        return
+    if method is None:
+        raise typer.BadParameter("the method is required, unless --batch is used")
     with rpcclient.ServerProxy(str(base_url.add(path="rpc/xmlrpc"))) as proxy:
         try:
             token = proxy.confluence2.login(base_url.username, base_url.password)
             method = getattr(proxy.confluence2, method)
-            response = method(token, *map(try_to_json, arguments))
+            response = method(token, *map(try_to_json, arguments or []))
             print(json.dumps(response, default=str))
         except RpcProtocolError as e:
             logging.error("An error occured: %s", e)
@@ -605,5 +1395,53 @@ def rpc(
             logging.error("An error occured: %s", e)
 
 
+def _rpc_batch(base_url: furl.furl, batch: pathlib.Path, workers: int):
+    """executes the calls of a JSON lines file over one login. Every worker thread uses its own proxy, whose transport
+    keeps the connection alive between calls."""
+    rpc_url = str(base_url.copy().add(path="rpc/xmlrpc"))
+    proxies = threading.local()
+
+    def get_proxy() -> rpcclient.ServerProxy:
+        if not hasattr(proxies, "proxy"):
+            proxies.proxy = rpcclient.ServerProxy(rpc_url, allow_none=True)
+        return proxies.proxy
+
+    try:
+        token = get_proxy().confluence2.login(base_url.username, base_url.password)
+    except RpcProtocolError as e:
+        logging.error("An error occured: %s", e)
+        if e.errcode == 403:
+            logging.error("Do you have xml-rpc enabled?")
+        sys.exit(1)
+    except Exception as e:
+        logging.error("An error occured: %s", e)
+        sys.exit(1)
+
+    def execute(call: typing.Tuple[int, typing.Any]) -> typing.Any:
+        _, obj = call
+        if isinstance(obj, ValueError):
+            raise obj
+        if not isinstance(obj, dict) or not isinstance(obj.get("method"), str):
+            raise ValueError('every line has to be an object like {"method": "getSpaces", "args": []}')
+        return getattr(get_proxy().confluence2, obj["method"])(token, *obj.get("args", []))
+
+    failed = 0
+    try:
+        for (line_number, obj), future in batch_util.ordered_map(execute, batch_util.read_jsonl(batch), workers):
+            output = {"line": line_number, "method": obj.get("method") if isinstance(obj, dict) else None}
+            try:
+                output["result"] = future.result()
+            except Exception as e:
+                output["error"] = str(e)
+                failed += 1
+            batch_util.print_ndjson(output)
+    except FileNotFoundError:
+        logging.error("Could not find the batch file %s", batch)
+        sys.exit(1)
+    if failed > 0:
+        logging.error(f"{failed} calls failed")
+        sys.exit(1)
+
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,74 @@
+import logging
+import pathlib
+import sys
+import typing
+
+import requests
+import typer
+
+from .mpac import manifest, mirror
+from .mpac.exceptions import MpacAppNotFoundError
+
+app_mpac = typer.Typer()
+
+
+@app_mpac.callback()
+def mpac(ctx: typer.Context):
+    """Work with apps of the atlassian marketplace"""
+
+
+@app_mpac.command("mirror")
+def mpac_mirror(
+    ctx: typer.Context,
+    directory: pathlib.Path = typer.Argument(..., help="the directory of the mirror", file_okay=False),
+    apps: typing.List[str] = typer.Argument(
+        None, help="app keys with an optional version range, e.g. 'com.example.app>=1.2,<2.0'; the latest version is "
+        "mirrored if no range is given",
+    ),
+    manifest_path: typing.Optional[pathlib.Path] = typer.Option(
+        None, "--manifest", help="mirror the apps of a manifest used by install --mpac-manifest"
+    ),
+    hosting: str = typer.Option("server", help="the hosting of the versions to mirror (server or datacenter)"),
+    workers: int = typer.Option(4, min=1, help="number of apps downloaded in parallel"),
+    connections: int = typer.Option(1, min=1, help="number of parallel connections used to download a single app"),
+):
+    """downloads apps from the marketplace into a directory, which can be used by install --mpac-mirror without access
+    to the marketplace; versions already mirrored are skipped"""
+    requirements = []
+    try:
+        for app in apps or []:
+            requirements.append(mirror.parse_requirement(app))
+        if manifest_path is not None:
+            for key, version in manifest.read_manifest(manifest_path):
+                requirements.append(mirror.parse_requirement(key if version == "latest" else f"{key}=={version}"))
+    except (ValueError, FileNotFoundError) as e:
+        logging.error("%s", e)
+        sys.exit(1)
+    if len(requirements) == 0:
+        logging.error("Specify the apps to mirror or a --manifest")
+        sys.exit(1)
+
+    def on_mirrored(app: mirror.MirroredApp):
+        logging.info(f"Mirrored {app.key} ({app.version}) to {app.path}")
+
+    try:
+        index, failed = mirror.mirror_apps(
+            directory,
+            requirements,
+            hosting=hosting,
+            workers=workers,
+            connections=connections,
+            on_mirrored=on_mirrored,
+        )
+    except MpacAppNotFoundError as e:
+        logging.error("Could not list the versions of the app %s", e)
+        sys.exit(1)
+    except requests.exceptions.RequestException as e:
+        logging.error("Could not connect to the marketplace: %s", e)
+        sys.exit(1)
+    for key, version, error in failed:
+        logging.error(f"Could not mirror {key} ({version}): {error}")
+    versions = sum(len(x) for x in index.apps.values())
+    logging.info(f"The mirror in {directory} contains {versions} versions of {len(index.apps)} apps")
+    if len(failed) > 0:
+        sys.exit(1)
@@ -0,0 +1,272 @@
+""" Local caches of the marketplace.
+
+Binaries are stored content-addressed (blobs/<sha256>/<filename>), the index maps
+app key, version and hosting to a blob and the metadata resolved from the marketplace.
+Responses of the marketplace REST API are cached for a limited time by their url, the app
+keys of marketplace ids forever.
+"""
+
+import dataclasses
+import hashlib
+import json
+import os
+import pathlib
+import shutil
+import tempfile
+import threading
+import time
+import typing
+
+from ..util.cachedir import get_cache_dir
+
+DEFAULT_MAX_SIZE = 2 * 1024 * 1024 * 1024
+
+
+@dataclasses.dataclass()
+class CacheEntry:
+    key: str
+    version: str
+    hosting: str
+    sha256: str
+    filename: str
+    size: int
+    last_access: float
+    metadata: typing.Dict[str, typing.Any] = dataclasses.field(default_factory=dict)
+
+    @property
+    def cache_key(self) -> str:
+        return MpacCache.cache_key(self.key, self.version, self.hosting)
+
+    @classmethod
+    def decode(cls, obj: typing.Dict[str, typing.Any]) -> "CacheEntry":
+        return cls(
+            key=obj.get("key"),
+            version=obj.get("version"),
+            hosting=obj.get("hosting"),
+            sha256=obj.get("sha256"),
+            filename=obj.get("filename"),
+            size=obj.get("size", 0),
+            last_access=obj.get("lastAccess", 0),
+            metadata=obj.get("metadata", {}),
+        )
+
+    def encode(self) -> typing.Dict[str, typing.Any]:
+        return {
+            "key": self.key,
+            "version": self.version,
+            "hosting": self.hosting,
+            "sha256": self.sha256,
+            "filename": self.filename,
+            "size": self.size,
+            "lastAccess": self.last_access,
+            "metadata": self.metadata,
+        }
+
+
+def _sha256(path: pathlib.Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as binary:
+        for chunk in iter(lambda: binary.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _write_json(path: pathlib.Path, obj: typing.Any):
+    # write atomically, so concurrent runs never read a half written file
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.stem}-", suffix=path.suffix)
+    with os.fdopen(fd, "w") as tmp_file:
+        json.dump(obj, tmp_file)
+    os.replace(tmp_path, path)
+
+
+class MpacCache:
+    INDEX_FILENAME = "index.json"
+
+    def __init__(self, directory: typing.Optional[pathlib.Path] = None, max_size: int = DEFAULT_MAX_SIZE):
+        self.directory: pathlib.Path = directory if directory is not None else get_cache_dir("mpac")
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_size = max_size
+        # the index is read and written as a whole; downloads of multiple threads must not overwrite each other
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def cache_key(key: str, version: str, hosting: str) -> str:
+        return f"{key}=={version}@{hosting}"
+
+    def _load(self) -> typing.Dict[str, CacheEntry]:
+        try:
+            with open(self.directory / self.INDEX_FILENAME) as index_file:
+                return {k: CacheEntry.decode(v) for k, v in json.load(index_file).get("entries", {}).items()}
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _save(self, entries: typing.Dict[str, CacheEntry]):
+        _write_json(self.directory / self.INDEX_FILENAME, {"entries": {k: v.encode() for k, v in entries.items()}})
+
+    def path_of(self, entry: CacheEntry) -> pathlib.Path:
+        return self.directory / "blobs" / entry.sha256 / entry.filename
+
+    def entries(self) -> typing.List[CacheEntry]:
+        return sorted(self._load().values(), key=lambda x: x.last_access, reverse=True)
+
+    def get(self, key: str, version: str, hosting: str = "server") -> typing.Optional[CacheEntry]:
+        """returns the cached entry of the app version and marks it as recently used"""
+        with self._lock:
+            entries = self._load()
+            entry = entries.get(self.cache_key(key, version, hosting))
+            if entry is None:
+                return None
+            if not self.path_of(entry).exists():
+                del entries[entry.cache_key]
+                self._save(entries)
+                return None
+            entry.last_access = time.time()
+            self._save(entries)
+            return entry
+
+    def put(
+        self,
+        key: str,
+        version: str,
+        hosting: str,
+        path: pathlib.Path,
+        metadata: typing.Optional[typing.Dict[str, typing.Any]] = None,
+    ) -> CacheEntry:
+        """moves the downloaded binary of path into the cache and evicts the least recently used entries, if the cache
+        exceeds its maximum size"""
+        path = pathlib.Path(path)
+        entry = CacheEntry(
+            key=key,
+            version=version,
+            hosting=hosting,
+            sha256=_sha256(path),
+            filename=path.name,
+            size=path.stat().st_size,
+            last_access=time.time(),
+            metadata=metadata or {},
+        )
+        blob_path = self.path_of(entry)
+        with self._lock:
+            if blob_path.exists():
+                path.unlink()
+            else:
+                blob_path.parent.mkdir(parents=True, exist_ok=True)
+                shutil.move(str(path), str(blob_path))
+
+            entries = self._load()
+            entries[entry.cache_key] = entry
+            self._evict(entries, self.max_size, keep=entry.cache_key)
+            self._save(entries)
+            return entry
+
+    def _evict(
+        self, entries: typing.Dict[str, CacheEntry], max_size: int, keep: typing.Optional[str] = None
+    ) -> typing.List[CacheEntry]:
+        """removes the least recently used entries until the blobs fit into max_size"""
+        removed = []
+        blob_sizes = {x.sha256: x.size for x in entries.values()}
+        total_size = sum(blob_sizes.values())
+        for entry in sorted(entries.values(), key=lambda x: x.last_access):
+            if total_size <= max_size:
+                break
+            if entry.cache_key == keep:
+                continue
+            del entries[entry.cache_key]
+            removed.append(entry)
+            if all(x.sha256 != entry.sha256 for x in entries.values()):
+                total_size -= blob_sizes[entry.sha256]
+        self._remove_unreferenced_blobs(entries)
+        return removed
+
+    def _remove_unreferenced_blobs(self, entries: typing.Dict[str, CacheEntry]):
+        referenced = {x.sha256 for x in entries.values()}
+        blobs_dir = self.directory / "blobs"
+        if not blobs_dir.exists():
+            return
+        for blob_dir in blobs_dir.iterdir():
+            if blob_dir.name not in referenced:
+                shutil.rmtree(blob_dir, ignore_errors=True)
+
+    def prune(
+        self, max_size: typing.Optional[int] = None, older_than: typing.Optional[float] = None
+    ) -> typing.List[CacheEntry]:
+        """removes entries, which were not used for older_than seconds, and the least recently used entries until the
+        cache fits into max_size; without arguments, all entries are removed"""
+        with self._lock:
+            entries = self._load()
+            removed = []
+            if older_than is not None:
+                threshold = time.time() - older_than
+                for entry in list(entries.values()):
+                    if entry.last_access < threshold:
+                        del entries[entry.cache_key]
+                        removed.append(entry)
+            if max_size is None and older_than is None:
+                max_size = 0
+            removed += self._evict(entries, max_size if max_size is not None else self.max_size)
+            self._save(entries)
+            return removed
+
+    def size(self) -> int:
+        return sum({x.sha256: x.size for x in self._load().values()}.values())
+
+
+class MetadataCache:
+    """caches the JSON responses of the marketplace REST API by their url for ttl seconds"""
+
+    FILENAME = "metadata.json"
+
+    def __init__(self, ttl: float, directory: typing.Optional[pathlib.Path] = None):
+        self.directory: pathlib.Path = directory if directory is not None else get_cache_dir("mpac")
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        self._lock = threading.Lock()
+
+    def _load(self) -> typing.Dict[str, typing.Any]:
+        try:
+            with open(self.directory / self.FILENAME) as cache_file:
+                return json.load(cache_file)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def get(self, url: str) -> typing.Optional[typing.Any]:
+        cached = self._load().get(url)
+        if cached is None or time.time() - cached.get("fetched", 0) > self.ttl:
+            return None
+        return cached.get("response")
+
+    def put(self, url: str, response: typing.Any):
+        now = time.time()
+        with self._lock:
+            # expired responses are dropped, so the file does not grow endlessly
+            responses = {k: v for k, v in self._load().items() if now - v.get("fetched", 0) <= self.ttl}
+            responses[url] = {"fetched": now, "response": response}
+            _write_json(self.directory / self.FILENAME, responses)
+
+
+class AppKeyCache:
+    """caches the app keys of marketplace ids"""
+
+    # keys cached by earlier versions were not validated against the marketplace id, so they are not reused
+    FILENAME = "app-keys-v2.json"
+
+    def __init__(self, directory: typing.Optional[pathlib.Path] = None):
+        self.directory: pathlib.Path = directory if directory is not None else get_cache_dir("mpac")
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def _load(self) -> typing.Dict[str, str]:
+        try:
+            with open(self.directory / self.FILENAME) as cache_file:
+                return json.load(cache_file)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def get(self, marketplace_id: str) -> typing.Optional[str]:
+        return self._load().get(str(marketplace_id))
+
+    def put(self, marketplace_id: str, app_key: str):
+        with self._lock:
+            app_keys = self._load()
+            app_keys[str(marketplace_id)] = app_key
+            _write_json(self.directory / self.FILENAME, app_keys)
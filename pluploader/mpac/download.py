@@ -1,49 +1,280 @@
+import concurrent.futures
 import os
 import pathlib
 import re
 import tempfile
+import threading
 import typing
 
 import requests
 from furl import furl
 
 from . import rest, scraper
+from .cache import AppKeyCache, MetadataCache, MpacCache
+from .exceptions import MpacDownloadError
 
+CHUNK_SIZE = 1024 * 1024
+# downloads are only split into ranges, if every connection gets at least this many bytes
+MIN_RANGE_SIZE = 4 * 1024 * 1024
+DEFAULT_CONNECTIONS = 4
 
-def _download_file_to_tmp_dir(url: furl, filename: typing.Optional[str] = None) -> os.PathLike:
-    response = requests.get(url)
-    response_url: furl = furl(response.url)
+# called with the number of bytes downloaded so far and the total size, if known
+ProgressCallback = typing.Callable[[int, typing.Optional[int]], None]
 
+
+def _download_dir() -> pathlib.Path:
     temp_dir = pathlib.Path(tempfile.gettempdir())
 
     pluploader_temp_dir = temp_dir / "pluploader"
     pluploader_temp_dir.mkdir(exist_ok=True)
+    return pluploader_temp_dir
+
+
+def _filename_from_response(response: requests.Response) -> str:
+    try:
+        content_disposition = response.headers.get("content-disposition") or ""
+        return re.findall('filename="(.+)"', content_disposition)[0]
+    except Exception:
+        response_url: furl = furl(response.url)
+        return response_url.path.segments[-1].split("/")[-1]
+
+
+def _request_download(url: furl, offset: int = 0) -> requests.Response:
+    headers = {"Range": f"bytes={offset}-"} if offset > 0 else {}
+    return rest.get_session().get(str(url), headers=headers, stream=True)
+
+
+def _probe_ranges(url: furl) -> typing.Tuple[requests.Response, typing.Optional[int]]:
+    """requests the first byte of url to find out, whether the server supports range requests
+    Returns:
+        the (closed) response, whose url is the final url after redirects, and the size of the file or None if the
+        server does not support range requests
+    """
+    response = rest.get_session().get(str(url), headers={"Range": "bytes=0-0"}, stream=True)
+    response.close()
+    response.raise_for_status()
+    match = re.match(r"bytes 0-0/(\d+)", response.headers.get("content-range", ""))
+    if response.status_code != 206 or match is None:
+        return response, None
+    return response, int(match.group(1))
+
+
+def _download_range(url: str, path: pathlib.Path, start: int, end: int, progress: typing.Callable[[int], None]):
+    """downloads the bytes start to end (inclusive) of url into the preallocated file of path"""
+    response = rest.get_session().get(url, headers={"Range": f"bytes={start}-{end}"}, stream=True)
+    with response, open(path, "r+b") as download_file:
+        response.raise_for_status()
+        if response.status_code != 206 or not response.headers.get("content-range", "").startswith(f"bytes {start}-"):
+            raise MpacDownloadError(f"The server ignored the range request for bytes {start}-{end}")
+        download_file.seek(start)
+        position = start
+        for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+            if position + len(chunk) > end + 1:
+                raise MpacDownloadError(f"The server sent more than the requested bytes {start}-{end}")
+            download_file.write(chunk)
+            position += len(chunk)
+            progress(len(chunk))
+    if position != end + 1:
+        raise MpacDownloadError(f"Download of bytes {start}-{end} is incomplete ({position - start} bytes)")
+
+
+def _download_file_in_ranges(
+    url: str, target: pathlib.Path, size: int, connections: int, progress: typing.Optional[ProgressCallback] = None
+):
+    """downloads url into target using parallel range requests of equal size. A failed download is not resumed, as
+    the preallocated file does not tell which ranges are complete; it is removed instead.
+    """
+    ranged = target.with_name(f"{target.name}.ranges")
+    with open(ranged, "wb") as ranged_file:
+        ranged_file.truncate(size)
+
+    downloaded = 0
+    lock = threading.Lock()
 
+    def range_progress(length: int):
+        nonlocal downloaded
+        with lock:
+            downloaded += length
+            if progress is not None:
+                progress(downloaded, size)
+
+    range_size = -(-size // connections)
+    ranges = [(start, min(start + range_size, size) - 1) for start in range(0, size, range_size)]
+    if progress is not None:
+        progress(0, size)
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=connections) as executor:
+            futures = [executor.submit(_download_range, url, ranged, start, end, range_progress) for start, end in ranges]
+            try:
+                for future in concurrent.futures.as_completed(futures):
+                    future.result()
+            except BaseException:
+                for future in futures:
+                    future.cancel()
+                raise
+    except BaseException:
+        ranged.unlink()
+        raise
+    os.replace(ranged, target)
+
+
+def _download_file_to_tmp_dir(
+    url: furl,
+    filename: typing.Optional[str] = None,
+    expected_size: typing.Optional[int] = None,
+    progress: typing.Optional[ProgressCallback] = None,
+    connections: int = 1,
+    directory: typing.Optional[pathlib.Path] = None,
+) -> os.PathLike:
+    """Streams the file of url into the pluploader temp directory. The download is written to a .part file first,
+    which is renamed once the download is complete. If a .part file of a previous, interrupted download exists, the
+    download is resumed by using a HTTP range request.
+    If connections is greater than 1 and the server supports range requests, large files are downloaded in parallel
+    ranges instead. If directory is given, the file is downloaded into directory instead of the temp directory.
+    Raises:
+        requests.exceptions.RequestException: If the download fails; a partial download is kept for resuming
+        MpacDownloadError: If the size of the download does not match the expected size
+    """
+    download_dir = directory if directory is not None else _download_dir()
+
+    partial_exists = filename is not None and (download_dir / f"{filename}.part").exists()
+    if connections > 1 and not partial_exists:
+        probe, size = _probe_ranges(url)
+        if filename is None:
+            filename = _filename_from_response(probe)
+        if expected_size is not None and size is not None and size != expected_size:
+            raise MpacDownloadError(f"Size of {filename} is {size} bytes, but {expected_size} bytes were expected")
+        if size is not None and size >= 2 * MIN_RANGE_SIZE and not (download_dir / f"{filename}.part").exists():
+            target = download_dir / filename
+            _download_file_in_ranges(probe.url, target, size, min(connections, size // MIN_RANGE_SIZE), progress)
+            return target
+        # the download continues in a single stream from the final url
+        url = furl(probe.url)
+
+    offset = 0
     if filename is not None:
-        filename = pluploader_temp_dir / filename
-    else:
-        try:
-            content_disposition = response.headers.get("content-disposition") or ""
-            filename = pluploader_temp_dir / re.findall('filename="(.+)"', content_disposition)[0]
-        except Exception:
-            filename = pluploader_temp_dir / response_url.path.segments[-1].split("/")[-1]
+        partial = download_dir / f"{filename}.part"
+        offset = partial.stat().st_size if partial.exists() else 0
+    response = _request_download(url, offset)
+    if filename is None:
+        filename = _filename_from_response(response)
+        partial = download_dir / f"{filename}.part"
+        if partial.exists() and partial.stat().st_size > 0 and response.headers.get("accept-ranges") == "bytes":
+            offset = partial.stat().st_size
+            response.close()
+            response = _request_download(response.url, offset)
+    if response.status_code == 416:
+        # the partial download is not valid for this file (anymore) - start over
+        response.close()
+        offset = 0
+        response = _request_download(url)
+
+    with response:
+        response.raise_for_status()
+        if response.status_code != 206 or not response.headers.get("content-range", "").startswith(f"bytes {offset}-"):
+            # the server ignored the range request
+            offset = 0
+        content_length = response.headers.get("content-length")
+        total = offset + int(content_length) if content_length is not None else expected_size
+
+        downloaded = offset
+        if progress is not None:
+            progress(downloaded, total)
+        with open(partial, "ab" if offset > 0 else "wb") as partial_file:
+            for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                partial_file.write(chunk)
+                downloaded += len(chunk)
+                if progress is not None:
+                    progress(downloaded, total)
+
+    if (total is not None and downloaded < total) or (expected_size is not None and downloaded < expected_size):
+        raise MpacDownloadError(f"Download of {filename} is incomplete ({downloaded} of {total or expected_size} bytes)")
+    if expected_size is not None and downloaded != expected_size:
+        partial.unlink()
+        raise MpacDownloadError(f"Size of {filename} is {downloaded} bytes, but {expected_size} bytes were expected")
+
+    target = download_dir / filename
+    os.replace(partial, target)
+    return target
+
+
+def download_app_by_app_key(
+    app_key: str,
+    version: str = "latest",
+    progress: typing.Optional[ProgressCallback] = None,
+    cache: typing.Optional[MpacCache] = None,
+    hosting: str = "server",
+    metadata_cache: typing.Optional[MetadataCache] = None,
+    connections: int = DEFAULT_CONNECTIONS,
+) -> os.PathLike:
+    """Downloads the app version from the marketplace. If a cache is given, a cached binary of the version is returned
+    without any request - except for the resolution of the "latest" version - and downloads are added to the cache.
+    If a metadata_cache is given, the resolution of the version and its binary is reused within its ttl.
+    """
+    if cache is not None and version != "latest":
+        entry = cache.get(app_key, version, hosting)
+        if entry is not None:
+            return cache.path_of(entry)
 
-    with open(filename, "wb") as tmpfile:
-        tmpfile.write(response.content)
-    return filename
+    app = rest.get_app_version(app_key, version, hosting, cache=metadata_cache)
+    if cache is not None and version == "latest":
+        entry = cache.get(app_key, app.name, hosting)
+        if entry is not None:
+            return cache.path_of(entry)
 
+    path = download_app_version(app, progress, metadata_cache=metadata_cache, connections=connections)
+    if cache is None:
+        return path
+    metadata = {
+        "buildNumber": app.build_number,
+        "status": app.status,
+        "paymentModel": app.payment_model,
+        "logicalFileName": pathlib.Path(path).name,
+    }
+    return cache.path_of(cache.put(app_key, app.name, hosting, path, metadata))
 
-def download_app_by_app_key(app_key: str, version: str = "latest") -> os.PathLike:
-    app = rest.get_app_version(app_key, version)
-    asset = rest.get_binary_from_app_version(app)
 
-    download_link = asset.links.get("binary").href
-    return _download_file_to_tmp_dir(download_link)
+def download_app_version(
+    app: rest.AddonVersion,
+    progress: typing.Optional[ProgressCallback] = None,
+    metadata_cache: typing.Optional[MetadataCache] = None,
+    connections: int = DEFAULT_CONNECTIONS,
+    directory: typing.Optional[pathlib.Path] = None,
+) -> os.PathLike:
+    """downloads the binary of a resolved app version into directory or the pluploader temp directory"""
+    asset = rest.get_binary_from_app_version(app, cache=metadata_cache)
+    return _download_file_to_tmp_dir(
+        asset.links.get("binary").href,
+        filename=asset.file_info.logical_file_name,
+        expected_size=int(asset.file_info.size) if asset.file_info.size is not None else None,
+        progress=progress,
+        connections=connections,
+        directory=directory,
+    )
 
 
-def download_app_by_marketplace_id(marketplace_id: str, version: str = "latest") -> os.PathLike:
-    download_link = scraper.download_link_by_marketplace_id(marketplace_id, version)
-    return _download_file_to_tmp_dir(download_link)
+def download_app_by_marketplace_id(
+    marketplace_id: str,
+    version: str = "latest",
+    progress: typing.Optional[ProgressCallback] = None,
+    connections: int = DEFAULT_CONNECTIONS,
+    cache: typing.Optional[MpacCache] = None,
+    metadata_cache: typing.Optional[MetadataCache] = None,
+    app_key_cache: typing.Optional[AppKeyCache] = None,
+) -> os.PathLike:
+    """Resolves the app key of the marketplace id - once, if an app_key_cache is given - and downloads the app through
+    the REST API. The version history page is only scraped for the download link, if the app key can not be found.
+    """
+    page = None
+    if app_key_cache is None or app_key_cache.get(marketplace_id) is None:
+        page = scraper.get_version_history_page(marketplace_id)
+    app_key = scraper.get_app_key_by_marketplace_id(marketplace_id, cache=app_key_cache, page=page)
+    if app_key is not None:
+        return download_app_by_app_key(
+            app_key, version, progress, cache=cache, metadata_cache=metadata_cache, connections=connections
+        )
+    download_link = scraper.download_link_by_marketplace_id(marketplace_id, version, page=page)
+    return _download_file_to_tmp_dir(download_link, progress=progress, connections=connections)
 
 
 def split_name_and_version(input: str) -> typing.Tuple[str, typing.Optional[str]]:
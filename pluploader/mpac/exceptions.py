@@ -4,3 +4,7 @@ class MpacAppNotFoundError(ValueError):
 
 class MpacAppVersionNotFoundError(ValueError):
     pass
+
+
+class MpacDownloadError(IOError):
+    pass
@@ -0,0 +1,36 @@
+""" Manifests list the marketplace apps, which should be installed together
+
+    apps:
+      - com.example.first-app==1.2.3
+      - com.example.second-app  # latest version
+"""
+
+import pathlib
+import typing
+
+import yaml
+
+from .download import split_name_and_version
+
+
+class ManifestError(ValueError):
+    pass
+
+
+def read_manifest(path: pathlib.Path) -> typing.List[typing.Tuple[str, str]]:
+    """Reads the app keys and versions of a manifest. The manifest is either a yaml list of key==version entries or
+    contains this list as "apps".
+    Raises:
+        FileNotFoundError: If the manifest does not exist
+        ManifestError: If the manifest is not valid
+    """
+    with open(path) as manifest_file:
+        try:
+            content = yaml.safe_load(manifest_file)
+        except yaml.YAMLError as e:
+            raise ManifestError(f"{path} is not a valid yaml file: {e}")
+    if isinstance(content, dict):
+        content = content.get("apps")
+    if not isinstance(content, list) or not all(isinstance(x, str) for x in content):
+        raise ManifestError(f"{path} has to contain a list of apps (key==version)")
+    return [split_name_and_version(x.strip()) for x in content]
@@ -0,0 +1,249 @@
+""" Offline mirror of marketplace apps
+
+A mirror is a directory containing the binaries as <key>/<version>/<filename> and an
+index.json listing them, so apps can be installed without access to the marketplace.
+The directory can also be served by any HTTP server.
+"""
+
+import concurrent.futures
+import dataclasses
+import hashlib
+import json
+import os
+import pathlib
+import re
+import tempfile
+import typing
+
+import requests
+from furl import furl
+from packaging.specifiers import InvalidSpecifier, SpecifierSet
+from packaging.version import InvalidVersion
+
+from ..util.atlassian_jar import parse_plugin_version
+from . import download, rest
+from .cache import MetadataCache
+from .exceptions import MpacAppNotFoundError, MpacAppVersionNotFoundError
+
+INDEX_FILENAME = "index.json"
+INDEX_FORMAT_VERSION = 1
+
+_REQUIREMENT = re.compile(r"^\s*([^<>=!~\s,]+)\s*(.*?)\s*$")
+
+
+@dataclasses.dataclass(frozen=True)
+class MirroredApp:
+    key: str
+    version: str
+    path: str
+    sha256: str
+    size: int
+    build_number: typing.Optional[int] = None
+
+    @classmethod
+    def decode(cls, key: str, version: str, obj: typing.Dict[str, typing.Any]) -> "MirroredApp":
+        return cls(
+            key=key,
+            version=version,
+            path=obj.get("path"),
+            sha256=obj.get("sha256"),
+            size=obj.get("size"),
+            build_number=obj.get("buildNumber"),
+        )
+
+    def encode(self) -> typing.Dict[str, typing.Any]:
+        return {"path": self.path, "sha256": self.sha256, "size": self.size, "buildNumber": self.build_number}
+
+
+@dataclasses.dataclass()
+class MirrorIndex:
+    """key -> version -> app. Paths are relative to the mirror."""
+
+    apps: typing.Dict[str, typing.Dict[str, MirroredApp]] = dataclasses.field(default_factory=dict)
+
+    def add(self, app: MirroredApp):
+        self.apps.setdefault(app.key, {})[app.version] = app
+
+    def resolve(self, key: str, version: str = "latest") -> MirroredApp:
+        """Raises:
+        MpacAppNotFoundError: If the mirror does not contain the app
+        MpacAppVersionNotFoundError: If the mirror does not contain the version of the app
+        """
+        versions = self.apps.get(key)
+        if not versions:
+            raise MpacAppNotFoundError(f"{key} is not contained in the mirror")
+        if version == "latest":
+            version = max(versions.keys(), key=parse_plugin_version)
+        if version not in versions:
+            raise MpacAppVersionNotFoundError(f"{key} is not contained in version {version} in the mirror")
+        return versions[version]
+
+    def encode(self) -> typing.Dict[str, typing.Any]:
+        return {
+            "version": INDEX_FORMAT_VERSION,
+            "apps": {key: {v: x.encode() for v, x in versions.items()} for key, versions in self.apps.items()},
+        }
+
+    @classmethod
+    def decode(cls, obj: typing.Dict[str, typing.Any]) -> "MirrorIndex":
+        index = cls()
+        if obj.get("version") != INDEX_FORMAT_VERSION:
+            return index
+        for key, versions in obj.get("apps", {}).items():
+            for version, x in versions.items():
+                index.add(MirroredApp.decode(key, version, x))
+        return index
+
+
+def parse_requirement(requirement: str) -> typing.Tuple[str, SpecifierSet]:
+    """Parses an app key followed by an optional version range, e.g. com.example.app>=1.2,<2.0
+    Raises:
+        ValueError: If the requirement is not valid
+    """
+    match = _REQUIREMENT.match(requirement)
+    if match is None:
+        raise ValueError(f"{requirement} is not a valid app requirement")
+    try:
+        return match.group(1), SpecifierSet(match.group(2))
+    except InvalidSpecifier:
+        raise ValueError(f"{match.group(2)} of {requirement} is not a valid version range")
+
+
+def select_versions(names: typing.List[str], specifier: SpecifierSet) -> typing.List[str]:
+    """returns the versions matching specifier, or only the latest version if specifier is empty"""
+    selected = []
+    for name in names:
+        try:
+            version = parse_plugin_version(name)
+        except InvalidVersion:
+            continue
+        if version in specifier:
+            selected.append((version, name))
+    selected.sort(reverse=True)
+    if len(str(specifier)) == 0:
+        return [x[1] for x in selected[:1]]
+    return [x[1] for x in selected]
+
+
+def _is_url(location: str) -> bool:
+    return re.match(r"^https?://", str(location)) is not None
+
+
+def load_mirror_index(location: str) -> MirrorIndex:
+    """Loads the index of a mirror directory or url
+    Raises:
+        FileNotFoundError: If the directory is no mirror
+        requests.exceptions.RequestException: If the index can not be fetched from the url
+    """
+    if _is_url(location):
+        response = requests.get(str(furl(location) / INDEX_FILENAME))
+        response.raise_for_status()
+        return MirrorIndex.decode(response.json())
+    with open(pathlib.Path(location) / INDEX_FILENAME) as index_file:
+        return MirrorIndex.decode(json.load(index_file))
+
+
+def download_app_from_mirror(
+    location: str,
+    key: str,
+    version: str = "latest",
+    progress: typing.Optional[download.ProgressCallback] = None,
+    index: typing.Optional[MirrorIndex] = None,
+) -> os.PathLike:
+    """returns the path of the app in a mirror directory, or downloads it from a mirror url"""
+    if index is None:
+        index = load_mirror_index(location)
+    app = index.resolve(key, version)
+    if not _is_url(location):
+        return pathlib.Path(location) / app.path
+    url = furl(location).add(path=app.path)
+    return download._download_file_to_tmp_dir(
+        url, filename=pathlib.PurePosixPath(app.path).name, expected_size=app.size, progress=progress
+    )
+
+
+def _sha256(path: pathlib.Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as binary:
+        for chunk in iter(lambda: binary.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _mirror_version(
+    directory: pathlib.Path,
+    key: str,
+    version: str,
+    hosting: str,
+    metadata_cache: typing.Optional[MetadataCache],
+    connections: int,
+) -> MirroredApp:
+    app = rest.get_app_version(key, version, hosting, cache=metadata_cache)
+    version_dir = directory / key / version
+    version_dir.mkdir(parents=True, exist_ok=True)
+    path = pathlib.Path(
+        download.download_app_version(app, metadata_cache=metadata_cache, connections=connections, directory=version_dir)
+    )
+    return MirroredApp(
+        key=key,
+        version=version,
+        path=path.relative_to(directory).as_posix(),
+        sha256=_sha256(path),
+        size=path.stat().st_size,
+        build_number=app.build_number,
+    )
+
+
+def mirror_apps(
+    directory: pathlib.Path,
+    requirements: typing.List[typing.Tuple[str, SpecifierSet]],
+    hosting: str = "server",
+    workers: int = 4,
+    connections: int = 1,
+    metadata_cache: typing.Optional[MetadataCache] = None,
+    on_mirrored: typing.Optional[typing.Callable[[MirroredApp], None]] = None,
+) -> typing.Tuple[MirrorIndex, typing.List[typing.Tuple[str, str, Exception]]]:
+    """Resolves the versions of the requirements through the marketplace and downloads the binaries, which are not
+    mirrored yet, in parallel into directory. The index of the directory is updated, even if some downloads failed.
+    Returns:
+        the index and the key, version and error of each failed download
+    Raises:
+        MpacAppNotFoundError: If the versions of an app can not be listed
+    """
+    directory = pathlib.Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    try:
+        index = load_mirror_index(str(directory))
+    except (FileNotFoundError, ValueError):
+        index = MirrorIndex()
+
+    to_mirror = []
+    for key, specifier in requirements:
+        for version in select_versions(rest.get_app_version_names(key, hosting), specifier):
+            mirrored = index.apps.get(key, {}).get(version)
+            if mirrored is not None and (directory / mirrored.path).exists():
+                continue
+            to_mirror.append((key, version))
+
+    failed = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(_mirror_version, directory, key, version, hosting, metadata_cache, connections): (key, version)
+            for key, version in to_mirror
+        }
+        for future in concurrent.futures.as_completed(futures):
+            key, version = futures[future]
+            try:
+                app = future.result()
+            except Exception as e:
+                failed.append((key, version, e))
+                continue
+            index.add(app)
+            if on_mirrored is not None:
+                on_mirrored(app)
+
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".index-", suffix=".json")
+    with os.fdopen(fd, "w") as tmp_file:
+        json.dump(index.encode(), tmp_file, indent=2)
+    os.replace(tmp_path, directory / INDEX_FILENAME)
+    return index, failed
@@ -3,15 +3,49 @@
 """
 
 import dataclasses
+import threading
 import typing
 
 import requests
 from furl import furl
+from requests.adapters import HTTPAdapter
 
-from .exceptions import MpacAppVersionNotFoundError
+from .cache import MetadataCache
+from .exceptions import MpacAppNotFoundError, MpacAppVersionNotFoundError
 
 BASE_URL = furl("https://marketplace.atlassian.com/rest/2")
 
+_session: typing.Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """Returns the session shared by all requests to the marketplace, so connections are kept alive and reused"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_maxsize=16)
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+        return _session
+
+
+def _get_json(url: furl, cache: typing.Optional[MetadataCache] = None) -> typing.Any:
+    if cache is not None:
+        cached = cache.get(str(url))
+        if cached is not None:
+            return cached
+    response = get_session().get(str(url))
+
+    if not response.ok:
+        raise MpacAppVersionNotFoundError(url)
+
+    obj = response.json()
+    if cache is not None:
+        cache.put(str(url), obj)
+    return obj
+
 
 @dataclasses.dataclass()
 class AddonVersion:
@@ -83,7 +117,9 @@ class Asset:
         )
 
 
-def get_app_version(addonKey: str, version: str = "latest", hosting: str = "server") -> AddonVersion:
+def get_app_version(
+    addonKey: str, version: str = "latest", hosting: str = "server", cache: typing.Optional[MetadataCache] = None
+) -> AddonVersion:
     """Choosing "server" as default hosting option for now... We propably need to change this
     in 2022?, when you people will stop publishing server versions
     """
@@ -93,20 +129,43 @@ def get_app_version(addonKey: str, version: str = "latest", hosting: str = "serv
     else:
         url = BASE_URL / f"addons/{addonKey}/versions/name/{version}"
     url.args["hosting"] = hosting
-    response = requests.get(url)
-
-    if not response.ok:
-        raise MpacAppVersionNotFoundError(url)
-
-    return AddonVersion.decode(response.json())
+    return AddonVersion.decode(_get_json(url, cache))
 
 
-def get_binary_from_app_version(addon_version: AddonVersion) -> Asset:
+def get_binary_from_app_version(addon_version: AddonVersion, cache: typing.Optional[MetadataCache] = None) -> Asset:
     url: furl = addon_version.links.artifact.href.copy()
     url.set(origin=BASE_URL.origin)
-    response = requests.get(url)
+    return Asset.decode(_get_json(url, cache))
 
+
+def get_app_marketplace_id(addonKey: str) -> typing.Optional[str]:
+    """returns the marketplace id of an app, taken from the link to its marketplace page (/apps/<id>/...), or None if
+    the app does not exist"""
+    response = get_session().get(str(BASE_URL / f"addons/{addonKey}"))
     if not response.ok:
-        raise MpacAppVersionNotFoundError(url)
+        return None
+    href = response.json().get("_links", {}).get("alternate", {}).get("href", "")
+    segments = furl(href).path.segments
+    if len(segments) >= 2 and segments[0] == "apps":
+        return segments[1]
+    return None
 
-    return Asset.decode(response.json())
+
+def get_app_version_names(addonKey: str, hosting: str = "server") -> typing.List[str]:
+    """returns the names of all versions of the app, newest first"""
+    url: furl = BASE_URL / f"addons/{addonKey}/versions"
+    url.args["hosting"] = hosting
+    url.args["limit"] = 50
+    names = []
+    while url is not None:
+        response = get_session().get(str(url))
+        if not response.ok:
+            raise MpacAppNotFoundError(url)
+        obj = response.json()
+        names += [x.get("name") for x in obj.get("_embedded", {}).get("versions", [])]
+        next_link = obj.get("_links", {}).get("next")
+        url = None
+        if next_link is not None:
+            url = furl(next_link.get("href"))
+            url.set(origin=BASE_URL.origin)
+    return names
@@ -1,36 +1,88 @@
 """ Hacky web scraper for the atlassian marketplace
 """
 
-import requests
-from bs4 import BeautifulSoup
+import re
+import typing
+
+import lxml.html
 from furl import furl
 
+from .cache import AppKeyCache
 from .exceptions import MpacAppNotFoundError, MpacAppVersionNotFoundError
+from .rest import get_app_marketplace_id, get_session
 
 VERSION_HISTORY_URL = "https://marketplace.atlassian.com/apps/{}/WILDCARD/version-history"
 
+# the app key is embedded into the pages of an app in several places
+_APP_KEY_PATTERNS = [
+    re.compile(rb'data-addon-key="([^"]+)"'),
+    re.compile(rb'"addonKey"\s*:\s*"([^"]+)"'),
+    re.compile(rb'"appKey"\s*:\s*"([^"]+)"'),
+]
+
+
+def _has_class(name: str) -> str:
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+def get_version_history_page(marketplace_id: str) -> bytes:
+    return get_session().get(VERSION_HISTORY_URL.format(marketplace_id)).content
+
+
+def find_app_key_candidates(page: bytes) -> typing.List[str]:
+    """returns all app keys embedded into the page, in the order of the patterns. Besides the key of the app itself,
+    the page also contains the keys of other apps, e.g. of recommendations."""
+    candidates = []
+    for pattern in _APP_KEY_PATTERNS:
+        for match in pattern.finditer(page):
+            app_key = match.group(1).decode("utf-8")
+            if app_key not in candidates:
+                candidates.append(app_key)
+    return candidates
+
+
+def get_app_key_by_marketplace_id(
+    marketplace_id: str, cache: typing.Optional[AppKeyCache] = None, page: typing.Optional[bytes] = None
+) -> typing.Optional[str]:
+    """Returns the app key of the marketplace id, or None if it can not be found in the version history page. Every
+    key found in the page is checked against the marketplace id of the app in the REST api, so keys of other apps
+    embedded into the page are skipped. The app key of a marketplace id never changes, so it is cached without expiry.
+    """
+    if cache is not None:
+        app_key = cache.get(marketplace_id)
+        if app_key is not None:
+            return app_key
+    if page is None:
+        page = get_version_history_page(marketplace_id)
+    for app_key in find_app_key_candidates(page):
+        if get_app_marketplace_id(app_key) == str(marketplace_id):
+            if cache is not None:
+                cache.put(marketplace_id, app_key)
+            return app_key
+    return None
+
 
-def download_link_by_marketplace_id(marketplace_id: str, version: str = "latest") -> furl:
-    response = requests.get(VERSION_HISTORY_URL.format(marketplace_id))
-    soup = BeautifulSoup(response.content, "html5lib")
+def download_link_by_marketplace_id(
+    marketplace_id: str, version: str = "latest", page: typing.Optional[bytes] = None
+) -> furl:
+    if page is None:
+        page = get_version_history_page(marketplace_id)
+    document = lxml.html.fromstring(page)
 
-    body_dom = soup.select_one("body")
-    if "error-page" in body_dom.get("class"):
+    if document.xpath(f"//body[{_has_class('error-page')}]"):
         raise MpacAppNotFoundError("Can't find any app with this app marketplace id")
 
-    plugin_versions_dom = soup.select_one(".plugin-versions")
-    plugins_dom = plugin_versions_dom.select(".version-row")
+    version_xpath = f".//span[{_has_class('version')}]"
     selected_row = None
-    if version == "latest" and len(plugins_dom) > 0:
-        for version_row in plugin_versions_dom:
-            if version_row.select_one("span.version").text != "Cloud":
-                selected_row = version_row
-                break
-    else:
-        filtered = list(filter(lambda x: x.select_one("span.version").text == version, plugins_dom))
-        if len(filtered) > 0:
-            selected_row = filtered[0]
+    for version_row in document.xpath(f"//*[{_has_class('plugin-versions')}]//*[{_has_class('version-row')}]"):
+        row_version = "".join(x.text_content() for x in version_row.xpath(version_xpath)[:1])
+        if (version == "latest" and row_version != "Cloud") or row_version == version:
+            selected_row = version_row
+            break
     if selected_row is None:
         raise MpacAppVersionNotFoundError("Can't find version")
 
-    return furl(selected_row.select_one(".download-link")["href"])
+    download_links = selected_row.xpath(f".//*[{_has_class('download-link')}]/@href")
+    if len(download_links) == 0:
+        raise MpacAppVersionNotFoundError("Can't find the download link of the version")
+    return furl(download_links[0])
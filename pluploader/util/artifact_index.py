@@ -0,0 +1,187 @@
+""" this module maintains an index of the plugin artifacts (jars and obrs) of a
+directory, so artifacts can be found by their plugin key and version.
+"""
+
+import concurrent.futures
+import dataclasses
+import hashlib
+import json
+import logging
+import os
+import pathlib
+import typing
+import zipfile
+
+from . import atlassian_jar
+from .pathutil import PluginKeyNotFoundError
+
+INDEX_FILENAME = ".pluploader-index.json"
+INDEX_FORMAT_VERSION = 1
+ARTIFACT_SUFFIXES = (".jar", ".obr")
+
+
+class ArtifactNotFoundError(LookupError):
+    pass
+
+
+@dataclasses.dataclass(frozen=True)
+class IndexedArtifact:
+    path: str
+    key: str
+    version: str
+    sha256: str
+    mtime: float
+    size: int
+
+
+@dataclasses.dataclass()
+class ArtifactIndex:
+    """key -> version -> artifact. Paths are relative to root. Further artifacts of an already indexed key and version
+    are remembered in duplicates and files which are no plugins in skipped, so they are not read again on every
+    rebuild."""
+
+    root: pathlib.Path
+    plugins: typing.Dict[str, typing.Dict[str, IndexedArtifact]] = dataclasses.field(default_factory=dict)
+    duplicates: typing.List[IndexedArtifact] = dataclasses.field(default_factory=list)
+    skipped: typing.Dict[str, typing.Tuple[float, int]] = dataclasses.field(default_factory=dict)
+
+    def artifacts(self) -> typing.Iterator[IndexedArtifact]:
+        for versions in self.plugins.values():
+            yield from versions.values()
+        yield from self.duplicates
+
+    def add(self, artifact: IndexedArtifact):
+        versions = self.plugins.setdefault(artifact.key, {})
+        indexed = versions.get(artifact.version)
+        if indexed is not None and indexed.path != artifact.path:
+            logging.debug("%s (%s) is contained in %s and %s", artifact.key, artifact.version, indexed.path, artifact.path)
+            # the artifact with the lowest path wins, independent of the order of the scan
+            if indexed.path < artifact.path:
+                self.duplicates.append(artifact)
+                return
+            self.duplicates.append(indexed)
+        versions[artifact.version] = artifact
+
+    def resolve(self, key: str, version: typing.Optional[str] = None) -> pathlib.Path:
+        """returns the path of the artifact of the plugin key in the version, or of its latest version if version is None
+        Raises:
+            ArtifactNotFoundError: If the index does not contain the plugin key or version
+        """
+        versions = self.plugins.get(key)
+        if not versions:
+            raise ArtifactNotFoundError(f"{key} is not contained in the index of {self.root}")
+        if version is None or version == "latest":
+            version = max(versions.keys(), key=atlassian_jar.parse_plugin_version)
+        if version not in versions:
+            raise ArtifactNotFoundError(f"{key} is not contained in version {version} in the index of {self.root}")
+        return self.root / versions[version].path
+
+    @staticmethod
+    def _encode_artifact(artifact: IndexedArtifact) -> dict:
+        return {"path": artifact.path, "sha256": artifact.sha256, "mtime": artifact.mtime, "size": artifact.size}
+
+    def encode(self) -> dict:
+        return {
+            "version": INDEX_FORMAT_VERSION,
+            "plugins": {
+                key: {version: self._encode_artifact(x) for version, x in versions.items()}
+                for key, versions in self.plugins.items()
+            },
+            "duplicates": [{"key": x.key, "version": x.version, **self._encode_artifact(x)} for x in self.duplicates],
+            "skipped": {path: list(stat) for path, stat in self.skipped.items()},
+        }
+
+    @classmethod
+    def decode(cls, root: pathlib.Path, obj: dict) -> "ArtifactIndex":
+        index = cls(root=root)
+        if obj.get("version") != INDEX_FORMAT_VERSION:
+            return index
+        for key, versions in obj.get("plugins", {}).items():
+            for version, x in versions.items():
+                index.add(IndexedArtifact(x["path"], key, version, x["sha256"], x["mtime"], x["size"]))
+        for x in obj.get("duplicates", []):
+            index.add(IndexedArtifact(x["path"], x["key"], x["version"], x["sha256"], x["mtime"], x["size"]))
+        index.skipped = {path: tuple(stat) for path, stat in obj.get("skipped", {}).items()}
+        return index
+
+
+def index_path_of(root: pathlib.Path) -> pathlib.Path:
+    """returns the path of the index file of an artifact directory; an index file can also be passed directly"""
+    root = pathlib.Path(root)
+    return root if root.is_file() else root / INDEX_FILENAME
+
+
+def load_index(root: pathlib.Path) -> ArtifactIndex:
+    """Loads the index of an artifact directory
+    Raises:
+        FileNotFoundError: If the index has not been built yet
+    """
+    index_path = index_path_of(root)
+    with open(index_path) as index_file:
+        return ArtifactIndex.decode(index_path.parent, json.load(index_file))
+
+
+def _sha256(path: pathlib.Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as artifact:
+        for chunk in iter(lambda: artifact.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _scan_artifact(root: pathlib.Path, relative_path: str, mtime: float, size: int) -> typing.Optional[IndexedArtifact]:
+    """reads the plugin information of an artifact; runs in a worker process"""
+    path = root / relative_path
+    try:
+        if path.suffix == ".obr":
+            info = atlassian_jar.get_plugin_info_from_obr_path(path)
+        else:
+            info = atlassian_jar.get_plugin_info_from_jar_path(path)
+    except (FileNotFoundError, zipfile.BadZipFile, KeyError, PluginKeyNotFoundError, AttributeError):
+        return None
+    return IndexedArtifact(relative_path, info.key, info.version, _sha256(path), mtime, size)
+
+
+def build_index(root: pathlib.Path, workers: typing.Optional[int] = None) -> typing.Tuple[ArtifactIndex, int]:
+    """Scans all jars and obrs of root (recursively) in a process pool and writes the index into root. Artifacts,
+    whose modification time and size did not change since the last build, are not read again.
+    Returns:
+        the new index and the number of artifacts, which had to be read
+    """
+    root = pathlib.Path(root)
+    try:
+        previous = load_index(root)
+    except (FileNotFoundError, ValueError):
+        previous = ArtifactIndex(root=root)
+    previous_artifacts = {x.path: x for x in previous.artifacts()}
+
+    index = ArtifactIndex(root=root)
+    to_scan = []
+    for dirpath, _, filenames in os.walk(root):
+        for filename in filenames:
+            if not filename.endswith(ARTIFACT_SUFFIXES):
+                continue
+            path = pathlib.Path(dirpath) / filename
+            relative_path = path.relative_to(root).as_posix()
+            stat = path.stat()
+            known = previous_artifacts.get(relative_path)
+            if known is not None and (known.mtime, known.size) == (stat.st_mtime, stat.st_size):
+                index.add(known)
+            elif previous.skipped.get(relative_path) == (stat.st_mtime, stat.st_size):
+                index.skipped[relative_path] = (stat.st_mtime, stat.st_size)
+            else:
+                to_scan.append((relative_path, stat.st_mtime, stat.st_size))
+
+    if len(to_scan) > 0:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_scan_artifact, root, *x) for x in to_scan]
+            for (relative_path, mtime, size), future in zip(to_scan, futures):
+                artifact = future.result()
+                if artifact is None:
+                    index.skipped[relative_path] = (mtime, size)
+                else:
+                    index.add(artifact)
+
+    with open(index_path_of(root), "w") as index_file:
+        json.dump(index.encode(), index_file, separators=(",", ":"))
+    return index, len(to_scan)
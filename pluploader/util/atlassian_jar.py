@@ -2,34 +2,22 @@
 server applications.
 """
 
+import contextlib
+import io
+import mmap
 import pathlib
+import struct
 from dataclasses import dataclass
-from typing import IO
-from zipfile import ZipFile
+from typing import IO, Dict, Iterator, List, Optional, Tuple
+from zipfile import ZIP_STORED, BadZipFile, ZipFile, ZipInfo
 
 from bs4 import BeautifulSoup
+from packaging.version import Version
+from packaging.version import parse as version_parse
 
 from .pathutil import PluginKeyNotFoundError
 
 
-def _get_atlassian_plugin_xml_from_jar_bytes(jar_bytes: IO[bytes]) -> str:
-    """Opens the jar on the provided path and tries to find the
-    atlassian-plugin.xml in this file
-    Args:
-        path (pathlib.Param): the path to the jar file
-    Returns:
-        str: the content of atlassian_plugin.xml
-
-    Raises:
-        FileNotFoundError: If the file of path is not found
-        zipfile.BadZipFile: If the provided file of path is not a zip file
-        KeyError: If no atlassian_plugin.xml is existing inside the zip/jar
-    """
-    with ZipFile(jar_bytes) as jar:
-        with jar.open("atlassian-plugin.xml") as atlassian_plugin_xml:
-            return atlassian_plugin_xml.read()
-
-
 def _get_atlassian_plugin_xml_from_jar_path(path: pathlib.Path) -> str:
     """Opens the jar on the provided path and tries to find the
     atlassian-plugin.xml in this file
@@ -55,6 +43,13 @@ class PluginXmlData:
     version: str
 
 
+def parse_plugin_version(plugin_version: str) -> Version:
+    """parses the version of a plugin, so plugin versions can be compared"""
+    # WORKAROUND: replace -SNAPSHOT with .dev, to follow python versioning scheme
+    # TODO: find a new library that can parse -SNAPSHOT correctly
+    return version_parse(plugin_version.replace("-SNAPSHOT", ".dev"))
+
+
 def _extract_data(atlassian_plugin_xml: str) -> PluginXmlData:
     """Extracts data from the atlassian_plugin_xml and returns a PluginXmlData
     Args:
@@ -120,27 +115,227 @@ def get_plugin_info_from_jar_path(path: pathlib.Path) -> PluginXmlData:
     return _extract_data(atlas_xml)
 
 
-def _get_jar_from_obr_path(path: pathlib.Path) -> IO[bytes]:
-    """Tries to find various information of an atlassian server app plugin by proving the path to a .obr-file
+def _parse_manifest(manifest: bytes) -> Dict[str, str]:
+    """Parses the main section of a META-INF/MANIFEST.MF
+    Args:
+        manifest: the raw content of the manifest
+    Returns:
+        Dict[str, str]: the headers of the main section, with continuation lines joined
+    """
+    headers: Dict[str, str] = {}
+    last_header = None
+    for line in manifest.decode("utf-8", errors="replace").splitlines():
+        if line == "":
+            # an empty line terminates the main section
+            break
+        if line.startswith(" ") and last_header is not None:
+            headers[last_header] += line[1:]
+            continue
+        name, _, value = line.partition(":")
+        last_header = name.strip()
+        headers[last_header] = value.strip()
+    return headers
+
+
+def get_manifest_from_jar_path(path: pathlib.Path) -> Dict[str, str]:
+    """Reads the main section of the META-INF/MANIFEST.MF of the jar on the provided path. Only the central
+    directory and the manifest are read from the jar.
+    Args:
+        path (pathlib.Param): the path to the jar file
+    Returns:
+        Dict[str, str]: the headers of the manifest
+    Raises:
+        FileNotFoundError: If the file of path is not found
+        zipfile.BadZipFile: If the provided file of path is not a zip file
+        KeyError: If no META-INF/MANIFEST.MF is existing inside the zip/jar
+    """
+    with ZipFile(path) as jar:
+        return _parse_manifest(jar.read("META-INF/MANIFEST.MF"))
+
+
+def _extract_data_from_manifest(manifest: bytes) -> PluginXmlData:
+    """Extracts data from the OSGi headers of a manifest. Bundles without an atlassian-plugin.xml are
+    installed by the UPM under their Bundle-SymbolicName.
+    Args:
+        manifest: the raw content of a META-INF/MANIFEST.MF
+    Raises:
+        pluploader.pathutil.PluginKeyNotFoundError: If the manifest has no Bundle-SymbolicName
+    """
+    headers = _parse_manifest(manifest)
+    symbolic_name = headers.get("Bundle-SymbolicName")
+    if not symbolic_name:
+        raise PluginKeyNotFoundError()
+    key = symbolic_name.split(";", 1)[0].strip()
+    return PluginXmlData(key, headers.get("Bundle-Name", key), headers.get("Bundle-Version", "0.0.0"))
+
+
+def _extract_data_from_jar(jar: ZipFile) -> PluginXmlData:
+    """Extracts the plugin data of an opened jar, preferring the atlassian-plugin.xml over the manifest
+    Raises:
+        KeyError: If neither atlassian-plugin.xml nor META-INF/MANIFEST.MF is existing inside the jar
+        pluploader.pathutil.PluginKeyNotFoundError: If the PluginKey could not be found
+    """
+    try:
+        return _extract_data(jar.read("atlassian-plugin.xml"))
+    except KeyError:
+        return _extract_data_from_manifest(jar.read("META-INF/MANIFEST.MF"))
+
+
+@dataclass(frozen=True)
+class ObrBundle:
+    """A jar contained in an .obr-file. The main plugin is stored on the top-level, its dependencies are
+    usually stored in the dependencies/ folder."""
+
+    filename: str
+    is_main: bool
+    info: PluginXmlData
+
+
+class _MappedMember(io.RawIOBase):
+    """Read-only, seekable file object over a window of a memory-mapped file"""
+
+    def __init__(self, mapped: mmap.mmap, offset: int, size: int):
+        end = offset + size
+        self._view = memoryview(mapped)[offset:end]
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self._position + offset
+        elif whence == io.SEEK_END:
+            position = len(self._view) + offset
+        else:
+            raise ValueError(f"invalid whence ({whence})")
+        if position < 0:
+            raise ValueError(f"negative seek position {position}")
+        self._position = position
+        return position
+
+    def readinto(self, buffer) -> int:
+        end = self._position + len(buffer)
+        chunk = self._view[self._position:end]
+        buffer[: len(chunk)] = chunk
+        self._position += len(chunk)
+        return len(chunk)
+
+    def close(self):
+        self._view.release()
+        super().close()
+
+
+_LOCAL_FILE_HEADER = struct.Struct("<4s22xHH")
+_LOCAL_FILE_HEADER_SIGNATURE = b"PK\003\004"
+
+
+def _open_nested_jar(obr: ZipFile, mapped: mmap.mmap, member: ZipInfo) -> IO[bytes]:
+    """Returns a seekable file object for a jar stored inside the obr. Stored (uncompressed) jars are read
+    directly from the memory-mapped obr, so only the parts ZipFile actually touches - the central directory and
+    the requested entries - are read; compressed jars have to be inflated into memory once.
+    """
+    if member.compress_type != ZIP_STORED:
+        return io.BytesIO(obr.read(member))
+    signature, filename_length, extra_length = _LOCAL_FILE_HEADER.unpack_from(mapped, member.header_offset)
+    if signature != _LOCAL_FILE_HEADER_SIGNATURE:
+        raise BadZipFile(f"Bad magic number for file header of {member.filename}")
+    offset = member.header_offset + _LOCAL_FILE_HEADER.size + filename_length + extra_length
+    return _MappedMember(mapped, offset, member.compress_size)
+
+
+def _find_main_member(members: List[ZipInfo]) -> Optional[ZipInfo]:
+    """returns the top-level jar, or any jar if the obr has no top-level jar"""
+    for member in members:
+        if "/" not in member.filename:
+            return member
+    return members[0] if len(members) > 0 else None
+
+
+@contextlib.contextmanager
+def _open_jars_in_obr(path: pathlib.Path, main_only: bool = False) -> Iterator[List[Tuple[ZipInfo, ZipFile]]]:
+    """Opens all jars (or only the main jar) contained in the .obr-file of path without extracting them
+    Yields:
+        List[Tuple[ZipInfo, ZipFile]]: the obr member and the opened jar of each contained jar
+    Raises:
+        FileNotFoundError: If the file of path is not found
+        zipfile.BadZipFile: If the provided file of path or one of the opened jars is not a zip file
+    """
+    with open(path, "rb") as obr_file, ZipFile(obr_file) as obr:
+        members = [x for x in obr.infolist() if not x.is_dir() and x.filename.endswith(".jar")]
+        if main_only:
+            main_member = _find_main_member(members)
+            members = [main_member] if main_member is not None else []
+        if len(members) == 0:
+            yield []
+            return
+        with mmap.mmap(obr_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped, contextlib.ExitStack() as stack:
+            jars = []
+            for member in members:
+                jar_file = stack.enter_context(_open_nested_jar(obr, mapped, member))
+                jars.append((member, stack.enter_context(ZipFile(jar_file))))
+            yield jars
+
+
+def get_bundles_from_obr_path(path: pathlib.Path) -> List[ObrBundle]:
+    """Lists all jars of an .obr-file together with their plugin information. Jars without an
+    atlassian-plugin.xml (plain OSGi bundles) are identified by their Bundle-SymbolicName.
     Args:
         path (pathlib.Param): the path to the obr file
     Returns:
-        PluginKeyData: The Plugin Key
+        List[ObrBundle]: all bundles of the obr, the main plugin first
     Raises:
         FileNotFoundError: If the file of path is not found
         zipfile.BadZipFile: If the provided file of path is not a zip file
-        KeyError: If no atlassian_plugin.xml is existing inside the zip/jar
+        KeyError: If a jar has neither an atlassian-plugin.xml nor a manifest
         pluploader.pathutil.PluginKeyNotFoundError: If the PluginKey could not be found
     """
-    # let's open the obr, and look for a jar on the top-level
-    with ZipFile(path) as obr:
-        for file in obr.infolist():
-            if not file.is_dir() and file.filename.endswith(".jar"):
-                return obr.open(file.filename)
-    raise FileNotFoundError()
+    with _open_jars_in_obr(path) as jars:
+        bundles = [
+            ObrBundle(filename=member.filename, is_main="/" not in member.filename, info=_extract_data_from_jar(jar))
+            for member, jar in jars
+        ]
+    return sorted(bundles, key=lambda x: not x.is_main)
 
 
 def get_plugin_info_from_obr_path(path: pathlib.Path) -> PluginXmlData:
-    jar_bytes = _get_jar_from_obr_path(path)
-    atlas_xml = _get_atlassian_plugin_xml_from_jar_bytes(jar_bytes)
-    return _extract_data(atlas_xml)
+    """Tries to find various information of an atlassian server app plugin by proving the path to a .obr-file
+    Args:
+        path (pathlib.Param): the path to the obr file
+    Returns:
+        PluginKeyData: The Plugin data of the main plugin of the obr
+    Raises:
+        FileNotFoundError: If the file of path is not found or if the obr does not contain any jar
+        zipfile.BadZipFile: If the provided file of path is not a zip file
+        KeyError: If no atlassian_plugin.xml is existing inside the zip/jar
+        pluploader.pathutil.PluginKeyNotFoundError: If the PluginKey could not be found
+    """
+    with _open_jars_in_obr(path, main_only=True) as jars:
+        if len(jars) == 0:
+            raise FileNotFoundError()
+        return _extract_data(jars[0][1].read("atlassian-plugin.xml"))
+
+
+def extract_jars_from_obr(path: pathlib.Path, filenames: List[str], destination: pathlib.Path) -> Dict[str, pathlib.Path]:
+    """Extracts the jars of an .obr-file into the destination directory
+    Args:
+        path (pathlib.Param): the path to the obr file
+        filenames: the names of the jars inside of the obr, e.g. the filename of an ObrBundle
+        destination: the directory the jars are extracted to
+    Returns:
+        Dict[str, pathlib.Path]: the path of the extracted jar by its name inside of the obr
+    Raises:
+        FileNotFoundError: If the file of path is not found
+        zipfile.BadZipFile: If the provided file of path is not a zip file
+        KeyError: If one of the filenames is not existing inside the obr
+    """
+    with ZipFile(path) as obr:
+        return {filename: pathlib.Path(obr.extract(filename, destination)) for filename in filenames}
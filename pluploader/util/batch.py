@@ -0,0 +1,55 @@
+""" Helpers to execute batches of calls in a thread pool
+"""
+
+import collections
+import concurrent.futures
+import json
+import pathlib
+import sys
+import typing
+
+T = typing.TypeVar("T")
+R = typing.TypeVar("R")
+
+
+def ordered_map(
+    func: typing.Callable[[T], R], items: typing.Iterable[T], workers: int, window: typing.Optional[int] = None
+) -> typing.Iterator[typing.Tuple[T, "concurrent.futures.Future[R]"]]:
+    """Calls func for all items in a thread pool and yields every item with its (finished) future in the order of
+    items. At most window items (by default four per worker) are in flight, so items can be read lazily and results
+    are streamed, even for very large batches.
+    """
+    window = window if window is not None else workers * 4
+    in_flight: typing.Deque[typing.Tuple[T, concurrent.futures.Future]] = collections.deque()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        for item in items:
+            in_flight.append((item, executor.submit(func, item)))
+            if len(in_flight) >= window:
+                item, future = in_flight.popleft()
+                concurrent.futures.wait([future])
+                yield item, future
+        while len(in_flight) > 0:
+            item, future = in_flight.popleft()
+            concurrent.futures.wait([future])
+            yield item, future
+
+
+def read_jsonl(path: pathlib.Path) -> typing.Iterator[typing.Tuple[int, typing.Any]]:
+    """yields the line number and the parsed object (or the ValueError) of every non-empty line of a JSON lines file;
+    - reads from stdin"""
+    lines = sys.stdin if str(path) == "-" else open(path)
+    try:
+        for line_number, line in enumerate(lines, 1):
+            if line.strip() == "":
+                continue
+            try:
+                yield line_number, json.loads(line)
+            except ValueError as e:
+                yield line_number, e
+    finally:
+        if lines is not sys.stdin:
+            lines.close()
+
+
+def print_ndjson(obj: typing.Any, file: typing.Optional[typing.TextIO] = None):
+    print(json.dumps(obj, default=str), file=file, flush=True)
@@ -0,0 +1,123 @@
+""" Minimal load generator to profile the latency of an endpoint
+"""
+
+import collections
+import dataclasses
+import math
+import threading
+import time
+import typing
+
+# upper bounds (in ms) of the latency histogram buckets
+HISTOGRAM_BUCKETS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+
+
+@dataclasses.dataclass()
+class BenchResult:
+    duration: float
+    latencies: typing.List[float]
+    status_codes: typing.Dict[str, int]
+    errors: int
+
+    @property
+    def requests(self) -> int:
+        return len(self.latencies)
+
+    @property
+    def throughput(self) -> float:
+        return self.requests / self.duration if self.duration > 0 else 0.0
+
+    @property
+    def error_rate(self) -> float:
+        return self.errors / self.requests if self.requests > 0 else 0.0
+
+    def percentile(self, p: float) -> float:
+        """nearest-rank percentile of the latencies in seconds; latencies have to be sorted"""
+        if len(self.latencies) == 0:
+            return 0.0
+        rank = max(math.ceil(p / 100 * len(self.latencies)), 1)
+        return self.latencies[rank - 1]
+
+    def histogram(self) -> typing.List[typing.Tuple[str, int]]:
+        counts = [0] * (len(HISTOGRAM_BUCKETS) + 1)
+        bucket = 0
+        for latency in self.latencies:
+            while bucket < len(HISTOGRAM_BUCKETS) and latency * 1000 > HISTOGRAM_BUCKETS[bucket]:
+                bucket += 1
+            counts[bucket] += 1
+        labels = [f"<={x}ms" for x in HISTOGRAM_BUCKETS] + [f">{HISTOGRAM_BUCKETS[-1]}ms"]
+        return list(zip(labels, counts))
+
+    def encode(self) -> typing.Dict[str, typing.Any]:
+        return {
+            "requests": self.requests,
+            "duration": round(self.duration, 3),
+            "throughput": round(self.throughput, 2),
+            "errors": self.errors,
+            "errorRate": round(self.error_rate, 4),
+            "statusCodes": self.status_codes,
+            "latencyMs": {
+                "min": round(self.latencies[0] * 1000, 2) if self.latencies else 0.0,
+                "p50": round(self.percentile(50) * 1000, 2),
+                "p90": round(self.percentile(90) * 1000, 2),
+                "p99": round(self.percentile(99) * 1000, 2),
+                "max": round(self.latencies[-1] * 1000, 2) if self.latencies else 0.0,
+            },
+            "histogram": dict(self.histogram()),
+        }
+
+
+def run_bench(
+    send: typing.Callable[[], int],
+    concurrency: int,
+    duration: typing.Optional[float] = None,
+    requests: typing.Optional[int] = None,
+) -> BenchResult:
+    """Calls send (which returns the status code of the response) from concurrency threads until duration seconds
+    passed or requests calls were made. Exceptions of send and status codes >= 400 are counted as errors.
+    """
+    if duration is None and requests is None:
+        raise ValueError("either duration or requests is required")
+    lock = threading.Lock()
+    remaining = [requests]
+    latencies: typing.List[float] = []
+    status_codes: typing.Counter[str] = collections.Counter()
+    errors = [0]
+    start = time.perf_counter()
+    deadline = start + duration if duration is not None else None
+
+    def worker():
+        local_latencies = []
+        local_status_codes: typing.Counter[str] = collections.Counter()
+        local_errors = 0
+        while deadline is None or time.perf_counter() < deadline:
+            if remaining[0] is not None:
+                with lock:
+                    if remaining[0] <= 0:
+                        break
+                    remaining[0] -= 1
+            request_start = time.perf_counter()
+            try:
+                status = send()
+            except Exception as e:
+                local_status_codes[type(e).__name__] += 1
+                local_errors += 1
+            else:
+                local_status_codes[str(status)] += 1
+                if status >= 400:
+                    local_errors += 1
+            local_latencies.append(time.perf_counter() - request_start)
+        with lock:
+            latencies.extend(local_latencies)
+            status_codes.update(local_status_codes)
+            errors[0] += local_errors
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    latencies.sort()
+    return BenchResult(
+        duration=time.perf_counter() - start, latencies=latencies, status_codes=dict(status_codes), errors=errors[0]
+    )
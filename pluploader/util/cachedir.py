@@ -0,0 +1,30 @@
+""" This module provides the location of the pluploader cache directory
+"""
+
+import os
+import pathlib
+import re
+
+import furl
+
+
+def get_cache_dir(*parts: str) -> pathlib.Path:
+    """Returns (and creates) a directory inside of the pluploader cache directory.
+
+    The cache directory is $PLUP_CACHE_DIR, $XDG_CACHE_HOME/pluploader or ~/.cache/pluploader
+    """
+    if os.environ.get("PLUP_CACHE_DIR"):
+        cache_dir = pathlib.Path(os.environ["PLUP_CACHE_DIR"])
+    elif os.environ.get("XDG_CACHE_HOME"):
+        cache_dir = pathlib.Path(os.environ["XDG_CACHE_HOME"]) / "pluploader"
+    else:
+        cache_dir = pathlib.Path.home() / ".cache" / "pluploader"
+    cache_dir = cache_dir.joinpath(*parts)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    return cache_dir
+
+
+def host_cache_name(base_url: furl.furl, name: str) -> str:
+    """returns a file name for data of the user of base_url on its host"""
+    identifier = f"{name}_{base_url.username or ''}@{base_url.host}_{base_url.port}{base_url.path}"
+    return re.sub(r"[^A-Za-z0-9@.-]", "_", identifier)
@@ -0,0 +1,300 @@
+""" Records the timing of all http requests sent through requests
+
+The tracer patches requests and urllib3 while it is installed, so requests of all
+subsystems (upm, marketplace, job scraper, ...) are recorded without passing hooks around.
+"""
+
+import collections
+import dataclasses
+import datetime
+import json
+import socket
+import threading
+import time
+import typing
+
+import furl
+import requests
+import urllib3.connection
+from requests.adapters import HTTPAdapter
+from rich.console import Console
+from rich.table import Table
+
+PHASES = ["dns", "connect", "tls", "send", "wait", "receive"]
+
+_SENSITIVE_HEADERS = {"authorization", "cookie", "set-cookie"}
+
+
+@dataclasses.dataclass()
+class HttpTrace:
+    method: str
+    url: str
+    started: float
+    request_headers: typing.Dict[str, str]
+    bytes_sent: int = 0
+    bytes_received: int = 0
+    status: typing.Optional[int] = None
+    reason: str = ""
+    response_headers: typing.Dict[str, str] = dataclasses.field(default_factory=dict)
+    error: typing.Optional[str] = None
+    total: float = 0.0
+    phases: typing.Dict[str, float] = dataclasses.field(default_factory=lambda: {x: 0.0 for x in PHASES})
+    # time spent in the transport adapter and in the requests of redirects
+    adapter_time: float = dataclasses.field(default=0.0, repr=False)
+    redirect_time: float = dataclasses.field(default=0.0, repr=False)
+
+    @property
+    def path(self) -> str:
+        return str(furl.furl(self.url).path)
+
+    def encode_har(self) -> typing.Dict[str, typing.Any]:
+        def headers(x: typing.Dict[str, str]):
+            return [
+                {"name": k, "value": "<redacted>" if k.lower() in _SENSITIVE_HEADERS else v} for k, v in x.items()
+            ]
+
+        return {
+            "startedDateTime": datetime.datetime.fromtimestamp(self.started, datetime.timezone.utc).isoformat(),
+            "time": round(self.total * 1000, 3),
+            "request": {
+                "method": self.method,
+                "url": self.url,
+                "httpVersion": "HTTP/1.1",
+                "headers": headers(self.request_headers),
+                "queryString": [{"name": k, "value": v} for k, v in furl.furl(self.url).args.allitems()],
+                "headersSize": -1,
+                "bodySize": self.bytes_sent,
+            },
+            "response": {
+                "status": self.status or 0,
+                "statusText": self.error or self.reason,
+                "httpVersion": "HTTP/1.1",
+                "headers": headers(self.response_headers),
+                "content": {"size": self.bytes_received, "mimeType": self.response_headers.get("Content-Type", "")},
+                "redirectURL": self.response_headers.get("Location", ""),
+                "headersSize": -1,
+                "bodySize": self.bytes_received,
+            },
+            "cache": {},
+            "timings": {
+                "blocked": -1,
+                "dns": round(self.phases["dns"] * 1000, 3),
+                "connect": round(self.phases["connect"] * 1000, 3),
+                "ssl": round(self.phases["tls"] * 1000, 3),
+                "send": round(self.phases["send"] * 1000, 3),
+                "wait": round(self.phases["wait"] * 1000, 3),
+                "receive": round(self.phases["receive"] * 1000, 3),
+            },
+        }
+
+
+def _body_size(body: typing.Any, headers: typing.Mapping[str, str]) -> int:
+    if isinstance(body, (bytes, str)):
+        return len(body)
+    try:
+        return int(headers.get("Content-Length", 0))
+    except ValueError:
+        return 0
+
+
+def _trace_body(trace: HttpTrace, response: requests.Response):
+    """The body of a streamed response is read after Session.send returned. Adds the time spent reading the body and
+    the received bytes to the trace while the body is consumed, until the response is closed."""
+    raw = response.raw
+    read, read_chunked, close = raw.read, getattr(raw, "read_chunked", None), response.close
+    closed = [False]
+
+    def add(elapsed: float, data: typing.Any):
+        if closed[0]:
+            return
+        trace.phases["receive"] += elapsed
+        trace.total += elapsed
+        if isinstance(data, (bytes, bytearray)):
+            trace.bytes_received += len(data)
+
+    def traced_read(*args, **kwargs):
+        start = time.perf_counter()
+        data = read(*args, **kwargs)
+        add(time.perf_counter() - start, data)
+        return data
+
+    def traced_read_chunked(*args, **kwargs):
+        chunks = read_chunked(*args, **kwargs)
+        while True:
+            start = time.perf_counter()
+            try:
+                chunk = next(chunks)
+            except StopIteration:
+                add(time.perf_counter() - start, None)
+                return
+            add(time.perf_counter() - start, chunk)
+            yield chunk
+
+    def traced_close():
+        close()
+        closed[0] = True
+
+    raw.read = traced_read
+    if read_chunked is not None:
+        raw.read_chunked = traced_read_chunked
+    response.close = traced_close
+
+
+class HttpTracer:
+    """Use as context manager: patches requests/urllib3 on enter and restores them on exit"""
+
+    def __init__(self):
+        self.traces: typing.List[HttpTrace] = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._originals: typing.List[typing.Tuple[typing.Any, str, typing.Any]] = []
+
+    def _current(self) -> typing.Optional[HttpTrace]:
+        stack = getattr(self._local, "stack", None)
+        return stack[-1] if stack else None
+
+    def _patch(self, owner: typing.Any, name: str, wrapper: typing.Callable[[typing.Callable], typing.Callable]):
+        original = getattr(owner, name)
+        self._originals.append((owner, name, original))
+        setattr(owner, name, wrapper(original))
+
+    def __enter__(self) -> "HttpTracer":
+        tracer = self
+
+        def timed(phase: str, subtract: typing.Sequence[str] = ()):
+            """adds the duration of the call to phase of the current trace, minus the time spent in the phases of
+            subtract during the call"""
+
+            def wrapper(original):
+                def timed_call(*args, **kwargs):
+                    trace = tracer._current()
+                    if trace is None:
+                        return original(*args, **kwargs)
+                    before = sum(trace.phases[x] for x in subtract)
+                    start = time.perf_counter()
+                    try:
+                        return original(*args, **kwargs)
+                    finally:
+                        nested = sum(trace.phases[x] for x in subtract) - before
+                        trace.phases[phase] += time.perf_counter() - start - nested
+
+                return timed_call
+
+            return wrapper
+
+        def adapter_send(original):
+            def send(adapter, request, *args, **kwargs):
+                trace = tracer._current()
+                if trace is None:
+                    return original(adapter, request, *args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    return original(adapter, request, *args, **kwargs)
+                finally:
+                    # everything but connecting and waiting for the response is writing the request
+                    elapsed = time.perf_counter() - start
+                    trace.phases["send"] = max(elapsed - sum(trace.phases[x] for x in ["dns", "connect", "tls", "wait"]), 0.0)
+                    trace.adapter_time += elapsed
+
+            return send
+
+        def session_send(original):
+            def send(session, request, **kwargs):
+                trace = HttpTrace(
+                    method=request.method,
+                    url=str(furl.furl(request.url).remove(username=True, password=True)),
+                    started=time.time(),
+                    request_headers=dict(request.headers),
+                    bytes_sent=_body_size(request.body, request.headers),
+                )
+                stack = tracer._local.__dict__.setdefault("stack", [])
+                stack.append(trace)
+                start = time.perf_counter()
+                try:
+                    response = original(session, request, **kwargs)
+                except Exception as e:
+                    trace.error = str(e)
+                    raise
+                else:
+                    trace.status = response.status_code
+                    trace.reason = response.reason or ""
+                    trace.response_headers = dict(response.headers)
+                    if response._content_consumed and isinstance(response._content, bytes):
+                        trace.bytes_received = len(response._content)
+                    elif kwargs.get("stream", False) and response.raw is not None:
+                        _trace_body(trace, response)
+                    else:
+                        trace.bytes_received = _body_size(None, response.headers)
+                    return response
+                finally:
+                    trace.total = time.perf_counter() - start
+                    trace.phases["receive"] = max(trace.total - trace.adapter_time - trace.redirect_time, 0.0)
+                    stack.pop()
+                    if stack:
+                        stack[-1].redirect_time += trace.total
+                    with tracer._lock:
+                        tracer.traces.append(trace)
+
+            return send
+
+        self._patch(socket, "getaddrinfo", timed("dns"))
+        self._patch(urllib3.connection.HTTPConnection, "_new_conn", timed("connect", subtract=["dns"]))
+        self._patch(urllib3.connection.HTTPSConnection, "connect", timed("tls", subtract=["dns", "connect"]))
+        self._patch(urllib3.connection.HTTPConnection, "getresponse", timed("wait"))
+        self._patch(HTTPAdapter, "send", adapter_send)
+        self._patch(requests.Session, "send", session_send)
+        return self
+
+    def __exit__(self, *args):
+        for owner, name, original in reversed(self._originals):
+            setattr(owner, name, original)
+        self._originals = []
+
+    def write_har(self, path: str):
+        from .. import __version__
+
+        har = {
+            "log": {
+                "version": "1.2",
+                "creator": {"name": "pluploader", "version": __version__},
+                "entries": [x.encode_har() for x in sorted(self.traces, key=lambda x: x.started)],
+            }
+        }
+        with open(path, "w") as har_file:
+            json.dump(har, har_file, indent=2)
+
+    def print_summary(self, console: typing.Optional[Console] = None):
+        """prints the requests grouped by method, host and path with their average phases"""
+        console = console or Console(stderr=True)
+        groups: typing.Dict[typing.Tuple[str, str], typing.List[HttpTrace]] = collections.defaultdict(list)
+        for trace in self.traces:
+            url = furl.furl(trace.url)
+            groups[(trace.method, f"{url.host}{url.path}")].append(trace)
+
+        table = Table(title=f"{len(self.traces)} http requests (times in ms, sizes in bytes)", title_justify="left")
+        table.add_column("request", overflow="fold")
+        table.add_column("n", justify="right")
+        table.add_column("status")
+        table.add_column("total", justify="right")
+        for phase in PHASES:
+            table.add_column(phase, justify="right")
+        table.add_column("sent", justify="right")
+        table.add_column("received", justify="right")
+
+        def add_row(name: str, traces: typing.List[HttpTrace]):
+            status = collections.Counter(str(x.status or "error") for x in traces)
+            table.add_row(
+                name,
+                str(len(traces)),
+                ", ".join(f"{k}x{v}" if v > 1 else k for k, v in sorted(status.items())),
+                f"{sum(x.total for x in traces) * 1000:.1f}",
+                *[f"{sum(x.phases[phase] for x in traces) * 1000:.1f}" for phase in PHASES],
+                str(sum(x.bytes_sent for x in traces)),
+                str(sum(x.bytes_received for x in traces)),
+            )
+
+        for (method, path), traces in sorted(groups.items(), key=lambda x: -sum(y.total for y in x[1])):
+            add_row(f"{method} {path}", traces)
+        if len(groups) > 1:
+            add_row("total", self.traces)
+        console.print(table)
@@ -0,0 +1,158 @@
+""" this module predicts modules of a plugin, which will most likely be disabled after the
+installation, by analysing the atlassian-plugin.xml and the OSGi manifest of the jar.
+"""
+
+import io
+import pathlib
+import typing
+from dataclasses import dataclass
+from zipfile import BadZipFile, ZipFile
+
+from bs4 import BeautifulSoup
+
+from . import atlassian_jar, osgi
+
+# element names of the atlassian-plugin.xml, which are not modules
+_NON_MODULE_ELEMENTS = {"plugin-info", "resource"}
+# file generated by the atlassian-spring-scanner, listing the interfaces imported with @ComponentImport
+_SPRING_SCANNER_IMPORTS = "META-INF/plugin-components/imports"
+
+
+@dataclass(frozen=True)
+class ModuleProblem:
+    module_key: str
+    module_type: str
+    reason: str
+
+
+def _package_of(class_name: str) -> str:
+    return class_name.rsplit(".", 1)[0] if "." in class_name else ""
+
+
+def _class_files(jar: ZipFile, bundle_class_path: typing.Optional[str]) -> typing.Set[str]:
+    """Returns the class files of the bundle class path, relative to their class path entry. Besides the root of the
+    jar (which is always included, even if the Bundle-ClassPath does not list "."), the class path can contain
+    directories and jars embedded into the jar, e.g. META-INF/lib/library.jar.
+    """
+    names = set(jar.namelist())
+    class_files = {x for x in names if x.endswith(".class")}
+    for clause in osgi.parse_package_header(bundle_class_path):
+        entry = clause.name.strip("/")
+        if entry in (".", ""):
+            continue
+        if entry in names:
+            try:
+                with ZipFile(io.BytesIO(jar.read(entry))) as embedded:
+                    class_files |= {x for x in embedded.namelist() if x.endswith(".class")}
+            except BadZipFile:
+                continue
+        else:
+            prefix = f"{entry}/"
+            start = len(prefix)
+            class_files |= {x[start:] for x in names if x.startswith(prefix) and x.endswith(".class")}
+    return class_files
+
+
+def read_host_exports(path: pathlib.Path) -> typing.Set[str]:
+    """Reads the packages exported by the host from a file. The file either contains one package per line or the
+    value of an Export-Package header.
+    """
+    content = pathlib.Path(path).read_text()
+    if content.startswith("Export-Package:"):
+        content = content.partition(":")[2]
+    # manifest continuation lines start with a single space
+    content = content.replace("\n ", "")
+    return {x.name for x in osgi.parse_package_header(",".join(content.splitlines()))}
+
+
+def predict_disabled_modules(
+    path: pathlib.Path, host_exports: typing.Optional[typing.Set[str]] = None
+) -> typing.List[ModuleProblem]:
+    """Checks the modules of a plugin jar against its OSGi manifest and returns the modules, which will most likely
+    fail to enable:
+
+    - component-imports (including those of the atlassian-spring-scanner) and module classes of packages, which are
+      neither contained in the jar nor imported
+    - module classes of packages of the jar, which are missing in the jar
+
+    Classes of jars and directories on the Bundle-ClassPath (e.g. embedded libraries) count as contained in the jar.
+    - if host_exports is given, all modules if a mandatory import is neither exported by the host nor by the jar,
+      as the bundle can not be resolved then
+
+    Plugins without an OSGi manifest are transformed by the plugin framework, which generates the imports; those are
+    not checked.
+    Raises:
+        FileNotFoundError: If the file of path is not found
+        zipfile.BadZipFile: If the provided file of path is not a zip file
+        KeyError: If no atlassian_plugin.xml is existing inside the zip/jar
+    """
+    with ZipFile(path) as jar:
+        names = set(jar.namelist())
+        soup = BeautifulSoup(jar.read("atlassian-plugin.xml"), "xml")
+        scanner_imports = []
+        if _SPRING_SCANNER_IMPORTS in names:
+            scanner_imports = jar.read(_SPRING_SCANNER_IMPORTS).decode("utf-8", errors="replace").splitlines()
+        if "META-INF/MANIFEST.MF" not in names:
+            return []
+        headers = atlassian_jar.get_manifest_from_jar_path(path)
+        class_files = _class_files(jar, headers.get("Bundle-ClassPath"))
+
+    if "Import-Package" not in headers and "Bundle-SymbolicName" not in headers:
+        return []
+    if "*" in {x.name for x in osgi.parse_package_header(headers.get("DynamicImport-Package"))}:
+        # every package can be wired at runtime
+        return []
+
+    imports = osgi.parse_package_header(headers.get("Import-Package"))
+    exports = {x.name for x in osgi.parse_package_header(headers.get("Export-Package"))}
+    contained = {x.rpartition("/")[0].replace("/", ".") for x in class_files}
+    available = {x.name for x in imports} | exports | contained
+
+    def check_class(class_name: str) -> typing.Optional[str]:
+        # inner classes are referenced by $, e.g. com.example.Outer$Inner
+        package = _package_of(class_name.strip())
+        if package == "java" or package.startswith("java."):
+            # java.* is always delegated to the boot classloader
+            return None
+        if package in contained:
+            if f"{class_name.strip().replace('.', '/')}.class" not in class_files:
+                return f"class {class_name} is missing in the jar"
+        elif package not in available:
+            return f"package {package} of {class_name} is not imported"
+        return None
+
+    problems: typing.List[ModuleProblem] = []
+    plugin = soup.find("atlassian-plugin")
+    plugin_key = plugin.get("key", "")
+
+    if host_exports is not None:
+        for clause in imports:
+            if not clause.optional and clause.name not in host_exports and clause.name not in exports:
+                problems.append(
+                    ModuleProblem(plugin_key, "Import-Package", f"package {clause.name} is not exported by the host")
+                )
+
+    for module in plugin.find_all(recursive=False):
+        if module.name in _NON_MODULE_ELEMENTS:
+            continue
+        module_key = module.get("key", "")
+        class_names = [module.get("class")] if module.get("class") else []
+        if module.name in ("component-import", "component"):
+            if module.get("interface"):
+                class_names.append(module.get("interface"))
+            class_names += [x.get_text().strip() for x in module.find_all("interface")]
+        for class_name in class_names:
+            reason = check_class(class_name)
+            if reason is not None:
+                problems.append(ModuleProblem(module_key, module.name, reason))
+
+    for line in scanner_imports:
+        # lines may be prefixed with the products they apply to, e.g. "#confluence#com.example.Service"
+        class_name = line.rsplit("#", 1)[-1].strip()
+        if class_name == "":
+            continue
+        reason = check_class(class_name)
+        if reason is not None:
+            problems.append(ModuleProblem(class_name, "@ComponentImport", reason))
+
+    return problems
@@ -0,0 +1,152 @@
+""" this module analyses the OSGi headers (Import-Package/Export-Package) of bundles
+in order to find out in which order they need to be installed.
+"""
+
+import pathlib
+import typing
+from dataclasses import dataclass, field
+
+from . import atlassian_jar
+
+
+class DependencyCycleError(ValueError):
+    def __init__(self, cycle: typing.List[pathlib.Path]):
+        super().__init__(" -> ".join(x.name for x in cycle))
+        self.cycle = cycle
+
+
+@dataclass(frozen=True)
+class PackageClause:
+    name: str
+    attributes: typing.Dict[str, str]
+
+    @property
+    def optional(self) -> bool:
+        return self.attributes.get("resolution:") == "optional"
+
+
+def _split_unquoted(value: str, separator: str) -> typing.List[str]:
+    """splits value on separator, ignoring separators inside of double quotes"""
+    parts = []
+    current = []
+    quoted = False
+    for char in value:
+        if char == '"':
+            quoted = not quoted
+        if char == separator and not quoted:
+            parts.append("".join(current))
+            current = []
+        else:
+            current.append(char)
+    parts.append("".join(current))
+    return [x.strip() for x in parts if x.strip() != ""]
+
+
+def parse_package_header(header: typing.Optional[str]) -> typing.List[PackageClause]:
+    """Parses an Import-Package or Export-Package header. Multiple packages can share the same parameters, e.g.
+    'a;b;version="[1.0,2)"', which results in a clause for each package.
+    Directives (like resolution:=optional) are stored with a trailing colon ("resolution:") in the attributes.
+    """
+    if not header:
+        return []
+    clauses = []
+    for clause in _split_unquoted(header, ","):
+        packages = []
+        attributes = {}
+        for part in _split_unquoted(clause, ";"):
+            if "=" in part:
+                name, _, value = part.partition("=")
+                attributes[name.strip()] = value.strip().strip('"')
+            else:
+                packages.append(part)
+        clauses += [PackageClause(name=package, attributes=attributes) for package in packages]
+    return clauses
+
+
+@dataclass(frozen=True)
+class BundleManifest:
+    path: pathlib.Path
+    symbolic_name: str
+    imports: typing.List[PackageClause]
+    exports: typing.List[PackageClause]
+
+    @classmethod
+    def from_jar_path(cls, path: pathlib.Path) -> "BundleManifest":
+        """Reads the META-INF/MANIFEST.MF of a jar
+        Raises:
+            FileNotFoundError: If the file of path is not found
+            zipfile.BadZipFile: If the provided file of path is not a zip file
+            KeyError: If the jar has no manifest
+        """
+        headers = atlassian_jar.get_manifest_from_jar_path(path)
+        return cls(
+            path=pathlib.Path(path),
+            symbolic_name=headers.get("Bundle-SymbolicName", pathlib.Path(path).name).split(";", 1)[0].strip(),
+            imports=parse_package_header(headers.get("Import-Package")),
+            exports=parse_package_header(headers.get("Export-Package")),
+        )
+
+    @property
+    def exported_packages(self) -> typing.Set[str]:
+        return {x.name for x in self.exports}
+
+
+@dataclass()
+class InstallPlan:
+    """bundles grouped into waves; the bundles of a wave only depend on bundles of previous waves and can therefore be
+    installed concurrently."""
+
+    waves: typing.List[typing.List[BundleManifest]]
+    unresolved_imports: typing.Dict[pathlib.Path, typing.List[PackageClause]] = field(default_factory=dict)
+
+
+def _find_cycle(
+    remaining: typing.List[BundleManifest], dependencies: typing.Dict[pathlib.Path, typing.Set[pathlib.Path]]
+) -> typing.List[pathlib.Path]:
+    """returns a dependency cycle between the remaining bundles, which could not be sorted topologically"""
+    remaining_paths = {x.path for x in remaining}
+    path = [remaining[0].path]
+    while True:
+        current = path[-1]
+        following = next(x for x in sorted(dependencies[current]) if x in remaining_paths)
+        if following in path:
+            start = path.index(following)
+            return path[start:] + [following]
+        path.append(following)
+
+
+def plan_install_waves(bundles: typing.List[BundleManifest]) -> InstallPlan:
+    """Builds the package dependency graph of the bundles and sorts them topologically into waves.
+    Imports which are not exported by any of the bundles are expected to be provided by the host and are returned as
+    unresolved imports. Optional imports do not create a dependency.
+    Raises:
+        DependencyCycleError: If the bundles depend on each other in a cycle
+    """
+    exporters: typing.Dict[str, typing.List[pathlib.Path]] = {}
+    for bundle in bundles:
+        for package in bundle.exported_packages:
+            exporters.setdefault(package, []).append(bundle.path)
+
+    dependencies: typing.Dict[pathlib.Path, typing.Set[pathlib.Path]] = {}
+    unresolved: typing.Dict[pathlib.Path, typing.List[PackageClause]] = {}
+    for bundle in bundles:
+        dependencies[bundle.path] = set()
+        for clause in bundle.imports:
+            if clause.name in bundle.exported_packages:
+                continue
+            if clause.name not in exporters:
+                unresolved.setdefault(bundle.path, []).append(clause)
+            elif not clause.optional:
+                dependencies[bundle.path].update(exporters[clause.name])
+
+    waves = []
+    installed: typing.Set[pathlib.Path] = set()
+    remaining = list(bundles)
+    while len(remaining) > 0:
+        wave = [x for x in remaining if dependencies[x.path] <= installed]
+        if len(wave) == 0:
+            raise DependencyCycleError(_find_cycle(remaining, dependencies))
+        waves.append(wave)
+        installed.update(x.path for x in wave)
+        remaining = [x for x in remaining if x.path not in installed]
+    return InstallPlan(waves=waves, unresolved_imports=unresolved)
@@ -27,6 +27,31 @@ def get_jar_path_from_pom() -> os.PathLike:
     return rootdir / "target" / f"{artifact_id}-{version}.jar"
 
 
+def get_jar_paths_from_reactor() -> typing.List[pathlib.Path]:
+    """Get jars to upload based on the modules of a maven reactor
+
+    This function reads the modules of the pom in the project root and returns the
+    artifacts of the modules, which were built by the last `mvn package` command.
+    """
+    rootdir = find_maven_project_root()
+    namespace = {"ns": "http://maven.apache.org/POM/4.0.0"}
+
+    root = ET.parse(f"{rootdir}/pom.xml").getroot()
+    jar_paths = []
+    for module in root.findall("ns:modules/ns:module", namespace):
+        module_dir = rootdir / module.text.strip()
+        module_root = ET.parse(f"{module_dir}/pom.xml").getroot()
+        artifact_id = module_root.find("ns:artifactId", namespace).text
+        version = module_root.find("ns:version", namespace)
+        if version is None:
+            # the version is inherited from the parent
+            version = module_root.find("ns:parent/ns:version", namespace)
+        jar_path = module_dir / "target" / f"{artifact_id}-{version.text}.jar"
+        if jar_path.exists():
+            jar_paths.append(jar_path)
+    return jar_paths
+
+
 def get_plugin_key_from_pom() -> str:
     """Get Plugin key from Pom.xml
 
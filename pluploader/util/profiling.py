@@ -0,0 +1,81 @@
+""" CPU profiling of a whole command
+
+cProfile records exact call counts and times of the main thread; the optional stack
+sampler records the stacks of all threads in the collapsed format used by flame graph
+tools (e.g. flamegraph.pl, speedscope).
+"""
+
+import collections
+import cProfile
+import os
+import pstats
+import sys
+import threading
+import typing
+
+# seconds between two stack samples
+SAMPLE_INTERVAL = 0.005
+
+
+class StackSampler:
+    """samples the stacks of all threads (except its own) in a background thread"""
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stacks: typing.Counter[str] = collections.Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="pluploader-stack-sampler", daemon=True)
+
+    def _run(self):
+        own_id = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            for thread in threading.enumerate():
+                names[thread.ident] = thread.name
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def write_collapsed(self, path: os.PathLike):
+        with open(path, "w") as collapsed_file:
+            for stack, count in sorted(self.stacks.items()):
+                collapsed_file.write(f"{stack} {count}\n")
+
+
+class CommandProfiler:
+    def __init__(self, collapsed: bool = False):
+        self.profile = cProfile.Profile()
+        self.sampler = StackSampler() if collapsed else None
+
+    def start(self):
+        if self.sampler is not None:
+            self.sampler.start()
+        self.profile.enable()
+
+    def stop(self):
+        self.profile.disable()
+        if self.sampler is not None:
+            self.sampler.stop()
+
+    def write_stats(self, path: os.PathLike):
+        """writes the pstats file, which can be read with python -m pstats or snakeviz"""
+        self.profile.dump_stats(str(path))
+
+    def print_top(self, limit: int, stream: typing.TextIO = sys.stderr):
+        """prints the functions with the highest own time"""
+        stats = pstats.Stats(self.profile, stream=stream)
+        stats.strip_dirs().sort_stats(pstats.SortKey.TIME).print_stats(limit)
@@ -0,0 +1,86 @@
+""" This module persists the cookies of authenticated sessions per host and user, so
+commands can reuse a session (including websudo) instead of authenticating again.
+The xsrf token (atl_token) of the session is stored next to its cookies, as it is only valid
+for this session.
+"""
+
+import json
+import os
+import pathlib
+import time
+import typing
+
+import furl
+import requests
+
+from .cachedir import get_cache_dir, host_cache_name
+
+
+def session_path(base_url: furl.furl, name: str) -> pathlib.Path:
+    """returns the path of the session file of the user of base_url on its host"""
+    directory = get_cache_dir("sessions")
+    # the cookies are credentials - only the user may access them
+    os.chmod(directory, 0o700)
+    return directory / f"{host_cache_name(base_url, name)}.json"
+
+
+def _read_session(path: pathlib.Path) -> typing.Dict[str, typing.Any]:
+    try:
+        with open(path) as session_file:
+            stored = json.load(session_file)
+    except (FileNotFoundError, ValueError):
+        return {}
+    # session files of earlier versions only contain the cookies
+    return {"cookies": stored} if isinstance(stored, list) else stored
+
+
+def load_cookies(session: requests.Session, path: pathlib.Path) -> bool:
+    """adds the cookies of the session file, which did not expire yet, to the session; returns whether cookies were
+    loaded"""
+    now = time.time()
+    loaded = False
+    for cookie in _read_session(path).get("cookies", []):
+        if cookie.get("expires") is not None and cookie["expires"] < now:
+            continue
+        session.cookies.set(
+            cookie["name"],
+            cookie["value"],
+            domain=cookie.get("domain", ""),
+            path=cookie.get("path", "/"),
+            expires=cookie.get("expires"),
+            secure=cookie.get("secure", False),
+        )
+        loaded = True
+    return loaded
+
+
+def load_token(path: pathlib.Path) -> typing.Optional[str]:
+    """returns the token stored with the cookies of the session file"""
+    return _read_session(path).get("token")
+
+
+def save_cookies(session: requests.Session, path: pathlib.Path, token: typing.Optional[str] = None):
+    """writes the cookies and the token of the session into a file, which is only readable by the user"""
+    cookies = [
+        {
+            "name": x.name,
+            "value": x.value,
+            "domain": x.domain,
+            "path": x.path,
+            "expires": x.expires,
+            "secure": x.secure,
+        }
+        for x in session.cookies
+    ]
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    os.fchmod(fd, 0o600)
+    with os.fdopen(fd, "w") as session_file:
+        json.dump({"cookies": cookies, "token": token}, session_file)
+
+
+def delete_session(path: pathlib.Path) -> bool:
+    try:
+        path.unlink()
+        return True
+    except FileNotFoundError:
+        return False
@@ -0,0 +1,128 @@
+""" Timing spans of the phases of a command
+
+Spans are written as JSON lines in the shape of OTLP/JSON spans (start/end in unix nanoseconds,
+typed attributes), so they can be forwarded to OpenTelemetry based tooling as they are.
+Without an exporter, spans are only measured and dropped.
+"""
+
+import contextlib
+import dataclasses
+import json
+import os
+import threading
+import time
+import typing
+
+SERVICE_NAME = "pluploader"
+
+
+@dataclasses.dataclass()
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_span_id: str = ""
+    start_time: int = dataclasses.field(default_factory=time.time_ns)
+    end_time: int = 0
+    attributes: typing.Dict[str, typing.Any] = dataclasses.field(default_factory=dict)
+    status_code: str = "STATUS_CODE_UNSET"
+    status_message: str = ""
+
+    def set_attribute(self, key: str, value: typing.Any):
+        if value is not None:
+            self.attributes[key] = value
+
+    def set_error(self, message: str):
+        self.status_code = "STATUS_CODE_ERROR"
+        self.status_message = message
+
+    def encode(self) -> typing.Dict[str, typing.Any]:
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_span_id,
+            "name": self.name,
+            "kind": "SPAN_KIND_INTERNAL",
+            "startTimeUnixNano": str(self.start_time),
+            "endTimeUnixNano": str(self.end_time),
+            "attributes": [
+                {"key": "service.name", "value": _encode_value(SERVICE_NAME)},
+                *[{"key": k, "value": _encode_value(v)} for k, v in self.attributes.items()],
+            ],
+            "status": {"code": self.status_code, "message": self.status_message},
+        }
+
+
+def _encode_value(value: typing.Any) -> typing.Dict[str, typing.Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        # OTLP/JSON encodes 64 bit integers as strings
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class JsonLinesExporter:
+    """appends every finished span as a JSON line to a file"""
+
+    def __init__(self, path: os.PathLike):
+        self._file = open(path, "a")
+        self._lock = threading.Lock()
+
+    def export(self, span: Span):
+        with self._lock:
+            self._file.write(json.dumps(span.encode()) + "\n")
+            self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+_exporter: typing.Optional[JsonLinesExporter] = None
+_local = threading.local()
+
+
+def set_exporter(exporter: typing.Optional[JsonLinesExporter]):
+    global _exporter
+    _exporter = exporter
+
+
+def current_span() -> typing.Optional[Span]:
+    stack = getattr(_local, "stack", None)
+    return stack[-1] if stack else None
+
+
+@contextlib.contextmanager
+def span(
+    name: str, attributes: typing.Optional[typing.Dict[str, typing.Any]] = None, parent: typing.Optional[Span] = None
+) -> typing.Iterator[Span]:
+    """measures the block as span, which is a child of parent or of the current span of the thread. Spans of other
+    threads have to be given as parent explicitly. Exceptions (including sys.exit) mark the span as failed."""
+    if parent is None:
+        parent = current_span()
+    current = Span(
+        name=name,
+        trace_id=parent.trace_id if parent is not None else os.urandom(16).hex(),
+        span_id=os.urandom(8).hex(),
+        parent_span_id=parent.span_id if parent is not None else "",
+    )
+    for key, value in (attributes or {}).items():
+        current.set_attribute(key, value)
+    stack = _local.__dict__.setdefault("stack", [])
+    stack.append(current)
+    try:
+        yield current
+    except SystemExit as e:
+        if e.code not in (None, 0):
+            current.set_error(f"exit code {e.code}")
+        raise
+    except BaseException as e:
+        current.set_error(str(e) or type(e).__name__)
+        raise
+    finally:
+        stack.pop()
+        current.end_time = time.time_ns()
+        if _exporter is not None:
+            _exporter.export(current)